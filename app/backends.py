@@ -0,0 +1,261 @@
+# app/backends.py
+"""
+Execution backends for the TaskSubmitter.
+
+A backend runs the word search of a batch of paths somewhere and hands back a
+future for its search result. RayBackend runs searches as Ray remote functions
+across the cluster; LocalProcessBackend runs them in a process pool on this
+machine. Both produce the same search result dictionaries, so the submitter's
+streaming, retries and aggregation work unchanged on either.
+"""
+
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import os
+
+
+class RayBackend:
+    """
+    Runs word searches as Ray remote functions on the cluster.
+
+    Attributes:
+        name (str): the backend's name as chosen on the command line.
+        submit_errors (tuple): the exception types with which submit reports that
+            it could not submit a search.
+    """
+
+    name = "ray"
+    submit_errors = ()
+
+    @property
+    def task_errors(self):
+        """the exception types with which a task's future reports its failure"""
+        import ray
+
+        return (ray.exceptions.RayError,)
+
+    def start(self):
+        """connects to the cluster as configured through app.util.ray_session"""
+        from app.util.ray_session import ensure_ray_initialized
+
+        ensure_ray_initialized()
+
+    def shutdown(self):
+        """leaves the connection to the cluster to ray, which closes it at exit"""
+
+    def put(self, value):
+        """places a task invariant value in the object store, returning its reference"""
+        import ray
+
+        return ray.put(value)
+
+    def submit(
+        self, search_spec, path_ids, paths, path_word_ids, enable_logging, node_id=None
+    ):
+        """
+        Submits the search of a batch of paths.
+
+        Args:
+            search_spec: the search spec, or a reference to it returned by put.
+            path_ids (list of int): the path_ids of the paths to search.
+            paths (list of str): the paths, parallel to path_ids.
+            path_word_ids (list of list of int, optional): the word_ids to search each
+                path for, parallel to path_ids; None searches every path for every word.
+            enable_logging (bool): enable debug logging on the worker.
+            node_id (str, optional): the node to prefer; when it is gone the search
+                runs elsewhere.
+
+        Returns:
+            ray.ObjectRef: the future for the search result.
+        """
+        from app.worker.execute_remote_word_search import execute_remote_word_search
+
+        remote_function = execute_remote_word_search
+        if node_id is not None:
+            from ray.util.scheduling_strategies import NodeAffinitySchedulingStrategy
+
+            remote_function = execute_remote_word_search.options(
+                scheduling_strategy=NodeAffinitySchedulingStrategy(node_id, soft=True)
+            )
+        return remote_function.remote(
+            search_spec, path_ids, paths, path_word_ids, enable_logging
+        )
+
+    def wait_one(self, futures):
+        """
+        Blocks until one of the futures is done.
+
+        Returns:
+            tuple: the done future and a list of the others.
+        """
+        import ray
+
+        ready, pending = ray.wait(list(futures), num_returns=1)
+        return ready[0], pending
+
+    def result(self, future):
+        """returns the search result of a done future, raising one of task_errors on failure"""
+        import ray
+
+        return ray.get(future)
+
+    def cancel(self, future):
+        import ray
+
+        ray.cancel(future)
+
+    def worker_nodes(self):
+        """
+        Lists the alive nodes in the cluster that can run tasks.
+
+        Returns:
+            List[dict]: node descriptions as returned by ray.nodes().
+        """
+        import ray
+
+        return [
+            node
+            for node in ray.nodes()
+            if node["Alive"] and node["Resources"].get("CPU", 0) >= 1
+        ]
+
+
+class LocalProcessBackend:
+    """
+    Runs word searches in a pool of processes on this machine.
+
+    The whole machine appears as a single node, LOCAL_NODE_ID, with one slot per
+    worker process, so that adaptive batching works as it does on a cluster.
+
+    Attributes:
+        name (str): the backend's name as chosen on the command line.
+        submit_errors (tuple): the exception types with which submit reports that
+            it could not submit a search.
+        max_workers (int): the number of worker processes.
+    """
+
+    name = "local"
+    task_errors = (Exception,)
+    submit_errors = (BrokenProcessPool,)
+
+    def __init__(self, max_workers=None):
+        """
+        Args:
+            max_workers (int, optional): the number of worker processes, defaulting to
+                the number of CPUs.
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None
+
+    def start(self):
+        """starts the process pool unless already started"""
+        if self._executor is None:
+            logging.debug(f"starting {self.max_workers} local worker processes")
+            self._executor = concurrent.futures.ProcessPoolExecutor(self.max_workers)
+
+    def shutdown(self):
+        """stops the process pool, cancelling searches not yet started"""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def put(self, value):
+        """task invariant values are passed to each process as they are"""
+        return value
+
+    def submit(
+        self, search_spec, path_ids, paths, path_word_ids, enable_logging, node_id=None
+    ):
+        """
+        Submits the search of a batch of paths to the process pool.
+
+        Args:
+            search_spec (dict): the search spec.
+            path_ids (list of int): the path_ids of the paths to search.
+            paths (list of str): the paths, parallel to path_ids.
+            path_word_ids (list of list of int, optional): the word_ids to search each
+                path for, parallel to path_ids; None searches every path for every word.
+            enable_logging (bool): enable debug logging in the worker process.
+            node_id (str, optional): ignored, there being a single node.
+
+        Returns:
+            concurrent.futures.Future: the future for the search result.
+
+        Raises:
+            BrokenProcessPool: when the pool breaks again as soon as it is rebuilt.
+        """
+        from app.worker.execute_local_word_search import execute_local_word_search
+
+        arguments = (search_spec, path_ids, paths, path_word_ids, enable_logging)
+        try:
+            return self._executor.submit(execute_local_word_search, *arguments)
+        except BrokenProcessPool:
+            # a worker process died abruptly; the searches it took down fail with
+            # the same error and are retried on the new pool
+            logging.warning("a local worker process died, restarting the pool")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = concurrent.futures.ProcessPoolExecutor(self.max_workers)
+            return self._executor.submit(execute_local_word_search, *arguments)
+
+    def wait_one(self, futures):
+        """
+        Blocks until one of the futures is done.
+
+        Returns:
+            tuple: the done future and a list of the others.
+        """
+        done, _ = concurrent.futures.wait(
+            futures, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        ready = next(iter(done))
+        return ready, [future for future in futures if future is not ready]
+
+    def result(self, future):
+        """returns the search result of a done future, raising on failure"""
+        return future.result()
+
+    def cancel(self, future):
+        future.cancel()
+
+    def worker_nodes(self):
+        """
+        Describes this machine as the only node, in the shape of ray.nodes().
+
+        Returns:
+            List[dict]: a single node description.
+        """
+        from app.worker.execute_local_word_search import LOCAL_NODE_ID
+
+        return [
+            {
+                "NodeID": LOCAL_NODE_ID,
+                "NodeManagerAddress": "127.0.0.1",
+                "Alive": True,
+                "Resources": {"CPU": self.max_workers},
+            }
+        ]
+
+
+BACKENDS = {RayBackend.name: RayBackend, LocalProcessBackend.name: LocalProcessBackend}
+
+
+def create_backend(name, local_workers=None):
+    """
+    Creates the execution backend of the given name.
+
+    Args:
+        name (str): one of BACKENDS.
+        local_workers (int, optional): the number of worker processes of the local backend.
+
+    Returns:
+        RayBackend or LocalProcessBackend: the backend.
+
+    Raises:
+        ValueError: for an unknown backend name.
+    """
+    if name == LocalProcessBackend.name:
+        return LocalProcessBackend(local_workers)
+    if name == RayBackend.name:
+        return RayBackend()
+    raise ValueError(f"unknown backend {name!r}, choose from {', '.join(BACKENDS)}")
@@ -1,6 +1,6 @@
 # app/controller.py
-from .task_submitter import TaskSubmitter
-from .task_generator import TaskGenerator
+from .model.dbwriter import DBWriter
+from .task_generator import AdaptiveTaskGenerator, Task, TaskGenerator
 import logging
 import os
 
@@ -15,20 +15,108 @@ class Controller:
     Attributes:
         model: The data model used for fetching and updating word and path records.
         view: An optional view component for displaying results (not implemented yet).
+        stream_results (bool): Store each task's results as soon as the task completes.
+        stop_after (int): Stop once this many instances of the primary word are stored.
+        adaptive_batching (bool): Size batches from each node's observed throughput.
+        probe_size (int): The size of a node's first batch when batching adaptively.
+        work_queue (bool): Have workers pull chunks of paths from a shared queue.
+        chunk_size (int): The number of paths a worker pulls at a time from the queue.
+        max_in_flight (int): Upper count of batches submitted at once when streaming.
+        max_in_flight_bytes (int): Approximate upper size of in flight batches' results.
+        max_retries (int): How many times a failed batch is resubmitted.
+        failure_reports (list of dict): The failure report of each round, most recent last.
+        resume (bool): Finish the word's interrupted run before searching anew.
+        run_id (int): The run journal entry of the current run when streaming.
+        backend: The execution backend tasks are submitted to, Ray when None.
+        prefetch_bytes (int): The bound on text workers fetch ahead, None for the default.
+        db_writer (bool): Store results from a DBWriter thread while collecting more.
     """
 
-    def __init__(self, model, batch_size, view=None):
+    def __init__(
+        self,
+        model,
+        batch_size,
+        view=None,
+        stream_results=False,
+        stop_after=None,
+        adaptive_batching=False,
+        probe_size=5,
+        work_queue=False,
+        chunk_size=5,
+        max_in_flight=None,
+        max_in_flight_bytes=None,
+        max_retries=2,
+        resume=False,
+        backend=None,
+        prefetch_bytes=None,
+        db_writer=True,
+    ):
         """
         Initializes the Controller with a model and an optional view.
 
         Args:
             model: The data model for accessing and updating records.
             view: An optional view component for displaying results (currently not implemented).
+            stream_results (bool): When True, results are written to the model as each
+                task finishes instead of after the whole round.
+            stop_after (int, optional): cancel outstanding tasks once this many
+                instances of the primary word have been stored; implies stream_results.
+            adaptive_batching (bool): start each node on a small probe batch and size
+                its later batches from its throughput, batch_size becoming the upper
+                bound; implies stream_results.
+            probe_size (int): the number of paths in a node's probe batch.
+            work_queue (bool): instead of partitioning paths into batches up front,
+                queue them on the head for workers to pull chunk by chunk; implies
+                stream_results.
+            chunk_size (int): the number of paths in each queued chunk.
+            max_in_flight (int, optional): submit at most this many batches at a time,
+                generating the next as one completes; implies stream_results.
+            max_in_flight_bytes (int, optional): also hold back batches while their
+                estimated results would exceed this many bytes; implies stream_results.
+            max_retries (int): resubmit a failed batch up to this many times, preferring
+                nodes it has not failed on.
+            resume (bool): re-dispatch the unfinished batches of the word's most recent
+                interrupted run first; implies stream_results.
+            backend (optional): the execution backend from app.backends, Ray when None;
+                the work queue requires Ray.
+            prefetch_bytes (int, optional): the bound on text each worker fetches ahead
+                of its search, 0 to disable prefetching, the TaskSubmitter's default
+                when None.
+            db_writer (bool): hand results to a DBWriter thread with its own
+                connection, which stores them in coalesced transactions while the
+                controller keeps collecting, instead of storing them in turn.
         """
         self.model = model
         self.view = view
         self.enable_console_logging = None
         self.batch_size = batch_size
+        self.stream_results = stream_results or any(
+            (
+                stop_after is not None,
+                adaptive_batching,
+                work_queue,
+                max_in_flight is not None,
+                max_in_flight_bytes is not None,
+                resume,
+            )
+        )
+        self.adaptive_batching = adaptive_batching
+        self.probe_size = probe_size
+        self.work_queue = work_queue
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_bytes = max_in_flight_bytes
+        self.max_retries = max_retries
+        self.failure_reports = []
+        self.resume = resume
+        self.backend = backend
+        self.prefetch_bytes = prefetch_bytes
+        self.db_writer = db_writer
+        self._writer = None
+        self.run_id = None
+        self.stop_after = stop_after
+        self.primary_word = None
+        self.primary_found_count = 0
 
     def __call__(self, word, enable_console_logging=False):
         """
@@ -38,12 +126,38 @@ class Controller:
         unsearched paths for a given word and its internal set of related words
         and initiates the task distribution.
 
+        When streaming, the run and each batch it dispatches are recorded in the
+        model's run journal as they go, so that an interrupted run can be resumed.
+
         Args:
             words: A list of words to be searched in the paths.
         """
         self.enable_console_logging = enable_console_logging
+        self.primary_word = word
+        self.primary_found_count = 0
+        if self.db_writer:
+            self._writer = DBWriter(self.model)
+        try:
+            self._search(word)
+        finally:
+            if self._writer is not None:
+                writer, self._writer = self._writer, None
+                writer.close()
+                logging.debug(
+                    f"DBWriter stored {writer.write_count} results in"
+                    f" {writer.transaction_count} transactions"
+                )
+
+    def _search(self, word):
+        """searches for the word group until found, as __call__"""
         found_count = 0
-        while found_count == 0:
+        if self.resume:
+            found_count = max(self._resume_interrupted_run(word), 0)
+        if self.stream_results and found_count == 0:
+            self.run_id = self.model.start_run(word)
+        while found_count == 0 and not self._stop_after_reached():
+            # paths are selected from what the previous round stored
+            self._flush()
             words_to_unsearched_paths = self.model.get_unsearched_paths_for_word_group(
                 word
             )
@@ -60,6 +174,110 @@ class Controller:
                 break
             if found_count == 0:
                 print("Word(s) not found, expanding search.")
+        if self.run_id is not None:
+            self._flush()
+            self.model.finish_run(self.run_id)
+            self.run_id = None
+
+    def _store(self, method_name, *args):
+        """applies a model write, from the DBWriter thread when there is one"""
+        if self._writer is not None:
+            self._writer.submit(method_name, *args)
+        else:
+            getattr(self.model, method_name)(*args)
+
+    def _flush(self):
+        """waits until the results handed to the DBWriter thread are stored"""
+        if self._writer is not None:
+            self._writer.flush()
+
+    def _create_task_submitter(self):
+        """
+        Creates a TaskSubmitter configured from the controller, journaling every batch
+        it dispatches when a run is open.
+
+        Returns:
+            TaskSubmitter: the submitter.
+        """
+        # imported here so that importing the controller does not import ray
+        from .task_submitter import TaskSubmitter
+
+        task_submitter = TaskSubmitter(
+            self.enable_console_logging,
+            self.max_in_flight,
+            self.max_in_flight_bytes,
+            self.max_retries,
+            self.backend,
+        )
+        if self.prefetch_bytes is not None:
+            task_submitter.prefetch_bytes = self.prefetch_bytes
+        if self.run_id is not None:
+            task_submitter.dispatch_callback = self._journal_task
+        return task_submitter
+
+    def _journal_task(self, task):
+        """records a task in the run journal, tagging it with its batch_id"""
+        task.batch_id = self.model.journal_batch(
+            self.run_id,
+            [word_record["word_id"] for word_record in task.word_records],
+            [path_record["path_id"] for path_record in task.path_records],
+        )
+
+    def _resume_interrupted_run(self, word):
+        """
+        Re-dispatches the batches of the word's most recent interrupted run that never
+        completed, then closes that run unless a batch failed on every attempt again,
+        so that a later --resume retries it.
+
+        Args:
+            word (str): the primary word of the run.
+
+        Returns:
+            int: the found count of the resumed batches, as distribute_word_search_tasks.
+        """
+        run_id = self.model.get_unfinished_run_id(word)
+        if run_id is None:
+            print(f"No interrupted run to resume for {word}")
+            return 0
+        batches = self.model.fetch_unfinished_batches(run_id)
+        print(f"Resuming run {run_id}: {len(batches)} unfinished batches")
+
+        path_prefix = os.environ.get("RAYWORD_URL_PREFIX", None)
+        word_records_by_ids = {}
+        for batch in batches:
+            word_ids = tuple(batch["word_ids"])
+            if word_ids not in word_records_by_ids:
+                word_records_by_ids[word_ids] = self.model.fetch_word_records_by_ids(
+                    batch["word_ids"]
+                )
+        tasks = (
+            Task(
+                word_records_by_ids[tuple(batch["word_ids"])],
+                self.model.fetch_selected_path_records(batch["path_ids"]),
+                [],
+                path_prefix,
+                batch["batch_id"],
+            )
+            for batch in batches
+        )
+        word_records = [
+            word_record
+            for word_records in word_records_by_ids.values()
+            for word_record in word_records
+        ]
+
+        task_submitter = self._create_task_submitter()
+        found_count = self._stream_word_search_tasks(
+            task_submitter, task_submitter.stream_tasks(tasks), 0, word_records
+        )
+        failure_report = task_submitter.failure_report()
+        self._report_failures(failure_report)
+        self._flush()
+        if failure_report["failed_tasks"]:
+            print(f"Run {run_id} is left open to be resumed again")
+        else:
+            self.model.finish_run(run_id)
+        return found_count
 
     def distribute_word_search_tasks(self, words_to_unsearched_paths):
         """
@@ -67,34 +285,78 @@ class Controller:
 
         This method generates tasks for each group of words and their associated unsearched paths.
         These tasks are then submitted to the Ray cluster for processing. The search results
-        are aggregated and updated in the model.
+        are aggregated and updated in the model. A path record carrying "word_ids" is
+        only searched for those words, so paths missing different words of the group
+        are batched and streamed together in one round.
 
         Args:
             words_to_unsearched_paths: A dictionary mapping words to their corresponding unsearched paths.
         """
         task_generator = TaskGenerator(batch_size=self.batch_size)
-        task_submitter = TaskSubmitter(self.enable_console_logging)
+        task_submitter = self._create_task_submitter()
 
         path_prefix = os.environ.get("RAYWORD_URL_PREFIX", None)
         found_count = 0
         for words, path_records in words_to_unsearched_paths.items():
             print(f"searching {len(path_records)} texts")
             word_records = self.model.fetch_word_records(words)
+            # batches prefer alive nodes that already hold their texts
+            alive_node_ids = task_submitter.alive_node_ids()
+            cached_node_ids = {
+                path_id: [node_id for node_id in node_ids if node_id in alive_node_ids]
+                for path_id, node_ids in self.model.fetch_cached_node_ids(
+                    [path_record["path_id"] for path_record in path_records]
+                ).items()
+            }
             task_batches = task_generator.generate(
-                word_records, path_records, path_prefix
+                word_records, path_records, path_prefix, cached_node_ids
             )
 
+            if self.stream_results:
+                if self.work_queue:
+                    searchResults = task_submitter.stream_queued_tasks(
+                        TaskGenerator(batch_size=self.chunk_size).generate(
+                            word_records, path_records, path_prefix
+                        )
+                    )
+                elif self.adaptive_batching:
+                    adaptive_task_generator = AdaptiveTaskGenerator(
+                        self.batch_size, self.probe_size
+                    )
+                    adaptive_task_generator.start(
+                        word_records, path_records, path_prefix
+                    )
+                    searchResults = task_submitter.stream_adaptive_tasks(
+                        adaptive_task_generator
+                    )
+                else:
+                    searchResults = task_submitter.stream_tasks(task_batches)
+                found_count = self._stream_word_search_tasks(
+                    task_submitter, searchResults, found_count, word_records
+                )
+                self._report_failures(task_submitter.failure_report())
+                if self._stop_after_reached():
+                    break
+                continue
+
             (
                 word_indices_aggregated,
                 search_histories,
                 summary,
             ) = task_submitter.submit_and_process_tasks(task_batches)
+            self._report_failures(summary["failure_report"])
 
-            # Update the model with search findings
-            paths_reached = self.model.insert_search_histories(search_histories)
-            if paths_reached > 0:
-                self.model.mark_paths_unreachable(summary["bad_path_ids"])
-                found_count += self.model.insert_search_results(word_indices_aggregated)
+            # Update the model with search findings, the round in a single transaction
+            self._store(
+                "store_round_results",
+                search_histories,
+                word_indices_aggregated,
+                summary["bad_path_ids"],
+                summary["cached_path_ids"],
+                summary["text_filters"],
+            )
+            if len(search_histories) > 0:
+                found_count += len(word_indices_aggregated)
             else:
                 found_count = -1
 
@@ -102,3 +364,135 @@ class Controller:
             # that correspond to the specific word provide (not related words)
 
         return found_count
+
+    def build_text_filters(self):
+        """
+        Filters every reachable text not yet filtered, a batch of paths at a time.
+
+        The texts are dispatched to the workers with no words to search, which
+        load each and return the Bloom filter of its words (app.worker.util.bloom)
+        for the model to store. Later searches then only dispatch the texts whose
+        filter might contain a word of the group, see
+        WordIndexerModel.get_unsearched_paths_for_word_group.
+
+        Returns:
+            int: the number of texts filtered.
+        """
+        task_submitter = self._create_task_submitter()
+        task_submitter.build_text_filters = True
+        path_prefix = os.environ.get("RAYWORD_URL_PREFIX", None)
+        filtered_count = 0
+        while True:
+            path_records = self.model.fetch_unfiltered_path_records()
+            if not path_records:
+                break
+            print(f"filtering {len(path_records)} texts")
+            tasks = [
+                Task([], path_records[i : i + self.batch_size], [], path_prefix)
+                for i in range(0, len(path_records), self.batch_size)
+            ]
+            _, _, summary = task_submitter.submit_and_process_tasks(tasks)
+            self._report_failures(summary["failure_report"])
+            self.model.store_round_results(
+                [],
+                [],
+                summary["bad_path_ids"],
+                summary["cached_path_ids"],
+                summary["text_filters"],
+            )
+            filtered_count += len(summary["text_filters"])
+            if not summary["text_filters"]:
+                # no text could be loaded, unreachable paths are left unmarked
+                # as when a search round reaches none
+                break
+        print(f"filtered {filtered_count} texts")
+        return filtered_count
+
+    def _report_failures(self, failure_report):
+        """
+        Keeps a round's failure report and tells the user about any lost batches.
+
+        Args:
+            failure_report (dict): the report from TaskSubmitter.failure_report.
+        """
+        self.failure_reports.append(failure_report)
+        failed_tasks = failure_report["failed_tasks"]
+        if failure_report["retried_count"] > 0:
+            logging.debug(
+                f"{failure_report['retried_count']} batch(es) were retried,"
+                f" {failure_report['failed_worker_count']} queue worker(s) were lost"
+            )
+        if failed_tasks:
+            failed_path_count = sum(len(task["path_ids"]) for task in failed_tasks)
+            print(
+                f"{len(failed_tasks)} batch(es) covering {failed_path_count} texts failed"
+                " on every attempt and were left unsearched"
+            )
+            for failed_task in failed_tasks:
+                logging.debug(
+                    f"failed after {failed_task['attempts']} attempts:"
+                    f" {failed_task['error']}"
+                )
+
+    def _stop_after_reached(self):
+        """whether enough instances of the primary word have been stored to stop early"""
+        return (
+            self.stop_after is not None and self.primary_found_count >= self.stop_after
+        )
+
+    def _stream_word_search_tasks(
+        self, task_submitter, searchResults, found_count, word_records
+    ):
+        """
+        Stores the results of a word group's tasks one at a time as they complete.
+
+        Each result is stored in its own transaction, completing its journaled
+        batch if any, or handed to the DBWriter thread to be stored with the
+        results queued alongside it while the next are collected. Unreachable
+        paths are only marked once the round has reached at least one path,
+        matching the non streaming behavior. When stop_after is reached the
+        remaining tasks are cancelled, leaving their paths unsearched.
+
+        Args:
+            task_submitter (TaskSubmitter): the submitter streaming the results.
+            searchResults (Iterator[dict]): the word group's search results.
+            found_count (int): the running count of found instances.
+            word_records (list of dict): the Words records being searched.
+
+        Returns:
+            int: the updated found count, or -1 if no paths could be reached.
+        """
+        primary_word_ids = {
+            word_record["word_id"]
+            for word_record in word_records
+            if word_record["word"] == self.primary_word
+        }
+        paths_reached = 0
+        bad_path_ids = set()
+        for searchResult in searchResults:
+            self._store("store_search_result", searchResult)
+            paths_reached += len(searchResult["search_histories"])
+            found_count += len(searchResult["word_indices"])
+            bad_path_ids.update(searchResult["unreachable_path_ids"])
+            print(
+                f"{task_submitter.completed_count}/{task_submitter.submitted_count}"
+                f" batches complete, {found_count} instances found",
+                flush=True,
+            )
+            self.primary_found_count += sum(
+                1
+                for word_index in searchResult["word_indices"]
+                if word_index["word_id"] in primary_word_ids
+            )
+            if self._stop_after_reached():
+                cancelled = task_submitter.cancel_pending()
+                print(
+                    f"found {self.primary_found_count} instances of"
+                    f" {self.primary_word}, cancelled {cancelled} outstanding batches"
+                )
+                break
+
+        if paths_reached > 0:
+            self._store("mark_paths_unreachable", list(bad_path_ids))
+            return found_count
+        return -1
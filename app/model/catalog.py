@@ -0,0 +1,87 @@
+# catalog.py
+# Loads the Project Gutenberg catalog into the Meta table of the 'textdetails' database.
+
+import csv
+import logging
+
+# the columns of the catalog csv (pg_catalog.csv) and the Meta columns they fill
+CATALOG_COLUMNS = {
+    "Text#": "TextNumber",
+    "Type": "Type",
+    "Issued": "Issued",
+    "Title": "Title",
+    "Language": "Language",
+    "Authors": "Authors",
+    "Subjects": "Subjects",
+    "LoCC": "LoCC",
+    "Bookshelves": "Bookshelves",
+}
+
+# recreated once the rows are in, cheaper than maintaining them row by row
+META_INDEXES = {
+    "idx_meta_textnumber": "Meta (TextNumber)",
+    "idx_meta_language": "Meta (Language, TextNumber)",
+}
+
+
+def _catalog_rows(reader):
+    """the Meta rows of the catalog's records, skipping those without a text number"""
+    skipped_count = 0
+    for record in reader:
+        try:
+            text_number = int(record["Text#"])
+        except (TypeError, ValueError):
+            skipped_count += 1
+            continue
+        yield (text_number,) + tuple(
+            record[column] or None for column in list(CATALOG_COLUMNS)[1:]
+        )
+    if skipped_count:
+        logging.debug(f"skipped {skipped_count} catalog records without a text number")
+
+
+def load_catalog(conn, csv_path):
+    """
+    Replaces the contents of Meta with the Gutenberg catalog, in one transaction.
+
+    The indexes on Meta are dropped while the rows are inserted and created again
+    afterwards, within the same transaction, so a failure leaves Meta as it was.
+
+    Args:
+        conn (sqlite3.Connection): the connection to the text details database.
+        csv_path (str): the catalog csv, e.g. a local copy of
+            https://www.gutenberg.org/cache/epub/feeds/pg_catalog.csv
+
+    Returns:
+        int: the number of texts loaded.
+
+    Raises:
+        ValueError: when the csv lacks a catalog column.
+    """
+    with open(csv_path, newline="", encoding="utf-8") as catalog_file:
+        reader = csv.DictReader(catalog_file)
+        missing_columns = set(CATALOG_COLUMNS) - set(reader.fieldnames or [])
+        if missing_columns:
+            raise ValueError(
+                f"{csv_path} is not a Gutenberg catalog, it lacks the columns"
+                f" {', '.join(sorted(missing_columns))}"
+            )
+        placeholders = ", ".join("?" * len(CATALOG_COLUMNS))
+        conn.execute("BEGIN")
+        try:
+            conn.execute("DELETE FROM Meta")
+            for index_name in META_INDEXES:
+                conn.execute(f"DROP INDEX IF EXISTS {index_name}")
+            cursor = conn.executemany(
+                f"INSERT INTO Meta ({', '.join(CATALOG_COLUMNS.values())})"
+                f" VALUES ({placeholders})",
+                _catalog_rows(reader),
+            )
+            loaded_count = cursor.rowcount
+            for index_name, indexed in META_INDEXES.items():
+                conn.execute(f"CREATE INDEX {index_name} ON {indexed}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    return loaded_count
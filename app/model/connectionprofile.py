@@ -0,0 +1,49 @@
+# connectionprofile.py
+# Tunes sqlite connections of the model for throughput and concurrent reads.
+
+import logging
+import sqlite3
+
+# words.db is written in bursts by the head while views and scripts read it:
+#   journal_mode WAL lets readers proceed while a round of results is written
+#   synchronous NORMAL only syncs at checkpoints, which is safe in WAL mode
+#   cache_size (negative, in KiB) and mmap_size (bytes) keep the hot indexes in memory
+#   busy_timeout (ms) waits out another process's write instead of failing at once
+WORDS_DB_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64 * 1024,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+
+def apply_connection_profile(conn, pragmas=WORDS_DB_PRAGMAS):
+    """
+    Sets the pragmas of a connection's main database.
+
+    Args:
+        conn (sqlite3.Connection): the connection to tune.
+        pragmas (dict): pragma values keyed by pragma name.
+    """
+    for pragma, value in pragmas.items():
+        result = conn.execute(f"PRAGMA {pragma} = {value}").fetchone()
+        logging.debug(f"PRAGMA {pragma} = {value}: {result[0] if result else ''}")
+
+
+def close_with_checkpoint(conn):
+    """
+    Closes a connection after refreshing the query planner's statistics and folding
+    the write-ahead log back into the database file.
+
+    Args:
+        conn (sqlite3.Connection): the connection to close.
+    """
+    try:
+        conn.execute("PRAGMA optimize")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    except sqlite3.OperationalError as e:
+        # another connection is busy; the log is checkpointed later
+        logging.debug(f"checkpoint on close skipped: {e}")
+    conn.close()
@@ -32,6 +32,10 @@ def create_tables(conn):
     LoCC TEXT,
     Bookshelves TEXT
 )""",
+        # looked up by text number when browsing results by text metadata
+        """CREATE INDEX IF NOT EXISTS idx_meta_textnumber ON Meta (TextNumber)""",
+        # the texts of a language, when dispatching only those
+        """CREATE INDEX IF NOT EXISTS idx_meta_language ON Meta (Language, TextNumber)""",
     ]
     conn.commit()
 
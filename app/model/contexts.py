@@ -0,0 +1,106 @@
+# contexts.py
+# Stores the sentence and paragraph contexts of word indices once each, optionally compressed.
+
+import hashlib
+import zlib
+
+# contexts shorter than this are stored as is, zlib gains little on a short sentence
+COMPRESSION_MIN_LENGTH = 128
+COMPRESSION_LEVEL = 6
+
+# the sql function the model's queries read contexts through
+CONTEXT_TEXT_FUNCTION = "context_text"
+
+
+def encode_context(text, compress=False):
+    """
+    Prepares a context for the Contexts table.
+
+    Args:
+        text (str): the sentence or paragraph.
+        compress (bool): zlib compress the text when that makes it smaller.
+
+    Returns:
+        tuple: the digest keying the context (bytes), then either the text (str)
+            and None, or None and the text zlib compressed (bytes).
+    """
+    encoded = text.encode("utf-8")
+    digest = hashlib.sha1(encoded).digest()
+    if compress and len(encoded) >= COMPRESSION_MIN_LENGTH:
+        compressed = zlib.compress(encoded, COMPRESSION_LEVEL)
+        if len(compressed) < len(encoded):
+            return digest, None, compressed
+    return digest, text, None
+
+
+def context_text(content, compressed_content):
+    """the text of a stored context, inflated when stored compressed"""
+    if content is not None:
+        return content
+    if compressed_content is not None:
+        return zlib.decompress(compressed_content).decode("utf-8")
+    return ""
+
+
+def register_context_functions(conn):
+    """
+    Registers the sql function reading stored contexts on a connection.
+
+    The model's queries and migrations read contexts through it. The WordIndices
+    view does not, its context columns are NULL for contexts stored compressed.
+
+    Args:
+        conn (sqlite3.Connection): the connection to the words database.
+    """
+    conn.create_function(CONTEXT_TEXT_FUNCTION, 2, context_text, deterministic=True)
+
+
+def store_contexts(cursor, texts, compress=False):
+    """
+    Inserts the contexts not yet stored and looks up the ids of all of them.
+
+    Args:
+        cursor (sqlite3.Cursor): a cursor on the words database.
+        texts (Iterable[str]): the contexts to store.
+        compress (bool): zlib compress contexts that shrink.
+
+    Returns:
+        dict: the context_id of each text.
+    """
+    context_ids = {}
+    for text in texts:
+        if text in context_ids:
+            continue
+        digest, content, compressed_content = encode_context(text, compress)
+        cursor.execute(
+            "INSERT OR IGNORE INTO Contexts (digest, content, compressed_content)"
+            " VALUES (?, ?, ?)",
+            (digest, content, compressed_content),
+        )
+        if cursor.rowcount == 1:
+            context_ids[text] = cursor.lastrowid
+        else:
+            context_ids[text] = cursor.execute(
+                "SELECT context_id FROM Contexts WHERE digest = ?", (digest,)
+            ).fetchone()[0]
+    return context_ids
+
+
+def index_sentences(cursor, sentence_context_ids):
+    """
+    Adds sentence contexts to the ContextsFts full text index unless already there.
+
+    The index is contentless, it stores the tokens of a sentence under its
+    context_id and reads nothing back, and does not reject a context_id twice.
+
+    Args:
+        cursor (sqlite3.Cursor): a cursor on the words database.
+        sentence_context_ids (dict): the context_id of each sentence.
+    """
+    for text, context_id in sentence_context_ids.items():
+        cursor.execute("SELECT 1 FROM ContextsFts WHERE rowid = ?", (context_id,))
+        if cursor.fetchone() is None:
+            cursor.execute(
+                "INSERT INTO ContextsFts (rowid, sentence) VALUES (?, ?)",
+                (context_id, text),
+            )
@@ -0,0 +1,169 @@
+# dbwriter.py
+# Writes to the 'words' database from a dedicated thread, coalescing queued writes.
+
+import logging
+import queue
+import threading
+import time
+
+from .wordindexermodel import WordIndexerModel
+
+# model writes queued at most before submit blocks the caller
+DEFAULT_MAX_PENDING = 64
+# model writes grouped at most into one transaction
+DEFAULT_MAX_COALESCED = 256
+# seconds a transaction is held at most before committing the writes applied so
+# far, well within the busy_timeout of the controller's own writes to words.db
+DEFAULT_MAX_TRANSACTION_SECONDS = 0.25
+
+_CLOSE = object()
+
+
+class DBWriter:
+    """
+    A thread owning its own connection to the words database that applies the model
+    writes queued to it, coalescing those waiting into a single transaction.
+
+    The caller keeps collecting results while earlier ones are written, and only
+    waits when the queue is full, on flush and on close. Writes are applied in the
+    order submitted, and a transaction is committed once it has been held for
+    max_transaction_seconds, however many writes are left to coalesce, so that the
+    controller's own writes, e.g. to the batch journal, do not wait long on it. A
+    write that fails rolls back the transaction it was applied in, and the error is
+    raised on the caller's next submit, flush or close.
+
+    Attributes:
+        max_pending (int): the writes queued at most before submit blocks.
+        max_coalesced (int): the writes grouped at most into one transaction.
+        max_transaction_seconds (float): the time a transaction is held at most.
+        transaction_count (int): the transactions committed so far.
+        write_count (int): the writes applied so far.
+    """
+
+    def __init__(
+        self,
+        model,
+        max_pending=DEFAULT_MAX_PENDING,
+        max_coalesced=DEFAULT_MAX_COALESCED,
+        max_transaction_seconds=DEFAULT_MAX_TRANSACTION_SECONDS,
+    ):
+        """
+        Starts the writer thread, which opens its connection like the model's.
+
+        Args:
+            model (WordIndexerModel): the model whose databases to write to.
+            max_pending (int): the writes queued at most before submit blocks.
+            max_coalesced (int): the writes grouped at most into one transaction.
+            max_transaction_seconds (float): the time a transaction is held at
+                most before committing the writes applied so far.
+
+        Raises:
+            sqlite3.Error: when the writer's connection cannot be opened.
+        """
+        self.max_pending = max_pending
+        self.max_coalesced = max_coalesced
+        self.max_transaction_seconds = max_transaction_seconds
+        self.transaction_count = 0
+        self.write_count = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._error_raised = False
+        self._started = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(
+                model.words_db_path,
+                model.text_details_db_path,
+                model.compress_contexts,
+            ),
+            name="DBWriter",
+            daemon=True,
+        )
+        self._thread.start()
+        self._started.wait()
+        self._raise_error()
+
+    def submit(self, method_name, *args):
+        """
+        Queues a write, blocking while the queue is full.
+
+        Args:
+            method_name (str): the WordIndexerModel method applying the write,
+                e.g. "store_search_result".
+            *args: the method's arguments.
+        """
+        self._raise_error()
+        self._queue.put((method_name, args))
+
+    def flush(self):
+        """waits until every write queued so far is committed"""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """commits the queued writes, then stops the thread and closes its connection"""
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+        if not self._error_raised:
+            self._raise_error()
+
+    def _raise_error(self):
+        # the error stays, discarding the writes queued after it, but is only
+        # raised again on close if the caller has not seen it
+        if self._error is not None:
+            self._error_raised = True
+            raise self._error
+
+    def _run(self, words_db_path, text_details_db_path, compress_contexts):
+        try:
+            model = WordIndexerModel(
+                words_db_path, text_details_db_path, compress_contexts=compress_contexts
+            )
+        except Exception as e:
+            self._error = e
+            self._started.set()
+            return
+        self._started.set()
+
+        closing = False
+        while not closing:
+            writes = [self._queue.get()]
+            while len(writes) < self.max_coalesced:
+                try:
+                    writes.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if writes[-1] is _CLOSE:
+                closing = True
+                writes.pop()
+            applied_count = 0
+            while applied_count < len(writes) and self._error is None:
+                try:
+                    applied_count += self._apply(model, writes[applied_count:])
+                except Exception as e:
+                    logging.error(f"DBWriter failed, discarding queued writes: {e}")
+                    self._error = e
+            for _ in range(len(writes) + closing):
+                self._queue.task_done()
+        model.close()
+
+    def _apply(self, model, writes):
+        """
+        Applies writes in one transaction until they are done or it is held too long.
+
+        Returns:
+            int: the count of writes committed.
+        """
+        deadline = time.monotonic() + self.max_transaction_seconds
+        applied_count = 0
+        with model.transaction():
+            for method_name, args in writes:
+                getattr(model, method_name)(*args)
+                applied_count += 1
+                if time.monotonic() >= deadline:
+                    break
+        self.transaction_count += 1
+        self.write_count += applied_count
+        logging.debug(f"DBWriter committed {applied_count} writes")
+        return applied_count
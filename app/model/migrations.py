@@ -0,0 +1,527 @@
+# migrations.py
+# Brings the schema of the 'words' database up to date in place.
+"""
+Ordered, non-destructive schema migrations for words.db.
+
+Each Migration moves the schema from the previous version to its own and is
+applied in its own transaction together with its schema_version row, so that a
+failure leaves the database at the last version fully applied. Migrations only
+ever add to or rewrite the schema in place; indexed results are never dropped.
+
+To see which migrations a database is missing and how long they take, without
+changing it:
+
+    python -m app.util.migrate data/words.db --dry-run
+"""
+
+from dataclasses import dataclass
+import logging
+import sqlite3
+import time
+from typing import Callable, List, Optional, Sequence
+
+from .contexts import store_contexts
+from .pathbitmap import SEARCH_HISTORY_VIEW_QUERY, PathBitmap
+
+
+@dataclass
+class Migration:
+    """
+    A step of the schema.
+
+    Attributes:
+        version (int): the schema version after the migration.
+        description (str): what the migration does, recorded in schema_version.
+        statements (Sequence[str]): the SQL statements applying the migration.
+        apply (Callable): applies the migration given the connection, for changes
+            that need inspecting the schema first; run after the statements.
+    """
+
+    version: int
+    description: str
+    statements: Sequence[str] = ()
+    apply: Optional[Callable[[sqlite3.Connection], None]] = None
+
+
+def column_names(conn, table):
+    """the names of a table's columns"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def add_missing_columns(conn, table, column_definitions):
+    """
+    Adds the columns a table is missing.
+
+    Args:
+        conn (sqlite3.Connection): the connection.
+        table (str): the table to extend.
+        column_definitions (dict): column definitions keyed by column name, e.g.
+            {"context_sentence": 'TEXT DEFAULT ""'}.
+    """
+    existing_columns = set(column_names(conn, table))
+    for column, definition in column_definitions.items():
+        if column not in existing_columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def rewrite_table(conn, table, create_statement, columns):
+    """
+    Rewrites a table into a new definition, e.g. to change a constraint, keeping its rows.
+
+    Args:
+        conn (sqlite3.Connection): the connection, within the migration's transaction.
+        table (str): the table to rewrite.
+        create_statement (str): the CREATE TABLE statement of the new definition,
+            creating a table named f"{table}_new".
+        columns (Sequence[str]): the columns copied over from the old table.
+    """
+    column_list = ", ".join(columns)
+    conn.execute(create_statement)
+    conn.execute(
+        f"INSERT INTO {table}_new ({column_list}) SELECT {column_list} FROM {table}"
+    )
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+
+def _complete_word_indices_columns(conn):
+    # databases of schema versions 1 and 2 may predate the context columns
+    add_missing_columns(
+        conn,
+        "WordIndices",
+        {
+            "context_sentence": 'TEXT DEFAULT ""',
+            "context_paragraph": 'TEXT DEFAULT ""',
+        },
+    )
+
+
+WORD_INDEX_COLUMNS = (
+    "word_indices_id",
+    "word_id",
+    "word_index",
+    "sentence_index_start",
+    "sentence_index_end",
+    "paragraph_index_start",
+    "paragraph_index_end",
+    "path_id",
+)
+
+
+# the body of the WordIndices view, joining each entry to the text of its
+# contexts; the text of a context stored compressed is NULL, its zlib bytes being
+# in the separate sentence_compressed and paragraph_compressed columns, so that
+# any sqlite client can read the view and never gets bytes for text
+WORD_INDICES_VIEW_QUERY = f"""
+SELECT {", ".join("e." + column for column in WORD_INDEX_COLUMNS)},
+    s.content AS context_sentence,
+    p.content AS context_paragraph,
+    s.compressed_content AS sentence_compressed,
+    p.compressed_content AS paragraph_compressed
+FROM WordIndexEntries e
+LEFT JOIN Contexts s ON s.context_id = e.sentence_context_id
+LEFT JOIN Contexts p ON p.context_id = e.paragraph_context_id
+"""
+
+
+def _move_contexts_to_contexts_table(conn):
+    # store each distinct context once, then replace the WordIndices table by a
+    # view of the same name and columns reading the contexts back
+    column_list = ", ".join(WORD_INDEX_COLUMNS)
+    cursor = conn.cursor()
+    rows = conn.execute(
+        f"SELECT {column_list}, context_sentence, context_paragraph FROM WordIndices"
+    )
+    while True:
+        batch = rows.fetchmany(10_000)
+        if not batch:
+            break
+        context_ids = store_contexts(
+            cursor, (text or "" for row in batch for text in row[-2:])
+        )
+        cursor.executemany(
+            f"""INSERT INTO WordIndexEntries
+                ({column_list}, sentence_context_id, paragraph_context_id)
+                VALUES ({", ".join("?" * (len(WORD_INDEX_COLUMNS) + 2))})""",
+            [
+                (*row[:-2], context_ids[row[-2] or ""], context_ids[row[-1] or ""])
+                for row in batch
+            ],
+        )
+    conn.execute("DROP TABLE WordIndices")
+    conn.execute(f"CREATE VIEW WordIndices AS {WORD_INDICES_VIEW_QUERY}")
+
+
+def _move_search_history_to_bitmaps(conn):
+    # collapse each word's SearchHistory rows into a bitmap, then replace the
+    # table by a view of the same name listing them back
+    rows = conn.execute("SELECT word_id, path_id FROM SearchHistory ORDER BY word_id")
+    word_id, path_ids = None, []
+    for row_word_id, path_id in rows:
+        if row_word_id != word_id:
+            _store_search_bitmap(conn, word_id, path_ids)
+            word_id, path_ids = row_word_id, []
+        path_ids.append(path_id)
+    _store_search_bitmap(conn, word_id, path_ids)
+    conn.execute("DROP TABLE SearchHistory")
+    conn.execute(f"CREATE VIEW SearchHistory AS {SEARCH_HISTORY_VIEW_QUERY}")
+
+
+def rank_word_indices(conn):
+    """
+    Numbers each word's occurrences 1, 2, ... in word_indices_id order.
+
+    Args:
+        conn (sqlite3.Connection): the connection, within a transaction.
+    """
+    conn.execute("""UPDATE WordIndexEntries SET word_rank = ranked.word_rank
+        FROM (
+            SELECT word_indices_id, ROW_NUMBER() OVER (
+                PARTITION BY word_id ORDER BY word_indices_id
+            ) AS word_rank
+            FROM WordIndexEntries
+        ) AS ranked
+        WHERE ranked.word_indices_id = WordIndexEntries.word_indices_id""")
+
+
+def _rank_word_indices(conn):
+    # each occurrence's rank among its word's, so that an occurrence is picked
+    # by rank through an index instead of counting and skipping to it
+    add_missing_columns(conn, "WordIndexEntries", {"word_rank": "INTEGER"})
+    rank_word_indices(conn)
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_wordindexentries_word_rank
+        ON WordIndexEntries (word_id, word_rank)""")
+
+
+def _store_search_bitmap(conn, word_id, path_ids):
+    if word_id is None:
+        return
+    conn.execute(
+        "INSERT INTO SearchBitmaps (word_id, bitmap, path_count) VALUES (?, ?, ?)",
+        (word_id, PathBitmap.from_path_ids(path_ids).to_blob(), len(set(path_ids))),
+    )
+
+
+# SQL statements to create tables in the words database
+# to do, allow for multiple paths given a text number
+MIGRATIONS: List[Migration] = [
+    Migration(
+        3,
+        "Add History table",
+        [
+            """CREATE TABLE IF NOT EXISTS schema_version (
+                version VARCHAR(50) PRIMARY KEY,
+                applied_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                description TEXT
+            )""",
+            """CREATE TABLE IF NOT EXISTS Words (
+                word_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                word TEXT UNIQUE,
+                form_group_id INTEGER,
+                FOREIGN KEY (form_group_id) REFERENCES FormGroups(form_group_id)
+            )""",
+            """CREATE TABLE IF NOT EXISTS FormGroups (
+                form_group_id INTEGER PRIMARY KEY AUTOINCREMENT
+            )""",
+            """CREATE TABLE IF NOT EXISTS Paths (
+                path_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT UNIQUE,
+                text_number INTEGER UNIQUE,
+                is_unreachable INTEGER DEFAULT 0
+            )""",
+            """CREATE TABLE IF NOT EXISTS WordIndices (
+                word_indices_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                word_id INTEGER,
+                word_index INTEGER,
+                sentence_index_start INTEGER,
+                sentence_index_end INTEGER,
+                paragraph_index_start INTEGER,
+                paragraph_index_end INTEGER,
+                path_id INTEGER,
+                context_sentence TEXT DEFAULT "",
+                context_paragraph TEXT DEFAULT "",
+                FOREIGN KEY (word_id) REFERENCES Words(word_id),
+                FOREIGN KEY (path_id) REFERENCES Paths(path_id),
+                UNIQUE (word_id, word_index, path_id)
+            )""",
+            """CREATE TABLE IF NOT EXISTS SearchHistory (
+                search_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                word_id INTEGER,
+                path_id INTEGER,
+                FOREIGN KEY (word_id) REFERENCES Words(word_id),
+                FOREIGN KEY (path_id) REFERENCES Paths(path_id),
+                UNIQUE (word_id, path_id)
+            )""",
+            """CREATE TABLE IF NOT EXISTS History (
+                id INTEGER PRIMARY KEY CHECK (id=1),
+                ultimate_max_index_id INTEGER DEFAULT 0,
+                penultimate_max_index_id INTEGER DEFAULT 0
+            )""",
+        ],
+        _complete_word_indices_columns,
+    ),
+    Migration(
+        4,
+        "Add run journal",
+        [
+            """CREATE TABLE IF NOT EXISTS Runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                word TEXT,
+                started_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_on TIMESTAMP
+            )""",
+            """CREATE TABLE IF NOT EXISTS RunBatches (
+                batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id INTEGER,
+                word_ids TEXT,
+                path_ids TEXT,
+                is_completed INTEGER DEFAULT 0,
+                FOREIGN KEY (run_id) REFERENCES Runs(run_id)
+            )""",
+            """CREATE INDEX IF NOT EXISTS idx_runbatches_run_id
+                ON RunBatches (run_id, is_completed)""",
+        ],
+    ),
+    Migration(
+        5,
+        "Add PathCache table for cache affinity scheduling",
+        [
+            # the nodes whose text cache held a path when last searched there
+            """CREATE TABLE IF NOT EXISTS PathCache (
+                path_id INTEGER,
+                node_id TEXT,
+                cached_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (path_id, node_id),
+                FOREIGN KEY (path_id) REFERENCES Paths(path_id)
+            )""",
+        ],
+    ),
+    Migration(
+        6,
+        "Add indexes for unsearched path selection",
+        [
+            # the words of a form group, joined by unsearched path selection
+            """CREATE INDEX IF NOT EXISTS idx_words_form_group_id
+                ON Words (form_group_id)""",
+            # the reachable paths in path_id order, which unsearched path selection
+            # scans; the UNIQUE (word_id, path_id) index of SearchHistory covers its
+            # anti-join
+            """CREATE INDEX IF NOT EXISTS idx_paths_reachable
+                ON Paths (path_id) WHERE is_unreachable = 0""",
+        ],
+    ),
+    Migration(
+        7,
+        "Add TargetsFiles table",
+        [
+            # the state of each targets file when its paths were last ingested
+            """CREATE TABLE IF NOT EXISTS TargetsFiles (
+                file_path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                sha256 TEXT,
+                ingested_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )""",
+        ],
+    ),
+    Migration(
+        8,
+        "Store word index contexts once in Contexts table",
+        [
+            # each distinct sentence or paragraph, keyed by the sha1 of its text,
+            # stored as content or, when compressing makes it smaller, only as
+            # zlib bytes in compressed_content
+            """CREATE TABLE IF NOT EXISTS Contexts (
+                context_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                digest BLOB UNIQUE,
+                content TEXT,
+                compressed_content BLOB
+            )""",
+            # the rows of WordIndices, which becomes a view joining their contexts
+            """CREATE TABLE IF NOT EXISTS WordIndexEntries (
+                word_indices_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                word_id INTEGER,
+                word_index INTEGER,
+                sentence_index_start INTEGER,
+                sentence_index_end INTEGER,
+                paragraph_index_start INTEGER,
+                paragraph_index_end INTEGER,
+                path_id INTEGER,
+                sentence_context_id INTEGER,
+                paragraph_context_id INTEGER,
+                FOREIGN KEY (word_id) REFERENCES Words(word_id),
+                FOREIGN KEY (path_id) REFERENCES Paths(path_id),
+                FOREIGN KEY (sentence_context_id) REFERENCES Contexts(context_id),
+                FOREIGN KEY (paragraph_context_id) REFERENCES Contexts(context_id),
+                UNIQUE (word_id, word_index, path_id)
+            )""",
+        ],
+        _move_contexts_to_contexts_table,
+    ),
+    Migration(
+        9,
+        "Add index for random word index sampling",
+        [
+            # the occurrences of a word in id order, which random sampling bounds,
+            # counts and skips through without touching the table
+            """CREATE INDEX IF NOT EXISTS idx_wordindexentries_word_id
+                ON WordIndexEntries (word_id, word_indices_id)""",
+        ],
+    ),
+    Migration(
+        10,
+        "Add ContextsFts full text index of sentences",
+        [
+            # the tokens of each sentence context keyed by context_id, the text
+            # itself stays in Contexts
+            """CREATE VIRTUAL TABLE IF NOT EXISTS ContextsFts USING fts5 (
+                sentence,
+                content = '',
+                tokenize = 'unicode61 remove_diacritics 2'
+            )""",
+            """INSERT INTO ContextsFts (rowid, sentence)
+                SELECT context_id, context_text(content, compressed_content)
+                FROM Contexts
+                WHERE context_id IN (
+                    SELECT sentence_context_id FROM WordIndexEntries
+                )""",
+        ],
+    ),
+    Migration(
+        11,
+        "Store search history as a path bitmap per word",
+        [
+            # the paths searched for each word, run-length encoded (app.model.pathbitmap)
+            """CREATE TABLE IF NOT EXISTS SearchBitmaps (
+                word_id INTEGER PRIMARY KEY,
+                bitmap BLOB,
+                path_count INTEGER DEFAULT 0,
+                FOREIGN KEY (word_id) REFERENCES Words(word_id)
+            )""",
+        ],
+        _move_search_history_to_bitmaps,
+    ),
+    Migration(
+        12,
+        "Add TextFilters table of per-text Bloom filters",
+        [
+            # the words of each text as a Bloom filter (app.worker.util.bloom),
+            # ruling out texts that cannot contain a word before dispatching them
+            """CREATE TABLE IF NOT EXISTS TextFilters (
+                path_id INTEGER PRIMARY KEY,
+                filter BLOB NOT NULL,
+                FOREIGN KEY (path_id) REFERENCES Paths(path_id)
+            )""",
+        ],
+    ),
+    Migration(
+        13,
+        "Add WordFormCache table of computed word forms",
+        [
+            # the forms word_forms found for a word as a json array, so that
+            # nltk and wordnet are only loaded for a word the first time
+            """CREATE TABLE IF NOT EXISTS WordFormCache (
+                word TEXT NOT NULL,
+                similarity_threshold REAL NOT NULL,
+                forms TEXT NOT NULL,
+                cached_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (word, similarity_threshold)
+            )""",
+        ],
+    ),
+    Migration(
+        14,
+        "Rank word indices within their word for random sampling",
+        apply=_rank_word_indices,
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn):
+    """
+    Reads the schema version of a database.
+
+    Returns:
+        int: the highest version recorded in schema_version, 0 for a new database.
+    """
+    has_schema_version = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    ).fetchone()
+    if not has_schema_version:
+        return 0
+    result = conn.execute(
+        "SELECT MAX(CAST(version AS INTEGER)) FROM schema_version"
+    ).fetchone()
+    return result[0] or 0
+
+
+def pending_migrations(conn):
+    """the migrations a database has yet to apply, in order"""
+    version = current_version(conn)
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+
+def _apply_migration(conn, migration):
+    """runs a migration's statements and records its version, within a transaction"""
+    for statement in migration.statements:
+        conn.execute(statement)
+    if migration.apply is not None:
+        migration.apply(conn)
+    conn.execute(
+        "INSERT OR REPLACE INTO schema_version (version, description) VALUES (?, ?)",
+        (str(migration.version), migration.description),
+    )
+
+
+def migrate(conn, dry_run=False):
+    """
+    Applies the pending migrations of a database, each in its own transaction.
+
+    Args:
+        conn (sqlite3.Connection): the connection to the database.
+        dry_run (bool): apply the migrations in a single transaction that is rolled
+            back, leaving the database unchanged but timing what would be done.
+
+    Returns:
+        List[Tuple[Migration, float]]: the migrations applied, or that would be,
+            with the seconds each took.
+
+    Raises:
+        sqlite3.Error: when a migration fails; earlier migrations stay applied
+            unless dry_run.
+    """
+    report = []
+    pending = pending_migrations(conn)
+    if dry_run:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for migration in pending:
+                start = time.perf_counter()
+                _apply_migration(conn, migration)
+                report.append((migration, time.perf_counter() - start))
+        finally:
+            conn.rollback()
+        return report
+
+    for migration in pending:
+        start = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _apply_migration(conn, migration)
+        except sqlite3.Error:
+            conn.rollback()
+            logging.error(
+                f"migration to schema version {migration.version} failed,"
+                " the database is left at the previous version"
+            )
+            raise
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        logging.debug(
+            f"applied migration {migration.version} ({migration.description})"
+            f" in {elapsed:.3f}s"
+        )
+        report.append((migration, elapsed))
+    return report
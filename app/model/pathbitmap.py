@@ -0,0 +1,248 @@
+# pathbitmap.py
+# Sets of path_ids as bitmaps, stored run-length encoded in the SearchBitmaps table.
+
+import random
+import re
+
+# the first byte of every encoded bitmap, identifying the encoding: the lengths of
+# alternating gaps and runs, or the bits themselves, whichever is smaller, like
+# the run and bitmap containers of roaring bitmaps
+RUN_LENGTH_FORMAT = 1
+BITS_FORMAT = 2
+
+_RUN = re.compile("1+")
+
+# consecutive misses of iter_random before it lists the members left, a chance
+# below 1e-6 while at least one bit in five is a member not yet yielded
+MAX_RANDOM_MISSES = 64
+
+
+class PathBitmap:
+    """
+    A set of path_ids, bit path_id of an integer being set for each member.
+
+    Set operations run on whole integers rather than path by path. Stored, a
+    bitmap is run-length encoded, path_ids being searched a range at a time so
+    that the searched paths of a word form long runs, unless its bits are
+    fragmented enough that storing them as is takes less space.
+
+    Attributes:
+        bits (int): the bitmap, left unchanged once set, set operations returning
+            new bitmaps.
+    """
+
+    __slots__ = ("bits", "_bytes")
+
+    def __init__(self, bits=0):
+        self.bits = bits
+        self._bytes = None
+
+    @classmethod
+    def from_path_ids(cls, path_ids):
+        """the bitmap of the path_ids"""
+        path_ids = sorted(set(path_ids))
+        if not path_ids:
+            return cls()
+        digits = bytearray(b"0" * (path_ids[-1] + 1))
+        for path_id in path_ids:
+            digits[path_id] = ord("1")
+        return cls(int(digits[::-1], 2))
+
+    @classmethod
+    def from_blob(cls, blob):
+        """
+        Decodes a stored bitmap.
+
+        Args:
+            blob (bytes): the encoding from to_blob, None or empty for no paths.
+
+        Raises:
+            ValueError: for an unknown encoding.
+        """
+        if not blob:
+            return cls()
+        if blob[0] == BITS_FORMAT:
+            return cls(int.from_bytes(blob[1:], "little"))
+        if blob[0] != RUN_LENGTH_FORMAT:
+            raise ValueError(f"unknown path bitmap format {blob[0]}")
+        numbers = _decode_varints(blob, 1)
+        digits = []
+        for gap, length in zip(numbers[0::2], numbers[1::2]):
+            digits.append("0" * gap + "1" * length)
+        joined = "".join(digits)
+        return cls(int(joined[::-1], 2) if joined else 0)
+
+    def to_blob(self):
+        """the bitmap encoded in the smaller of its two formats"""
+        bits_size = (self.bits.bit_length() + 7) // 8
+        # each run starts and ends at a change of bit, and takes at least two bytes
+        run_count = bin(self.bits ^ (self.bits << 1)).count("1") // 2
+        if 2 * run_count >= bits_size:
+            return bytes([BITS_FORMAT]) + self.bits.to_bytes(bits_size, "little")
+        numbers, position = [], 0
+        for run in _RUN.finditer(self._digits()):
+            numbers.extend((run.start() - position, run.end() - run.start()))
+            position = run.end()
+        return bytes([RUN_LENGTH_FORMAT]) + _encode_varints(numbers)
+
+    def _digits(self):
+        """the bits as a string of 0 and 1, character i for bit i"""
+        return bin(self.bits)[:1:-1] if self.bits else ""
+
+    def __or__(self, other):
+        return PathBitmap(self.bits | other.bits)
+
+    def __and__(self, other):
+        return PathBitmap(self.bits & other.bits)
+
+    def __sub__(self, other):
+        return PathBitmap(self.bits & ~other.bits)
+
+    def __eq__(self, other):
+        return isinstance(other, PathBitmap) and self.bits == other.bits
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __contains__(self, path_id):
+        # a byte lookup, shifting the integer copies every bit above path_id
+        if self._bytes is None:
+            self._bytes = self.bits.to_bytes(
+                (self.bits.bit_length() + 7) // 8, "little"
+            )
+        if path_id >> 3 >= len(self._bytes):
+            return False
+        return (self._bytes[path_id >> 3] >> (path_id & 7)) & 1 == 1
+
+    def __len__(self):
+        return bin(self.bits).count("1")
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def iter_from(self, start_path_id):
+        """
+        The path_ids in ascending order from start_path_id.
+
+        Args:
+            start_path_id (int): the lowest path_id to yield first.
+        """
+        digits = self._digits()
+        position = digits.find("1", start_path_id)
+        while position != -1:
+            yield position
+            position = digits.find("1", position + 1)
+
+    def iter_random(self, rng=random):
+        """
+        The path_ids in uniformly random order, each once.
+
+        Bit positions below the highest member are drawn at random and kept when
+        they are members not yet yielded, so each yield is uniform over the members
+        left, without listing the members first. Once misses outnumber
+        MAX_RANDOM_MISSES in a row, the members left are sparse enough that they
+        are listed and shuffled lazily (Fisher-Yates) instead.
+
+        Args:
+            rng (random.Random): the source of randomness.
+        """
+        if not self.bits:
+            return
+        bit_count = self.bits.bit_length()
+        yielded = set()
+        misses = 0
+        while misses < MAX_RANDOM_MISSES:
+            position = rng.randrange(bit_count)
+            if position in yielded or position not in self:
+                misses += 1
+                continue
+            misses = 0
+            yielded.add(position)
+            yield position
+        path_ids = [path_id for path_id in self if path_id not in yielded]
+        for drawn in range(len(path_ids)):
+            rank = rng.randrange(drawn, len(path_ids))
+            path_ids[drawn], path_ids[rank] = path_ids[rank], path_ids[drawn]
+            yield path_ids[drawn]
+
+
+# the value of byte {offset} of blob {blob} in plain sql, which has no byte access
+_BLOB_BYTE = """(
+    (instr('0123456789ABCDEF', substr(hex(substr({blob}, {offset}, 1)), 1, 1)) - 1) * 16
+    + instr('0123456789ABCDEF', substr(hex(substr({blob}, {offset}, 1)), 2, 1)) - 1
+)"""
+
+# the body of the SearchHistory view, listing the path_ids of every SearchBitmaps
+# bitmap as (word_id, path_id) rows; it decodes both formats in plain sql so that
+# any sqlite client can read the view
+SEARCH_HISTORY_VIEW_QUERY = f"""
+WITH RECURSIVE
+    -- run-length format: the varints after the format byte, a byte per row, each
+    -- row noting the run whose length its previous byte completed
+    varints (
+        word_id, offset, byte, number, shift, item, position, run_start, run_length
+    ) AS (
+        SELECT word_id, 2, {_BLOB_BYTE.format(blob="bitmap", offset="2")},
+            0, 0, 0, 0, NULL, NULL
+        FROM SearchBitmaps WHERE substr(bitmap, 1, 1) = x'{RUN_LENGTH_FORMAT:02x}'
+        UNION ALL
+        SELECT v.word_id, v.offset + 1,
+            {_BLOB_BYTE.format(blob="b.bitmap", offset="v.offset + 1")},
+            CASE WHEN v.byte >= 128
+                THEN v.number + ((v.byte - 128) << v.shift) ELSE 0 END,
+            CASE WHEN v.byte >= 128 THEN v.shift + 7 ELSE 0 END,
+            CASE WHEN v.byte >= 128 THEN v.item ELSE v.item + 1 END,
+            CASE WHEN v.byte >= 128
+                THEN v.position ELSE v.position + v.number + (v.byte << v.shift) END,
+            CASE WHEN v.byte < 128 AND v.item % 2 = 1 THEN v.position END,
+            CASE WHEN v.byte < 128 AND v.item % 2 = 1
+                THEN v.number + (v.byte << v.shift) END
+        FROM varints v JOIN SearchBitmaps b ON b.word_id = v.word_id
+        WHERE v.offset <= length(b.bitmap)
+    ),
+    runs (word_id, path_id, last_path_id) AS (
+        SELECT word_id, run_start, run_start + run_length - 1
+        FROM varints WHERE run_start IS NOT NULL
+        UNION ALL
+        SELECT word_id, path_id + 1, last_path_id FROM runs
+        WHERE path_id < last_path_id
+    ),
+    -- bits format: the bytes after the format byte, bit i of them for path_id i
+    bytes (word_id, offset, byte) AS (
+        SELECT word_id, 2, {_BLOB_BYTE.format(blob="bitmap", offset="2")}
+        FROM SearchBitmaps WHERE substr(bitmap, 1, 1) = x'{BITS_FORMAT:02x}'
+        UNION ALL
+        SELECT y.word_id, y.offset + 1,
+            {_BLOB_BYTE.format(blob="b.bitmap", offset="y.offset + 1")}
+        FROM bytes y JOIN SearchBitmaps b ON b.word_id = y.word_id
+        WHERE y.offset < length(b.bitmap)
+    ),
+    bits (bit) AS (VALUES (0), (1), (2), (3), (4), (5), (6), (7))
+SELECT word_id, path_id FROM runs
+UNION ALL
+SELECT word_id, (offset - 2) * 8 + bit FROM bytes, bits WHERE (byte >> bit) & 1
+"""
+
+
+def _encode_varints(numbers):
+    """unsigned LEB128 encoding of the numbers"""
+    encoded = bytearray()
+    for number in numbers:
+        while number >= 0x80:
+            encoded.append((number & 0x7F) | 0x80)
+            number >>= 7
+        encoded.append(number)
+    return bytes(encoded)
+
+
+def _decode_varints(encoded, offset=0):
+    """the numbers of an unsigned LEB128 encoding, from offset"""
+    numbers, number, shift = [], 0, 0
+    for byte in encoded[offset:]:
+        number |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            numbers.append(number)
+            number, shift = 0, 0
+    return numbers
@@ -14,17 +14,31 @@ Dependencies:
 
 Created by krunch3r76 on 12-28-2023
 """
+from contextlib import contextmanager
+import hashlib
+import itertools
 import logging
 import json
+from pathlib import Path
+import random
 import sqlite3
 
+from .connectionprofile import close_with_checkpoint
+from .contexts import context_text, index_sentences, store_contexts
+from .migrations import WORD_INDEX_COLUMNS
+from .pathbitmap import PathBitmap
 from .wordsdbconnection import create_words_db_connection
 from constants import WORDS_DB_FILE, TEXT_DETAILS_DB_FILE
 
 from .contextdbconnection import create_text_details_db_connection
+from app.util.resource import parse_target_paths
+from app.worker.util.bloom import BloomFilter
 
 logger = logging.getLogger()
 
+# unsearched paths whose text filters are read at a time while selecting paths
+TEXT_FILTER_CHUNK_SIZE = 256
+
 
 class WordIndexerModel:
     """
@@ -35,6 +49,9 @@ class WordIndexerModel:
     Attributes:
         words_db_connection (sqlite3.connection):
         path_limit (int): upper count of paths to return when querying unsearched
+        words_db_path (str): the words database, e.g. for a DBWriter to connect to
+        text_details_db_path (str): the text details database attached as contextDb
+        dispatch_filters (dict): the catalog metadata the texts searched must match
     """
 
     # (attribute) words_db_connection
@@ -43,13 +60,33 @@ class WordIndexerModel:
         words_db_path=str(WORDS_DB_FILE),
         text_details_db_path=str(TEXT_DETAILS_DB_FILE),
         path_limit=None,
+        compress_contexts=False,
+        dispatch_filters=None,
     ):
         """
         Args:
             words_db_path (stringable): path to on disk sqlite words database (created if non existent)
             context_db_path (stringable): deprecated, path to context database
             path_limit (int): max number of path's returned by unsearched paths query
+            compress_contexts (bool): zlib compress the sentence and paragraph
+                contexts stored that shrink, which the WordIndices view then
+                returns as stored
+            dispatch_filters (dict): values keyed by BROWSE_META_FILTERS names, e.g.
+                {"language": "en", "type": "Text"}; only the paths of texts whose
+                catalog entry in contextDb.Meta matches are returned as unsearched
+
+        Raises:
+            ValueError: for an unknown dispatch filter.
         """
+        self._transaction_depth = 0
+        self.words_db_path = str(words_db_path)
+        self.text_details_db_path = str(text_details_db_path)
+        self.compress_contexts = compress_contexts
+        self.dispatch_filters = dict(dispatch_filters or {})
+        self._meta_filter_conditions(self.dispatch_filters)
+        self._reachable_bitmap = None
+        self._dispatchable_bitmap = None
+        self._browse_paths_key = None
         # Create the primary connection (e.g., words database)
         self.words_db_connection = create_words_db_connection(words_db_path, self)
         self.path_limit = path_limit
@@ -59,6 +96,37 @@ class WordIndexerModel:
         )
         self._attach_textinfo_db(self.text_details_db_connection)
 
+    @contextmanager
+    def transaction(self):
+        """
+        Groups the model's writes within the block into a single transaction.
+
+        Methods that would commit on their own leave committing to the outermost
+        transaction block, which commits when the block completes and rolls back
+        when it raises. Blocks may be nested.
+        """
+        self._transaction_depth += 1
+        try:
+            yield
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.words_db_connection.rollback()
+            raise
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0:
+            self.words_db_connection.commit()
+
+    def _commit(self):
+        """commits unless within a transaction block, which commits when it completes"""
+        if self._transaction_depth == 0:
+            self.words_db_connection.commit()
+
+    def close(self):
+        """closes the databases, checkpointing the words database's write-ahead log"""
+        close_with_checkpoint(self.words_db_connection)
+        self.text_details_db_connection.close()
+
     def _attach_textinfo_db(self, text_details_conn):
         # Use the ATTACH DATABASE command to attach context database to words database
         text_details_db_path = text_details_conn.execute(
@@ -108,6 +176,12 @@ class WordIndexerModel:
         Fetches a random WordIndices row where word_indices_id is greater than last_processed_id
         and the word matches one of the specified words in the Words table.
 
+        Every matching occurrence is equally likely. Rather than sorting them all,
+        a rank is drawn among the words' occurrences above last_processed_id and
+        its occurrence looked up by the word_rank that numbers each word's
+        occurrences in id order, each step a seek in an index, so that the cost is
+        logarithmic in the table whatever the number of occurrences.
+
         Args:
             last_processed_id (int): The word_indices_id threshold.
             words (list of str): The words to match in the Words table.
@@ -120,19 +194,278 @@ class WordIndexerModel:
 
         with self.cursor_context(use_row_factory=True) as cursor:
             placeholders = ",".join("?" * len(words))
-            query = f"""
-                    SELECT wi.*
-                    FROM WordIndices wi
-                    JOIN Words w ON wi.word_id = w.word_id
-                    WHERE wi.word_indices_id > ?
-                    AND w.word IN ({placeholders})
-                    ORDER BY RANDOM()
-                    LIMIT 1;
-                    """
-            cursor.execute(query, (last_processed_id, *words))
+            cursor.execute(
+                f"SELECT word_id FROM Words WHERE word IN ({placeholders})", words
+            )
+            word_ids = {row[0] for row in cursor.fetchall()}
+            if not word_ids:
+                return None
 
+            word_indices_id = self._sample_word_indices_id(
+                cursor, word_ids, last_processed_id
+            )
+            if word_indices_id is None:
+                return None
+            cursor.execute(
+                "SELECT * FROM WordIndices WHERE word_indices_id = ?",
+                (word_indices_id,),
+            )
             result = cursor.fetchone()
-            return dict(result) if result else None
+            if result is None:
+                return None
+            result = dict(result)
+            for context in ("sentence", "paragraph"):
+                result[f"context_{context}"] = context_text(
+                    result[f"context_{context}"],
+                    result.pop(f"{context}_compressed"),
+                )
+            return result
+
+    def _sample_word_indices_id(self, cursor, word_ids, last_processed_id):
+        """draws the id of an occurrence of one of word_ids above last_processed_id"""
+        rank_ranges = []
+        for word_id in word_ids:
+            # the rank of the word's first occurrence above last_processed_id and
+            # its highest, queried apart so that each is a single index seek
+            cursor.execute(
+                """SELECT word_rank FROM WordIndexEntries
+                WHERE word_id = ? AND word_indices_id > ?
+                ORDER BY word_indices_id
+                LIMIT 1""",
+                (word_id, last_processed_id),
+            )
+            row = cursor.fetchone()
+            if row is None:
+                continue
+            cursor.execute(
+                "SELECT MAX(word_rank) FROM WordIndexEntries WHERE word_id = ?",
+                (word_id,),
+            )
+            rank_ranges.append((word_id, row[0], cursor.fetchone()[0]))
+        if not rank_ranges:
+            return None
+
+        draw = random.randrange(sum(high - low + 1 for _, low, high in rank_ranges))
+        for word_id, low, high in rank_ranges:
+            if draw <= high - low:
+                break
+            draw -= high - low + 1
+        cursor.execute(
+            """SELECT word_indices_id FROM WordIndexEntries
+            WHERE word_id = ? AND word_rank = ?""",
+            (word_id, low + draw),
+        )
+        return cursor.fetchone()[0]
+
+    # text metadata filters of browse_word_indices: the Meta column and whether it
+    # matches exactly, by case insensitive substring or by any of its "; "
+    # separated items, as a text in several languages lists them, e.g. "en; fr"
+    BROWSE_META_FILTERS = {
+        "language": ("Language", "item"),
+        "type": ("Type", "exact"),
+        "title": ("Title", "substring"),
+        "author": ("Authors", "substring"),
+        "subject": ("Subjects", "substring"),
+        "bookshelf": ("Bookshelves", "substring"),
+    }
+
+    META_FILTER_COMPARISONS = {
+        "exact": "m.{column} = ?",
+        "substring": "instr(lower(m.{column}), lower(?)) > 0",
+        "item": "instr(';' || replace(m.{column}, ' ', '') || ';', ';' || ? || ';') > 0",
+    }
+
+    def _meta_filter_conditions(self, meta_filters):
+        """
+        The conditions on contextDb.Meta of metadata filters, for a query of Paths p.
+
+        Args:
+            meta_filters (dict): values keyed by BROWSE_META_FILTERS names.
+
+        Returns:
+            tuple: the sql conditions and their parameters.
+
+        Raises:
+            ValueError: for an unknown metadata filter.
+        """
+        conditions, parameters = [], []
+        for name, value in (meta_filters or {}).items():
+            if name not in self.BROWSE_META_FILTERS:
+                raise ValueError(f"unknown metadata filter {name}")
+            column, match = self.BROWSE_META_FILTERS[name]
+            comparison = self.META_FILTER_COMPARISONS[match].format(column=column)
+            conditions.append(
+                f"""EXISTS (SELECT 1 FROM contextDb.Meta m
+                WHERE m.TextNumber = p.text_number AND {comparison})"""
+            )
+            parameters.append(value)
+        return conditions, parameters
+
+    def _fill_browse_paths(self, meta_filters):
+        """
+        Fills temp.BrowsePaths with the path_ids of the texts matching metadata filters.
+
+        The filters are resolved on contextDb.Meta once, as for the dispatchable
+        paths, and kept until the filters, the highest path_id or the count of
+        catalog entries change, so that browsing probes the table by path_id
+        rather than Meta for each row.
+
+        Args:
+            meta_filters (dict): values keyed by BROWSE_META_FILTERS names.
+
+        Raises:
+            ValueError: for an unknown metadata filter.
+        """
+        conditions, parameters = self._meta_filter_conditions(meta_filters)
+        connection = self.words_db_connection
+        key = (
+            tuple(sorted(meta_filters.items())),
+            *connection.execute(
+                """SELECT (SELECT MAX(path_id) FROM Paths),
+                    (SELECT COUNT(*) FROM contextDb.Meta)"""
+            ).fetchone(),
+        )
+        if key == self._browse_paths_key:
+            return
+        isolation_level = connection.isolation_level
+        if not connection.in_transaction:
+            # the table is temporary, no write lock on words.db is needed
+            connection.isolation_level = None
+        try:
+            connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS BrowsePaths (path_id INTEGER PRIMARY KEY)"
+            )
+            connection.execute("DELETE FROM temp.BrowsePaths")
+            connection.execute(
+                f"""INSERT INTO temp.BrowsePaths
+                SELECT p.path_id FROM Paths p WHERE {" AND ".join(conditions)}""",
+                parameters,
+            )
+        finally:
+            connection.isolation_level = isolation_level
+        self._browse_paths_key = key
+
+    def browse_word_indices(
+        self,
+        words=None,
+        after=None,
+        limit=50,
+        match=None,
+        near=None,
+        near_distance=10,
+        meta_filters=None,
+        include_paragraph=False,
+    ):
+        """
+        Fetches a page of WordIndices rows in (word_id, word_indices_id) order.
+
+        Pages are keyed by the last row of the previous page rather than an offset:
+        each word's occurrences are read from the (word_id, word_indices_id) index
+        starting after the key, so a page costs the same wherever it falls. The
+        sentence filters look up the matching sentences in the ContextsFts full
+        text index once per word, the metadata filters are resolved to the paths of
+        the matching texts once, and each row's path is looked up among them as the
+        index is read.
+
+        Args:
+            words (list of str): the words to browse, all words when None.
+            after (tuple): the (word_id, word_indices_id) key returned with the
+                previous page, None for the first page.
+            limit (int): the most rows to return.
+            match (str): an FTS5 query the sentence must match, e.g. "king OR queen".
+            near (str): a term the sentence must contain within near_distance
+                tokens of the word, e.g. "king".
+            near_distance (int): the most tokens between the word and near.
+            meta_filters (dict): values keyed by BROWSE_META_FILTERS names, e.g.
+                {"language": "en", "author": "dickens"}.
+            include_paragraph (bool): include the paragraph context of each row.
+
+        Returns:
+            tuple: the rows (list of dict) and the key of the next page, None after
+                the last page.
+
+        Raises:
+            ValueError: for a limit below 1 or an unknown metadata filter.
+            sqlite3.OperationalError: for a malformed match query.
+        """
+        if limit < 1:
+            # sqlite reads a negative LIMIT as none, and a page of 0 rows never ends
+            raise ValueError(f"limit must be at least 1, not {limit}")
+        conditions, condition_parameters = [], []
+        if match:
+            conditions.append(
+                """e.sentence_context_id IN (
+                SELECT rowid FROM ContextsFts WHERE ContextsFts MATCH ?)"""
+            )
+            condition_parameters.append(match)
+        if meta_filters:
+            self._fill_browse_paths(meta_filters)
+            conditions.append("e.path_id IN (SELECT path_id FROM temp.BrowsePaths)")
+        if near:
+            conditions.append(
+                """e.sentence_context_id IN (
+                SELECT rowid FROM ContextsFts WHERE ContextsFts MATCH ?)"""
+            )
+
+        paragraph_column, paragraph_join = "", ""
+        if include_paragraph:
+            paragraph_column = (
+                ", context_text(pc.content, pc.compressed_content) AS context_paragraph"
+            )
+            paragraph_join = (
+                "LEFT JOIN Contexts pc ON pc.context_id = e.paragraph_context_id"
+            )
+        query = f"""
+            SELECT e.word_indices_id, e.word_id, w.word, e.path_id, p.text_number,
+                e.word_index,
+                (SELECT Title FROM contextDb.Meta WHERE TextNumber = p.text_number
+                    LIMIT 1) AS title,
+                context_text(s.content, s.compressed_content) AS context_sentence
+                {paragraph_column}
+            FROM WordIndexEntries e INDEXED BY idx_wordindexentries_word_id
+            JOIN Words w ON w.word_id = e.word_id
+            JOIN Paths p ON p.path_id = e.path_id
+            LEFT JOIN Contexts s ON s.context_id = e.sentence_context_id
+            {paragraph_join}
+            WHERE e.word_id = ? AND e.word_indices_id > ?
+            {"".join(" AND " + condition for condition in conditions)}
+            ORDER BY e.word_indices_id
+            LIMIT ?"""
+
+        after_word_id, after_word_indices_id = after or (0, 0)
+        rows = []
+        with self.cursor_context(use_row_factory=True) as cursor:
+            if words is None:
+                cursor.execute(
+                    "SELECT word_id, word FROM Words WHERE word_id >= ? ORDER BY word_id",
+                    (after_word_id,),
+                )
+            else:
+                placeholders = ",".join("?" * len(words))
+                cursor.execute(
+                    f"""SELECT word_id, word FROM Words
+                    WHERE word IN ({placeholders}) AND word_id >= ?
+                    ORDER BY word_id""",
+                    (*words, after_word_id),
+                )
+            word_records = cursor.fetchall()
+            for word_id, word in word_records:
+                parameters = [
+                    word_id,
+                    after_word_indices_id if word_id == after_word_id else 0,
+                    *condition_parameters,
+                ]
+                if near:
+                    parameters.append(
+                        f"NEAR({_fts_phrase(word)} {_fts_phrase(near)}, {near_distance})"
+                    )
+                parameters.append(limit - len(rows))
+                cursor.execute(query, parameters)
+                rows.extend(dict(row) for row in cursor.fetchall())
+                if len(rows) == limit:
+                    last = rows[-1]
+                    return rows, (last["word_id"], last["word_indices_id"])
+        return rows, None
 
     def cursor_context(self, use_row_factory=False):
         return WordIndexerModel.CursorContextManager(
@@ -189,7 +522,7 @@ class WordIndexerModel:
                         "INSERT OR REPLACE INTO History (id, ultimate_max_index_id, penultimate_max_index_id) VALUES (1, ?, ?)",
                         (new_max_id, new_max_id),
                     )
-                    self.words_db_connection.commit()
+                    self._commit()
                     return -1
 
                 historical_max_id = result[0]
@@ -206,7 +539,7 @@ class WordIndexerModel:
                 )
 
             # Commit the transaction
-            self.words_db_connection.commit()
+            self._commit()
             return new_max_id - historical_max_id
 
         except Exception as e:
@@ -221,7 +554,7 @@ class WordIndexerModel:
         Performs a sql query to identify the most recent inserted record.
         """
         with self.cursor_context() as cursor:
-            cursor.execute("SELECT MAX(word_indices_id) FROM WordIndices")
+            cursor.execute("SELECT MAX(word_indices_id) FROM WordIndexEntries")
             max_id = cursor.fetchone()[0]
 
         if max_id is not None:
@@ -242,13 +575,70 @@ class WordIndexerModel:
             paths input and stored as the path component of a gutenberg url
         """
         cursor = self.words_db_connection.cursor()
+        cursor.executemany(
+            "INSERT OR IGNORE INTO Paths (path, text_number) VALUES (?, ?)",
+            paths_and_text_numbers,
+        )
+        self._commit()
+
+    def ingest_targets_file(self, targets_file_path):
+        """
+        Adds the paths of a targets file's urls that are not yet in Paths, unless the
+        file is unchanged since it was last ingested.
+
+        The file's size, mtime and sha256 are kept in TargetsFiles. When size and
+        mtime match, the file is not even read; when only its hash matches, just
+        the recorded state is refreshed. Otherwise its paths are diffed against
+        Paths and the new ones inserted together with the file's state in a single
+        transaction. Paths whose urls were removed from the file are kept, as
+        their search histories and word indices refer to them.
 
-        for path, text_number in paths_and_text_numbers:
+        Args:
+            targets_file_path (stringable): the file of urls, one per line
+
+        Returns:
+            int or None: the number of paths added, None when the file was unchanged
+        """
+        targets_file_path = Path(targets_file_path)
+        file_path = str(targets_file_path.resolve())
+        stat = targets_file_path.stat()
+        cursor = self._cursor()
+        cursor.execute(
+            "SELECT size, mtime_ns, sha256 FROM TargetsFiles WHERE file_path = ?",
+            (file_path,),
+        )
+        recorded_state = cursor.fetchone()
+        if recorded_state is not None and tuple(recorded_state[:2]) == (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            return None
+
+        content = targets_file_path.read_bytes()
+        sha256 = hashlib.sha256(content).hexdigest()
+        added_count = None
+        with self.transaction():
+            if recorded_state is None or recorded_state[2] != sha256:
+                cursor.execute("SELECT path FROM Paths")
+                existing_paths = {path for (path,) in cursor.fetchall()}
+                new_paths_and_text_numbers = {
+                    path: text_number
+                    for path, text_number in parse_target_paths(
+                        content.decode("utf-8").splitlines()
+                    )
+                    if path not in existing_paths
+                }
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO Paths (path, text_number) VALUES (?, ?)",
+                    new_paths_and_text_numbers.items(),
+                )
+                added_count = cursor.rowcount
             cursor.execute(
-                "INSERT OR IGNORE INTO Paths (path, text_number) VALUES (?, ?)",
-                (path, text_number),
+                """INSERT OR REPLACE INTO TargetsFiles (file_path, size, mtime_ns, sha256)
+                VALUES (?, ?, ?, ?)""",
+                (file_path, stat.st_size, stat.st_mtime_ns, sha256),
             )
-        self.words_db_connection.commit()
+        return added_count
 
     def mark_paths_unreachable(self, path_ids):
         """
@@ -260,7 +650,7 @@ class WordIndexerModel:
         update_query = "UPDATE Paths SET is_unreachable = 1 WHERE path_id = ?"
         cursor = self._cursor()
         cursor.executemany(update_query, [(path_id,) for path_id in path_ids])
-        self.words_db_connection.commit()
+        self._commit()
 
     def fetch_word_records(self, words):
         """
@@ -359,7 +749,7 @@ class WordIndexerModel:
                         "INSERT INTO Words (word, form_group_id) VALUES (?, ?)",
                         (w, form_group_id),
                     )
-            self.words_db_connection.commit()
+        self._commit()
 
     def _cursor(self):
         """
@@ -430,103 +820,685 @@ class WordIndexerModel:
             dictionary of tuples to lists: keys are tuples of words associated with a list of
                 path_ids from Paths
         """
+        return {
+            words: [path_record["path_id"] for path_record in path_records]
+            for words, path_records in self.get_unsearched_paths_for_word_group(
+                word
+            ).items()
+        }
 
-        # setup cursor for Row factory
-        original_row_factory = self.words_db_connection.row_factory
-        self.words_db_connection.row_factory = sqlite3.Row
+    def fetch_search_bitmaps(self, word_ids):
+        """
+        Retrieves the paths searched for each word as bitmaps
+
+        Args:
+            word_ids (Iterable[int]): existing word_ids
+
+        Returns:
+            dict: a PathBitmap keyed by each word_id, empty for words never searched
+        """
+        word_ids = list(word_ids)
         cursor = self._cursor()
+        placeholders = ", ".join("?" for _ in word_ids)
+        cursor.execute(
+            f"SELECT word_id, bitmap FROM SearchBitmaps WHERE word_id IN ({placeholders})",
+            word_ids,
+        )
+        bitmaps = {word_id: PathBitmap() for word_id in word_ids}
+        for word_id, bitmap in cursor.fetchall():
+            bitmaps[word_id] = PathBitmap.from_blob(bitmap)
+        return bitmaps
 
-        # Combined query to get word_ids and words for a given group
-        query = """
-        SELECT w1.word_id, w1.word
-        FROM Words w1
-        JOIN Words w2 ON w1.form_group_id = w2.form_group_id
-        WHERE w2.word = ?
+    def fetch_reachable_bitmap(self):
         """
-        cursor.execute(query, (word,))
-        word_ids_and_words = cursor.fetchall()
+        Retrieves the path_ids of the reachable paths as a bitmap
 
-        # Function to get unsearched path IDs for a given word_id
-        def unsearched_path_ids_for_word_id(word_id, randomorder=True):
-            limit_clause = (
-                f"LIMIT {self.path_limit}" if self.path_limit is not None else ""
+        Paths are only ever added or marked unreachable, so the bitmap is kept
+        until the highest path_id or the count of reachable paths changes.
+
+        Returns:
+            PathBitmap: the reachable paths
+        """
+        cursor = self._cursor()
+        cursor.execute(
+            """SELECT
+                (SELECT MAX(path_id) FROM Paths),
+                (SELECT COUNT(*) FROM Paths INDEXED BY idx_paths_reachable
+                    WHERE is_unreachable = 0)"""
+        )
+        key = cursor.fetchone()
+        if self._reachable_bitmap is None or self._reachable_bitmap[0] != key:
+            cursor.execute(
+                "SELECT path_id FROM Paths INDEXED BY idx_paths_reachable"
+                " WHERE is_unreachable = 0"
             )
-            order_by_clause = "ORDER BY RANDOM()" if randomorder else "ORDER BY path_id"
-            query = f"""
-            SELECT path_id
-            FROM Paths
-            WHERE path_id NOT IN (
-                SELECT path_id
-                FROM SearchHistory
-                WHERE word_id = ?
+            self._reachable_bitmap = (
+                key,
+                PathBitmap.from_path_ids(row[0] for row in cursor.fetchall()),
             )
-            AND is_unreachable = 0
-            {order_by_clause} {limit_clause}
-            """
-            cursor.execute(query, (word_id,))
-            return [row[0] for row in cursor.fetchall()]
+        return self._reachable_bitmap[1]
 
-        # Building the mapping
-        unsearched_paths_to_words = {}
-        for word_id, word in word_ids_and_words:
-            path_ids = tuple(unsearched_path_ids_for_word_id(word_id))
-            if path_ids not in unsearched_paths_to_words:
-                unsearched_paths_to_words[path_ids] = []
-            unsearched_paths_to_words[path_ids].append(word)
+    def fetch_dispatchable_bitmap(self):
+        """
+        Retrieves the reachable paths whose texts match dispatch_filters as a bitmap
 
-        self.words_db_connection.row_factory = original_row_factory
+        The paths are those of Paths joined with the catalog in contextDb.Meta,
+        kept until the reachable paths or the count of catalog entries change.
 
-        # Invert the mapping to map the lists of words to distinct lists of search paths
-        return {
-            tuple(words): paths for paths, words in unsearched_paths_to_words.items()
+        Returns:
+            PathBitmap: the dispatchable paths, every reachable path without
+                dispatch filters
+        """
+        reachable = self.fetch_reachable_bitmap()
+        if not self.dispatch_filters:
+            return reachable
+        cursor = self._cursor()
+        cursor.execute("SELECT COUNT(*) FROM contextDb.Meta")
+        key = (self._reachable_bitmap[0], cursor.fetchone()[0])
+        if self._dispatchable_bitmap is None or self._dispatchable_bitmap[0] != key:
+            conditions, parameters = self._meta_filter_conditions(
+                self.dispatch_filters
+            )
+            cursor.execute(
+                f"""SELECT p.path_id FROM Paths p INDEXED BY idx_paths_reachable
+                WHERE p.is_unreachable = 0 AND {" AND ".join(conditions)}""",
+                parameters,
+            )
+            self._dispatchable_bitmap = (
+                key,
+                PathBitmap.from_path_ids(row[0] for row in cursor.fetchall()),
+            )
+            if key[1] == 0:
+                logger.warning(
+                    "the text catalog is empty, no text matches the dispatch filters"
+                    " (see app.util.load_catalog)"
+                )
+        return self._dispatchable_bitmap[1]
+
+    def _fetch_unsearched_paths_with_missing_word_ids(self, word):
+        """
+        Selects up to path_limit reachable paths not yet searched for some word of the
+        group, with the word_ids each is still missing, in one pass.
+
+        Paths are drawn in uniformly random order (PathBitmap.iter_random), so each
+        selection is a random sample of the unsearched paths. The unsearched paths
+        of each word of the group are the reachable paths whose texts match
+        dispatch_filters less its SearchBitmaps bitmap, and the group's are their
+        union, so each path is checked against whole bitmaps rather than probing a
+        row per word and path, stopping as soon as enough paths are found.
+
+        A missing word that the TextFilters filter of a path rules out is recorded
+        as searched on the path, with no occurrences, instead of being selected,
+        and a path whose every missing word is ruled out is not selected at all.
+
+        Args:
+            word (str): a representative word of the group
+
+        Returns:
+            list of tuple: a complete Paths record as a dict and the set of missing
+                word_ids of each path
+        """
+        cursor = self._cursor()
+        cursor.execute(
+            """
+            SELECT w1.word_id, w1.word
+            FROM Words w1
+            JOIN Words w2 ON w1.form_group_id = w2.form_group_id
+            WHERE w2.word = ?
+            """,
+            (word,),
+        )
+        words_by_id = dict(cursor.fetchall())
+        if not words_by_id:
+            return []
+
+        dispatchable = self.fetch_dispatchable_bitmap()
+        unsearched_by_word_id = {
+            word_id: dispatchable - searched
+            for word_id, searched in self.fetch_search_bitmaps(words_by_id).items()
         }
+        group_unsearched = PathBitmap()
+        for unsearched in unsearched_by_word_id.values():
+            group_unsearched |= unsearched
+
+        missing_word_ids_by_path_id = {}
+        ruled_out_histories = []
+        unsearched_path_ids = group_unsearched.iter_random()
+        while self.path_limit is None or (
+            len(missing_word_ids_by_path_id) < self.path_limit
+        ):
+            path_ids = list(
+                itertools.islice(unsearched_path_ids, TEXT_FILTER_CHUNK_SIZE)
+            )
+            if not path_ids:
+                break
+            text_filters = self.fetch_text_filters(path_ids)
+            for path_id in path_ids:
+                if self.path_limit is not None and (
+                    len(missing_word_ids_by_path_id) >= self.path_limit
+                ):
+                    break
+                missing_word_ids = {
+                    word_id
+                    for word_id, unsearched in unsearched_by_word_id.items()
+                    if path_id in unsearched
+                }
+                text_filter = text_filters.get(path_id)
+                if text_filter is not None:
+                    for word_id in list(missing_word_ids):
+                        if not text_filter.might_contain_word(words_by_id[word_id]):
+                            missing_word_ids.discard(word_id)
+                            ruled_out_histories.append(
+                                {"word_id": word_id, "path_id": path_id}
+                            )
+                if missing_word_ids:
+                    missing_word_ids_by_path_id[path_id] = frozenset(missing_word_ids)
+
+        if ruled_out_histories:
+            logger.debug(
+                f"text filters ruled out {len(ruled_out_histories)} word and path"
+                " pairs, recorded as searched"
+            )
+            self.insert_search_histories(ruled_out_histories)
+
+        path_records_by_id = {
+            path_record["path_id"]: path_record
+            for path_record in self.fetch_selected_path_records(
+                list(missing_word_ids_by_path_id)
+            )
+        }
+        return [
+            (path_records_by_id[path_id], missing_word_ids)
+            for path_id, missing_word_ids in missing_word_ids_by_path_id.items()
+        ]
 
     def get_unsearched_paths_for_word_group(self, word):
         """collate words with unsearched path ids
 
+        The group's unsearched paths are selected together, each with the words it
+        is still missing as its "word_ids", so that all of them are searched in a
+        single round while a path is only searched again for the words not yet
+        searched on it.
+
         Args:
             word (str): a word expected to be a sampling from the group it belongs to
 
         Returns:
-            one or more lists of words keyed to unsearched paths
+            the words missing from any of the paths keyed to the unsearched path
+                records, empty when every path has been searched for every word
         """
-        word_groups_to_path_ids = self.get_unsearched_path_ids_for_word_group(word)
-        wordlists_to_paths = {}
-        for wordlist, path_ids in word_groups_to_path_ids.items():
-            path_records = self.fetch_selected_path_records(path_ids)
-            wordlists_to_paths[wordlist] = path_records
-        return wordlists_to_paths
+        cursor = self._cursor()
+        cursor.execute(
+            """
+            SELECT w1.word_id, w1.word
+            FROM Words w1
+            JOIN Words w2 ON w1.form_group_id = w2.form_group_id
+            WHERE w2.word = ?
+            """,
+            (word,),
+        )
+        words_by_id = dict(cursor.fetchall())
 
-    def insert_search_histories(self, searchHistories):
+        path_records, group_word_ids = [], set()
+        for path_record, missing_word_ids in (
+            self._fetch_unsearched_paths_with_missing_word_ids(word)
+        ):
+            path_records.append({**path_record, "word_ids": sorted(missing_word_ids)})
+            group_word_ids |= missing_word_ids
+        if not path_records:
+            return {}
+
+        return {
+            tuple(words_by_id[word_id] for word_id in sorted(group_word_ids)): (
+                path_records
+            )
+        }
+
+    def insert_search_histories(self, searchHistories, commit=True):
         """update the model with what paths were searched for the words
 
+        The paths are added to the SearchBitmaps bitmap of each word.
+
         Args:
             word_id_to_path_id_pairs (list): tuples of individual word ids associated to path ids
+            commit (bool): commit the insertion, False when part of a larger transaction
+
+        Notes:
+            histories already recorded (e.g. a resumed batch whose paths were since
+            searched by another run) are ignored
         """
         if len(searchHistories) != 0:
+            path_ids_by_word_id = {}
+            for searchHistory in searchHistories:
+                path_ids_by_word_id.setdefault(searchHistory["word_id"], []).append(
+                    searchHistory["path_id"]
+                )
+            searched_by_word_id = self.fetch_search_bitmaps(path_ids_by_word_id)
             cursor = self._cursor()
-
-            columns = ", ".join(searchHistories[0].keys())
-            placeholders = ":" + ", :".join(searchHistories[0].keys())
-            sql = f"INSERT INTO SearchHistory ({columns}) VALUES ({placeholders})"
-            cursor.executemany(sql, searchHistories)
-            self.words_db_connection.commit()
+            for word_id, path_ids in path_ids_by_word_id.items():
+                searched = searched_by_word_id[word_id] | PathBitmap.from_path_ids(
+                    path_ids
+                )
+                cursor.execute(
+                    """INSERT OR REPLACE INTO SearchBitmaps
+                    (word_id, bitmap, path_count) VALUES (?, ?, ?)""",
+                    (word_id, searched.to_blob(), len(searched)),
+                )
+            if commit:
+                self._commit()
 
         return len(searchHistories)
 
-    def insert_search_results(self, wordIndices_list):
+    def insert_search_results(self, wordIndices_list, commit=True):
         """update the model with word search results
 
+        Each distinct sentence and paragraph context is stored once in the Contexts
+        table and referenced by id, the WordIndices view reads them back. Sentences
+        are added to the ContextsFts full text index for browsing. Records already
+        stored, e.g. from a retried batch, are skipped before their contexts are.
+
         Args:
             wordIndices_list (list): dictionary objects serving as records for the model to insert
+            commit (bool): commit the insertion, False when part of a larger transaction
         """
         logger.debug(f"inserting {len(wordIndices_list)} records")
+        cursor = self._cursor()
+        new_word_indices = {}
+        for word_index in wordIndices_list:
+            key = (word_index["word_id"], word_index["word_index"], word_index["path_id"])
+            if key in new_word_indices:
+                continue
+            cursor.execute(
+                """SELECT 1 FROM WordIndexEntries
+                WHERE word_id = ? AND word_index = ? AND path_id = ?""",
+                key,
+            )
+            if cursor.fetchone() is None:
+                new_word_indices[key] = word_index
+        wordIndices_list = list(new_word_indices.values())
         if len(wordIndices_list) > 0:
-            cursor = self._cursor()
-            columns = ", ".join(wordIndices_list[0].keys())
-            placeholders = ":" + ", :".join(wordIndices_list[0].keys())
-            sql = f"INSERT INTO WordIndices ({columns}) VALUES ({placeholders})"
-
-            cursor.executemany(sql, wordIndices_list)
-            self.words_db_connection.commit()
+            context_ids = store_contexts(
+                cursor,
+                (
+                    word_index.get(key, "")
+                    for word_index in wordIndices_list
+                    for key in ("context_sentence", "context_paragraph")
+                ),
+                compress=self.compress_contexts,
+            )
+            index_sentences(
+                cursor,
+                {
+                    text: context_ids[text]
+                    for text in {
+                        word_index.get("context_sentence", "")
+                        for word_index in wordIndices_list
+                    }
+                },
+            )
+            # each word's ranks continue from its highest, rows being inserted in
+            # the order of their word_indices_id
+            word_ranks = {}
+            for word_id in {word_index["word_id"] for word_index in wordIndices_list}:
+                cursor.execute(
+                    "SELECT MAX(word_rank) FROM WordIndexEntries WHERE word_id = ?",
+                    (word_id,),
+                )
+                word_ranks[word_id] = itertools.count((cursor.fetchone()[0] or 0) + 1)
+            columns = [
+                column for column in WORD_INDEX_COLUMNS if column in wordIndices_list[0]
+            ]
+            placeholders = ", ".join("?" * (len(columns) + 3))
+            sql = (
+                f"INSERT INTO WordIndexEntries ({', '.join(columns)},"
+                " sentence_context_id, paragraph_context_id, word_rank)"
+                f" VALUES ({placeholders})"
+            )
+            cursor.executemany(
+                sql,
+                [
+                    (
+                        *(word_index[column] for column in columns),
+                        context_ids[word_index.get("context_sentence", "")],
+                        context_ids[word_index.get("context_paragraph", "")],
+                        next(word_ranks[word_index["word_id"]]),
+                    )
+                    for word_index in wordIndices_list
+                ],
+            )
+            if commit:
+                self._commit()
         return len(wordIndices_list)
+
+    def store_search_result(self, searchResult):
+        """update the model with a single task's search result in one transaction
+
+        The search histories and word indices are inserted and, when the result
+        carries the batch_id of a journaled batch, the batch is marked completed,
+        so that an interruption never leaves a batch half stored. The paths the
+        node reports as cached are recorded for cache affinity scheduling, and
+        the text filters it built are stored.
+
+        Args:
+            searchResult (dict): a task's search result as streamed by the TaskSubmitter
+
+        Returns:
+            tuple: the number of search histories and of word indices inserted
+        """
+        with self.transaction():
+            paths_reached = self.insert_search_histories(
+                searchResult["search_histories"]
+            )
+            found_count = self.insert_search_results(searchResult["word_indices"])
+            if searchResult.get("batch_id") is not None:
+                self._cursor().execute(
+                    "UPDATE RunBatches SET is_completed = 1 WHERE batch_id = ?",
+                    (searchResult["batch_id"],),
+                )
+            if searchResult.get("cached_path_ids") and searchResult.get("node_id"):
+                self.record_cached_paths(
+                    searchResult["node_id"], searchResult["cached_path_ids"]
+                )
+            self.store_text_filters(searchResult.get("text_filters"))
+        return paths_reached, found_count
+
+    def store_round_results(
+        self,
+        search_histories,
+        word_indices,
+        bad_path_ids,
+        cached_path_ids,
+        text_filters=None,
+    ):
+        """update the model with the results of a whole round in one transaction
+
+        Unreachable paths are only marked when the round reached at least one path.
+
+        Args:
+            search_histories (list of dict): the round's SearchHistory records
+            word_indices (list of dict): the round's WordIndices records
+            bad_path_ids (list of int): the paths found unreachable
+            cached_path_ids (dict): the path_ids cached on each node, keyed by node_id
+            text_filters (dict, optional): the encoded text filters built, keyed by
+                path_id
+        """
+        with self.transaction():
+            for node_id, node_cached_path_ids in cached_path_ids.items():
+                self.record_cached_paths(node_id, node_cached_path_ids)
+            self.store_text_filters(text_filters)
+            if self.insert_search_histories(search_histories) > 0 or text_filters:
+                self.mark_paths_unreachable(bad_path_ids)
+                self.insert_search_results(word_indices)
+
+    def start_run(self, word):
+        """
+        Opens a new entry in the run journal.
+
+        Args:
+            word (str): the primary word of the run
+
+        Returns:
+            int: the run_id of the new run
+        """
+        cursor = self._cursor()
+        cursor.execute("INSERT INTO Runs (word) VALUES (?)", (word,))
+        self._commit()
+        return cursor.lastrowid
+
+    def finish_run(self, run_id):
+        """
+        Closes a run in the run journal so that it is no longer resumable.
+
+        Args:
+            run_id (int): the run to close
+        """
+        self._cursor().execute(
+            "UPDATE Runs SET finished_on = CURRENT_TIMESTAMP WHERE run_id = ?",
+            (run_id,),
+        )
+        self._commit()
+
+    def get_unfinished_run_id(self, word):
+        """
+        Looks up the most recent run for the word that was interrupted.
+
+        Args:
+            word (str): the primary word of the run
+
+        Returns:
+            int: the run_id or None if every run for the word finished
+        """
+        cursor = self._cursor()
+        cursor.execute(
+            """SELECT run_id FROM Runs WHERE word = ? AND finished_on IS NULL
+            ORDER BY run_id DESC LIMIT 1""",
+            (word,),
+        )
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+    def journal_batch(self, run_id, word_ids, path_ids):
+        """
+        Records a batch about to be dispatched in the run journal.
+
+        Args:
+            run_id (int): the run the batch belongs to
+            word_ids (list of int): the word_ids the batch searches for
+            path_ids (list of int): the path_ids the batch searches
+
+        Returns:
+            int: the batch_id of the journaled batch
+        """
+        cursor = self._cursor()
+        cursor.execute(
+            "INSERT INTO RunBatches (run_id, word_ids, path_ids) VALUES (?, ?, ?)",
+            (run_id, json.dumps(word_ids), json.dumps(path_ids)),
+        )
+        self._commit()
+        return cursor.lastrowid
+
+    def fetch_unfinished_batches(self, run_id):
+        """
+        Retrieves the journaled batches of a run that never completed.
+
+        Args:
+            run_id (int): the run to look up
+
+        Returns:
+            list of dict: "batch_id", "word_ids" and "path_ids" of each batch
+        """
+        cursor = self._cursor()
+        cursor.execute(
+            """SELECT batch_id, word_ids, path_ids FROM RunBatches
+            WHERE run_id = ? AND is_completed = 0 ORDER BY batch_id""",
+            (run_id,),
+        )
+        return [
+            {
+                "batch_id": batch_id,
+                "word_ids": json.loads(word_ids),
+                "path_ids": json.loads(path_ids),
+            }
+            for batch_id, word_ids, path_ids in cursor.fetchall()
+        ]
+
+    def record_cached_paths(self, node_id, path_ids, commit=True):
+        """
+        Records that a node's text cache holds the texts of paths.
+
+        Args:
+            node_id (str): the node reporting the paths
+            path_ids (list of int): the path_ids of the cached texts
+            commit (bool): commit immediately, or leave it to the caller's transaction
+        """
+        self._cursor().executemany(
+            """INSERT OR REPLACE INTO PathCache (path_id, node_id, cached_on)
+            VALUES (?, ?, CURRENT_TIMESTAMP)""",
+            [(path_id, node_id) for path_id in path_ids],
+        )
+        if commit:
+            self._commit()
+
+    def fetch_cached_node_ids(self, path_ids):
+        """
+        Looks up the nodes whose text cache holds each of the paths.
+
+        Args:
+            path_ids (list of int): the path_ids to look up
+
+        Returns:
+            dict: the node_ids keyed by path_id, most recently cached first; paths
+                cached nowhere are left out
+        """
+        cursor = self._cursor()
+        cursor.execute(
+            """SELECT path_id, node_id FROM PathCache
+            WHERE path_id IN (SELECT value FROM json_each(?))
+            ORDER BY path_id, cached_on DESC""",
+            (json.dumps(path_ids),),
+        )
+        cached_node_ids = {}
+        for path_id, node_id in cursor.fetchall():
+            cached_node_ids.setdefault(path_id, []).append(node_id)
+        return cached_node_ids
+
+    def store_text_filters(self, text_filters, commit=True):
+        """
+        Stores the Bloom filters of the words of texts, as built by the workers.
+
+        Args:
+            text_filters (dict): the encoded BloomFilter of each text keyed by path_id
+            commit (bool): commit immediately, or leave it to the caller's transaction
+        """
+        if not text_filters:
+            return
+        self._cursor().executemany(
+            "INSERT OR REPLACE INTO TextFilters (path_id, filter) VALUES (?, ?)",
+            list(text_filters.items()),
+        )
+        if commit:
+            self._commit()
+
+    def fetch_text_filters(self, path_ids):
+        """
+        Retrieves the Bloom filters of the words of texts.
+
+        Args:
+            path_ids (list of int): the path_ids to look up
+
+        Returns:
+            dict: a BloomFilter keyed by path_id, paths without one left out
+        """
+        cursor = self._cursor()
+        cursor.execute(
+            """SELECT path_id, filter FROM TextFilters
+            WHERE path_id IN (SELECT value FROM json_each(?))""",
+            (json.dumps(path_ids),),
+        )
+        return {
+            path_id: BloomFilter.from_bytes(text_filter)
+            for path_id, text_filter in cursor.fetchall()
+        }
+
+    def fetch_unfiltered_path_records(self, limit=None):
+        """
+        Retrieves reachable paths whose texts have no filter yet, lowest path_id first.
+
+        Args:
+            limit (int, optional): the number of paths at most, path_limit when None
+
+        Returns:
+            list of dict: the complete Paths records
+        """
+        limit = self.path_limit if limit is None else limit
+        cursor = self._cursor()
+        cursor.execute(
+            """SELECT p.path_id FROM Paths p INDEXED BY idx_paths_reachable
+            WHERE p.is_unreachable = 0
+            AND NOT EXISTS (SELECT 1 FROM TextFilters f WHERE f.path_id = p.path_id)
+            ORDER BY p.path_id
+            LIMIT ?""",
+            (-1 if limit is None else limit,),
+        )
+        return self.fetch_selected_path_records([row[0] for row in cursor.fetchall()])
+
+    def fetch_form_group_words(self, words):
+        """
+        Retrieves the words sharing a form group with any of the input words
+
+        Args:
+            words (list of str): words whose form groups to expand
+
+        Returns:
+            list of str: the words of those form groups, including the input words
+                that are in the Words table
+        """
+        cursor = self._cursor()
+        placeholders = ", ".join("?" for _ in words)
+        cursor.execute(
+            f"""SELECT word FROM Words WHERE form_group_id IN (
+                SELECT form_group_id FROM Words WHERE word IN ({placeholders})
+            ) ORDER BY word_id""",
+            words,
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def fetch_cached_word_forms(self, word, similarity_threshold):
+        """
+        Looks up the forms of a word computed before with the same threshold
+
+        Args:
+            word (str): the word searched for
+            similarity_threshold (float): the threshold the forms were computed with
+
+        Returns:
+            list of str: the cached forms, None when they were never computed
+        """
+        cursor = self._cursor()
+        cursor.execute(
+            """SELECT forms FROM WordFormCache
+            WHERE word = ? AND similarity_threshold = ?""",
+            (word, similarity_threshold),
+        )
+        row = cursor.fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def cache_word_forms(self, word, similarity_threshold, forms):
+        """
+        Keeps the forms computed for a word, see fetch_cached_word_forms
+
+        Args:
+            word (str): the word searched for
+            similarity_threshold (float): the threshold the forms were computed with
+            forms (list of str): the forms found, empty for an unknown word
+        """
+        self._cursor().execute(
+            """INSERT OR REPLACE INTO WordFormCache (word, similarity_threshold, forms)
+            VALUES (?, ?, ?)""",
+            (word, similarity_threshold, json.dumps(sorted(forms))),
+        )
+        self._commit()
+
+    def fetch_word_records_by_ids(self, word_ids):
+        """
+        Retrieves the Words records corresponding to the word_ids
+
+        Args:
+            word_ids (list of int): existing word_ids
+
+        Returns:
+            list of dict: a list of dictionaries containing complete Words records
+        """
+        original_row_factory = self.words_db_connection.row_factory
+        self.words_db_connection.row_factory = sqlite3.Row
+        cursor = self._cursor()
+        placeholders = ", ".join("?" for _ in word_ids)
+        cursor.execute(f"SELECT * FROM Words WHERE word_id IN ({placeholders})", word_ids)
+        word_records = cursor.fetchall()
+        self.words_db_connection.row_factory = original_row_factory
+        return [dict(record) for record in word_records]
+
+
+def _fts_phrase(text):
+    """text quoted as an FTS5 phrase"""
+    return '"' + text.replace('"', '""') + '"'
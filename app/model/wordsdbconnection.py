@@ -1,8 +1,12 @@
 # wordsdbconnection.py
 # Handles the connection setup and table creation for the 'words' database.
 
+import logging
 import sqlite3
-import os
+
+from .connectionprofile import apply_connection_profile
+from .contexts import register_context_functions
+from .migrations import current_version, migrate
 
 # import schema version from constants TODO
 
@@ -18,124 +22,38 @@ import os
 #     )
 
 
-def remove_db_file(conn, db_file_path):
-    # Close the connection before attempting to remove the file
-    conn.close()
-
-    # Remove the file
-    os.remove(db_file_path)
-    print(f"Removed file: {db_file_path}")
-
-
 def create_words_db_connection(db_path, model):
-    SUCCESSFUL = False
-    while not SUCCESSFUL:
-        conn = sqlite3.connect(db_path, isolation_level="IMMEDIATE")
-        model.words_db_connection = conn
-        SUCCESSFUL = create_tables(conn, db_path, model)
+    conn = sqlite3.connect(db_path, isolation_level="IMMEDIATE")
+    apply_connection_profile(conn)
+    register_words_db_functions(conn)
+    model.words_db_connection = conn
+    create_tables(conn)
     return conn
 
 
-def create_tables(conn, db_path, model):
-    # SQL statements to create tables in the words database
-    # to do, allow for multiple paths given a text number
-    ddls = [
-        """CREATE TABLE IF NOT EXISTS Words (
-            word_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            word TEXT UNIQUE,
-            form_group_id INTEGER,
-            FOREIGN KEY (form_group_id) REFERENCES FormGroups(form_group_id)
-        )""",
-        """CREATE TABLE IF NOT EXISTS FormGroups (
-            form_group_id INTEGER PRIMARY KEY AUTOINCREMENT
-        )""",
-        """CREATE TABLE IF NOT EXISTS Paths (
-            path_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            path TEXT UNIQUE,
-            text_number INTEGER UNIQUE,
-            is_unreachable INTEGER DEFAULT 0
-        )""",
-        # """CREATE TABLE IF NOT EXISTS Hashes (
-        #     hash_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        #     path_id INTEGER,
-        #     compressed_file_hash TEXT,
-        #     decompressed_text_hash TEXT,
-        #     FOREIGN KEY (path_id) REFERENCES Paths(path_id)
-        # )""",
-        """CREATE TABLE IF NOT EXISTS WordIndices (
-            word_indices_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            word_id INTEGER,
-            word_index INTEGER,
-            sentence_index_start INTEGER,
-            sentence_index_end INTEGER,
-            paragraph_index_start INTEGER,
-            paragraph_index_end INTEGER,
-            path_id INTEGER,
-            context_sentence TEXT DEFAULT "",
-            context_paragraph TEXT DEFAULT "",
-            FOREIGN KEY (word_id) REFERENCES Words(word_id),
-            FOREIGN KEY (path_id) REFERENCES Paths(path_id),
-            UNIQUE (word_id, word_index, path_id)
-        )""",
-        """CREATE TABLE IF NOT EXISTS SearchHistory (
-            search_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            word_id INTEGER,
-            path_id INTEGER,
-            FOREIGN KEY (word_id) REFERENCES Words(word_id),
-            FOREIGN KEY (path_id) REFERENCES Paths(path_id),
-            UNIQUE (word_id, path_id)
-        )""",
-        """CREATE TABLE IF NOT EXISTS schema_version (
-            version VARCHAR(50) PRIMARY KEY,
-            applied_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            description TEXT
-        )""",
-        """CREATE TABLE IF NOT EXISTS History (
-            id INTEGER PRIMARY KEY CHECK (id=1),
-            ultimate_max_index_id INTEGER DEFAULT 0,
-            penultimate_max_index_id INTEGER DEFAULT 0
-            )
-            """,
-    ]
+def register_words_db_functions(conn):
+    """
+    Registers the sql functions the model's queries and migrations read through.
 
-    for ddl_statement in ddls:
-        try:
-            conn.execute(ddl_statement)
+    The WordIndices and SearchHistory views are plain sql and need none of them.
+    """
+    register_context_functions(conn)
 
-        except sqlite3.OperationalError as e:
-            print(f"exception thrown when executing:\n{ddl_statement}\n")
-            print(e)
-            raise
 
-    # Additional table creation as needed
-    conn.commit()
+def create_tables(conn):
+    """
+    Brings the tables of the words database up to the latest schema version in place.
 
-    # Check for an existing version
-    current_version = "3"
-    description = "Add History table"
-
-    try:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT version FROM schema_version ORDER BY applied_on DESC LIMIT 1"
+    Databases of every earlier version, including 1 and 2 which used to be deleted,
+    are migrated without losing their rows (see app.model.migrations).
+    """
+    is_new = current_version(conn) == 0
+    for migration, elapsed in migrate(conn):
+        message = (
+            f"migrated words database to schema version {migration.version}"
+            f" ({migration.description}) in {elapsed:.2f}s"
         )
-        result = cursor.fetchone()
-        internal_version = None
-        if result is None:
-            # No version exists, insert the new version
-            cursor.execute(
-                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
-                (current_version, description),
-            )
+        if is_new:
+            logging.debug(message)
         else:
-            internal_version = result[0]
-            if internal_version == "1" or internal_version == "2":
-                remove_db_file(conn, db_path)
-                return False
-
-        conn.commit()
-    except sqlite3.OperationalError as e:
-        print(f"An error occurred: {e}")
-        raise
-
-    return True
+            print(message)
@@ -1,7 +1,8 @@
 # app/task_generator.py
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 import logging
+import math
 
 
 @dataclass
@@ -19,12 +20,17 @@ class Task:
         word_id_path_id_pairs (List[Tuple[int, int]]): A list of tuples where each tuple
                                                        contains a word ID and a corresponding path ID.
         path_prefix (Optional[str]): An optional string to be prefixed to each path, if provided.
+        batch_id (Optional[int]): The id of the task's entry in the run journal, if journaled.
+        node_id (Optional[str]): The node the task should preferably run on, e.g. one
+                                 whose text cache holds its paths.
     """
 
     word_records: List[dict]
     path_records: List[dict]
     word_id_path_id_pairs: List[Tuple[int, int]]
     path_prefix: Optional[str] = None
+    batch_id: Optional[int] = None
+    node_id: Optional[str] = None
 
 
 class TaskGenerator:
@@ -48,17 +54,24 @@ class TaskGenerator:
         """
         self.batch_size = batch_size
 
-    def generate(self, word_records, path_records, path_prefix=None):
+    def generate(
+        self, word_records, path_records, path_prefix=None, cached_node_ids=None
+    ):
         """
         Generates batches of tasks from the provided word and path records.
 
         Iterates over path records, grouping them into batches. Each batch is combined
-        with the word records to create a complete task.
+        with the word records to create a complete task; a path record carrying
+        "word_ids" is only searched for those of the words. When cached_node_ids is
+        given, paths are first grouped by a node that holds them, so that every
+        batch prefers a single node, and the remaining paths are batched last.
 
         Args:
             word_records (List[dict]): The word records to be searched.
             path_records (List[dict]): The path records to be searched.
             path_prefix (Optional[str]): Optional prefix for paths.
+            cached_node_ids (Optional[Dict[int, List[str]]]): The nodes whose text
+                cache holds each path, keyed by path_id.
 
         Yields:
             Task: A Task object representing a batch of work to be processed.
@@ -72,13 +85,207 @@ class TaskGenerator:
             return
 
         word_ids = [word_record["word_id"] for word_record in word_records]
-        max_range = max(len(path_records), self.batch_size)
-
-        for i in range(0, max_range, self.batch_size):
-            batch = path_records[i : min(i + self.batch_size, len(path_records))]
-            word_id_path_id_pairs = [
-                (word_id, path["path_id"]) for path in batch for word_id in word_ids
-            ]
-            task = Task(word_records, batch, word_id_path_id_pairs, path_prefix)
-            logging.debug(f"Generated task with {len(batch)} path records.")
-            yield task
+        if cached_node_ids:
+            node_groups = self.group_by_cached_node(path_records, cached_node_ids)
+        else:
+            node_groups = [(None, path_records)]
+
+        for node_id, node_path_records in node_groups:
+            max_range = max(len(node_path_records), self.batch_size)
+            for i in range(0, max_range, self.batch_size):
+                batch = node_path_records[
+                    i : min(i + self.batch_size, len(node_path_records))
+                ]
+                word_id_path_id_pairs = [
+                    (word_id, path["path_id"])
+                    for path in batch
+                    for word_id in path.get("word_ids", word_ids)
+                ]
+                task = Task(
+                    word_records,
+                    batch,
+                    word_id_path_id_pairs,
+                    path_prefix,
+                    None,
+                    node_id,
+                )
+                logging.debug(
+                    f"Generated task with {len(batch)} path records"
+                    f"{f' for {node_id}' if node_id else ''}."
+                )
+                yield task
+
+    @staticmethod
+    def group_by_cached_node(path_records, cached_node_ids):
+        """
+        Assigns each path cached somewhere to one of the nodes caching it.
+
+        A path cached on several nodes goes to the one assigned the fewest paths so
+        far, spreading the work over the nodes that hold the texts.
+
+        Args:
+            path_records (List[dict]): The path records to be searched.
+            cached_node_ids (Dict[int, List[str]]): The nodes whose text cache holds
+                each path, keyed by path_id.
+
+        Returns:
+            List[Tuple[Optional[str], List[dict]]]: the path records of each node, the
+                paths cached nowhere last under None.
+        """
+        node_path_records: Dict[Optional[str], List[dict]] = {}
+        uncached_path_records = []
+        for path_record in path_records:
+            node_ids = cached_node_ids.get(path_record["path_id"])
+            if not node_ids:
+                uncached_path_records.append(path_record)
+                continue
+            node_id = min(
+                node_ids, key=lambda node_id: len(node_path_records.get(node_id, []))
+            )
+            node_path_records.setdefault(node_id, []).append(path_record)
+        node_groups = list(node_path_records.items())
+        if uncached_path_records:
+            node_groups.append((None, uncached_path_records))
+        return node_groups
+
+
+class AdaptiveTaskGenerator(TaskGenerator):
+    """
+    A task generator that sizes each batch for the node that will run it.
+
+    Every node first receives a small probe batch. Completed tasks report how many
+    paths they searched and how long it took, from which a per node throughput
+    (texts/sec) is kept as a moving average. Subsequent batches hand a node its
+    throughput weighted share of the remaining paths (guided self-scheduling), so
+    faster nodes take larger batches and all nodes run out of work at about the
+    same time.
+
+    Attributes:
+        batch_size (int): The largest number of path records a batch may hold.
+        probe_size (int): The number of path records in a node's first batch.
+        smoothing (float): Weight of the newest observation in the throughput average.
+        node_rates (Dict[str, float]): Observed texts/sec of a single task slot keyed
+            by node id.
+        node_slots (Dict[str, int]): The number of concurrent task slots keyed by node id.
+    """
+
+    def __init__(self, batch_size, probe_size=5, smoothing=0.5):
+        """
+        Initializes the AdaptiveTaskGenerator.
+
+        Args:
+            batch_size (int): The largest number of path records a batch may hold.
+            probe_size (int): The number of path records sent to a node that has not
+                reported any timings yet.
+            smoothing (float): Weight of the newest observation when updating a
+                node's throughput average.
+        """
+        super().__init__(batch_size)
+        self.probe_size = min(probe_size, batch_size)
+        self.smoothing = smoothing
+        self.node_rates: Dict[str, float] = {}
+        self.node_slots: Dict[str, int] = {}
+        self.word_records = []
+        self.path_records = []
+        self.path_prefix = None
+        self._next_path_index = 0
+
+    def start(self, word_records, path_records, path_prefix=None):
+        """
+        Sets the word and path records that subsequent tasks draw from.
+
+        Args:
+            word_records (List[dict]): The word records to be searched.
+            path_records (List[dict]): The path records to be searched.
+            path_prefix (Optional[str]): Optional prefix for paths.
+        """
+        logging.debug(f"Word records count: {len(word_records)}")
+        logging.debug(f"Path records count: {len(path_records)}")
+        self.word_records = word_records
+        self.path_records = path_records
+        self.path_prefix = path_prefix
+        self._next_path_index = 0
+
+    @property
+    def remaining_count(self):
+        """the number of path records not yet assigned to a task"""
+        return len(self.path_records) - self._next_path_index
+
+    def has_remaining(self):
+        """whether there are path records left to assign"""
+        return len(self.word_records) > 0 and self.remaining_count > 0
+
+    def observe(self, node_id, path_count, elapsed_seconds):
+        """
+        Updates a node's throughput estimate from a completed task.
+
+        Args:
+            node_id (str): The id of the node that ran the task.
+            path_count (int): The number of paths the task was assigned.
+            elapsed_seconds (float): How long the task took on the node.
+        """
+        if path_count == 0:
+            return
+        rate = path_count / max(elapsed_seconds, 1e-3)
+        previous_rate = self.node_rates.get(node_id)
+        if previous_rate is not None:
+            rate = self.smoothing * rate + (1 - self.smoothing) * previous_rate
+        self.node_rates[node_id] = rate
+        logging.debug(f"node {node_id} throughput: {rate:.2f} texts/sec")
+
+    def update_node_slots(self, node_slots):
+        """
+        Records how many tasks each node runs concurrently.
+
+        Args:
+            node_slots (Dict[str, int]): The number of task slots keyed by node id.
+        """
+        self.node_slots.update(node_slots)
+
+    def next_batch_size(self, node_id):
+        """
+        Determines how many path records the node's next batch should hold.
+
+        Args:
+            node_id (str): The id of the node the batch is for.
+
+        Returns:
+            int: The batch size, never more than batch_size or the remaining count.
+        """
+        rate = self.node_rates.get(node_id)
+        if rate is None:
+            size = self.probe_size
+        else:
+            cluster_rate = sum(
+                node_rate * self.node_slots.get(measured_node_id, 1)
+                for measured_node_id, node_rate in self.node_rates.items()
+            )
+            share = rate / cluster_rate
+            size = math.ceil(self.remaining_count * share)
+        return max(1, min(size, self.batch_size, self.remaining_count))
+
+    def next_task(self, node_id):
+        """
+        Creates the next task for a node, sized from its observed throughput.
+
+        Args:
+            node_id (str): The id of the node the task is for.
+
+        Returns:
+            Optional[Task]: the next Task or None if no path records remain.
+        """
+        if not self.has_remaining():
+            return None
+
+        size = self.next_batch_size(node_id)
+        batch = self.path_records[self._next_path_index : self._next_path_index + size]
+        self._next_path_index += len(batch)
+
+        word_ids = [word_record["word_id"] for word_record in self.word_records]
+        word_id_path_id_pairs = [
+            (word_id, path["path_id"])
+            for path in batch
+            for word_id in path.get("word_ids", word_ids)
+        ]
+        logging.debug(f"Generated task with {len(batch)} path records for {node_id}.")
+        return Task(self.word_records, batch, word_id_path_id_pairs, self.path_prefix)
@@ -1,62 +1,657 @@
 # app/task_submitter.py
-import ray
+import itertools
+import random
 import logging
 import os
-from typing import List, Dict, Tuple
+from typing import Dict, Iterable, Iterator, List, Tuple
 
-from app.task_generator import Task
-from app.worker.execute_remote_word_search import execute_remote_word_search
+from app.backends import RayBackend
+from app.task_generator import AdaptiveTaskGenerator, Task
+from app.worker.util.text_cache import DEFAULT_PREFETCH_BYTES
 
 # from app.worker.wordsearch import WordSearcher
 
-runtime_env = {"pip": ["nltk==3.8.1", "requests"]}
-ray.init(runtime_env=runtime_env)
-
 
 class TaskSubmitter:
     """
     Manages the submission and processing of tasks for searching words in paths.
 
-    Utilizes Ray to distribute and execute tasks across a cluster, and aggregates results.
+    Tasks are executed by a backend (see app.backends), by default Ray distributing
+    them across a cluster; Ray is initialized, as configured through
+    app.util.ray_session, when tasks are first submitted. Results are aggregated
+    or streamed the same way whatever the backend.
+
+    Attributes:
+        backend (RayBackend or LocalProcessBackend): executes the tasks.
+        max_in_flight (int): upper count of tasks stream_tasks keeps submitted at once.
+        max_in_flight_bytes (int): approximate upper size of the results of the tasks
+            stream_tasks keeps submitted at once.
+        max_retries (int): how many times a failed task is resubmitted before giving up.
+        prefetch_bytes (int): the bound on text a worker fetches ahead of its search,
+            0 to fetch each text only when it is searched.
+        build_text_filters (bool): have workers return the BloomFilter of each text
+            they search, see app.worker.util.bloom.
+        failed_tasks (list of dict): the tasks of the current round that failed on
+            every attempt, see failure_report.
+        retried_count (int): the number of resubmissions made in the current round.
+        dispatch_callback (callable): called with each new Task just before it is first
+            submitted, e.g. to journal it; results are tagged with the task's batch_id.
     """
 
-    def __init__(self, enable_console_logging=None):
+    def __init__(
+        self,
+        enable_console_logging=None,
+        max_in_flight=None,
+        max_in_flight_bytes=None,
+        max_retries=2,
+        backend=None,
+        prefetch_bytes=DEFAULT_PREFETCH_BYTES,
+    ):
+        """
+        Args:
+            enable_console_logging (bool, optional): enable debug logging on the workers.
+            max_in_flight (int, optional): when set, stream_tasks submits at most this
+                many tasks at a time, pulling further tasks as earlier ones complete.
+            max_in_flight_bytes (int, optional): when set, stream_tasks also holds back
+                tasks while the in flight tasks' results, estimated from the average
+                size of completed results, would exceed this many bytes; until a
+                task completes, only one task per CPU slot is submitted.
+            max_retries (int): resubmit a failed task up to this many times,
+                preferring nodes it has not failed on.
+            backend (optional): the execution backend, a RayBackend by default.
+            prefetch_bytes (int): workers fetch the texts of their batch, and in queue
+                mode of their next chunk, into the node's text cache in the background
+                while searching, holding at most about this many bytes ahead; 0
+                disables prefetching and the cache.
+        """
+        self.backend = backend if backend is not None else RayBackend()
         if enable_console_logging is None:
-            self.enable_logging = True if "KRUNCHDEBUG" in os.environ else False
+            self.enable_console_logging = True if "KRUNCHDEBUG" in os.environ else False
         else:
             self.enable_console_logging = enable_console_logging
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_bytes = max_in_flight_bytes
+        self.max_retries = max_retries
+        self.prefetch_bytes = prefetch_bytes
+        self.build_text_filters = False
+        self.failed_tasks = []
+        self.retried_count = 0
+        self.failed_worker_count = 0
+        self.dispatch_callback = None
+        self.submitted_count = 0
+        self.completed_count = 0
+        self._pending = []
+        self._path_queue = None
+        self._search_spec_refs = {}
+
+    def _search_spec_ref(self, word_records, path_prefix):
+        """
+        Puts the task invariant inputs of a word group into the backend's object store once.
+
+        Every task searching the same words under the same prefix is passed the same
+        reference, so the word records are serialized once per run and fetched once
+        per node rather than once per task.
+
+        Args:
+            word_records (List[dict]): The word records to be searched.
+            path_prefix (Optional[str]): Optional prefix for paths.
+
+        Returns:
+            reference to the search spec dictionary (the dictionary itself for
+                backends without an object store).
+        """
+        key = (
+            tuple(word_record["word_id"] for word_record in word_records),
+            path_prefix,
+            self.build_text_filters,
+        )
+        if key not in self._search_spec_refs:
+            self._search_spec_refs[key] = self.backend.put(
+                {
+                    "words_table": word_records,
+                    "path_prefix": path_prefix,
+                    "prefetch_bytes": self.prefetch_bytes,
+                    "build_text_filters": self.build_text_filters,
+                }
+            )
+        return self._search_spec_refs[key]
+
+    @staticmethod
+    def _compact_paths(path_records):
+        """
+        Reduces path records to the parallel path_id, path and word_ids lists workers
+        need.
+
+        Args:
+            path_records (List[dict]): path records as returned by the model, each
+                optionally with the "word_ids" it is to be searched for.
+
+        Returns:
+            Tuple[List[int], List[str], Optional[List[List[int]]]]: the path_ids, the
+                paths and the word_ids of each path, None when every path is to be
+                searched for every word.
+        """
+        path_ids = [path_record["path_id"] for path_record in path_records]
+        paths = [path_record["path"] for path_record in path_records]
+        path_word_ids = None
+        if any("word_ids" in path_record for path_record in path_records):
+            path_word_ids = [
+                path_record.get("word_ids") for path_record in path_records
+            ]
+        return path_ids, paths, path_word_ids
+
+    def _dispatch(self, task: Task):
+        """hands a task about to be submitted for the first time to dispatch_callback"""
+        if self.dispatch_callback is not None:
+            self.dispatch_callback(task)
+
+    def _submit(self, task: Task, node_id=None):
+        """
+        Submits a single task to the backend.
+
+        Args:
+            task (Task): the Task to be executed.
+            node_id (str, optional): the node to prefer for the task; when the node
+                is gone the task runs elsewhere.
+
+        Returns:
+            the backend's future for the task's search result.
+        """
+        return self.backend.submit(
+            self._search_spec_ref(task.word_records, task.path_prefix),
+            *self._compact_paths(task.path_records),
+            self.enable_console_logging,
+            node_id,
+        )
 
     def submit_and_process_tasks(
         self, tasks: List[Task]
     ) -> Tuple[List[dict], List[Tuple[int, int]], Dict[str, List[int]]]:
         """
-        Submits a list of tasks to the Ray cluster and processes the results.
+        Submits a list of tasks to the backend and processes the results.
+
+        Tasks that fail are retried as in stream_tasks; the results of every task
+        that succeeds are included no matter how the others fared.
 
         Args:
             tasks (List[Task]): List of Task objects to be processed.
 
         Returns:
             Tuple[List[dict], List[Tuple[int, int]], Dict[str, List[int]]]: Aggregated word indices,
-            search histories, and a summary containing IDs of paths that could not be reached.
+            search histories, and a summary containing IDs of paths that could not be reached,
+            the round's failure report, the IDs of paths cached keyed by node ID and
+            the text filters built keyed by path ID.
         """
-        futures = [
-            execute_remote_word_search.remote(
-                task.word_records,
-                task.path_records,
-                task.path_prefix,
-                self.enable_console_logging,
-            )
-            for task in tasks
-        ]
-
-        logging.debug(f"Number of futures: {len(futures)}")
-        searchResults = ray.get(futures)
-
         word_indices_aggregated, search_histories, bad_path_ids = [], [], set()
-        for searchResult in searchResults:
+        cached_path_ids, text_filters = {}, {}
+        for searchResult in self.stream_tasks(tasks):
             word_indices_aggregated.extend(searchResult["word_indices"])
             search_histories.extend(searchResult["search_histories"])
             bad_path_ids.update(searchResult["unreachable_path_ids"])
+            if searchResult.get("cached_path_ids"):
+                cached_path_ids.setdefault(searchResult["node_id"], []).extend(
+                    searchResult["cached_path_ids"]
+                )
+            text_filters.update(searchResult.get("text_filters", {}))
 
-        summary = {"bad_path_ids": list(bad_path_ids)}
+        summary = {
+            "bad_path_ids": list(bad_path_ids),
+            "failure_report": self.failure_report(),
+            "cached_path_ids": cached_path_ids,
+            "text_filters": text_filters,
+        }
         return word_indices_aggregated, search_histories, summary
+
+    def _reset_failures(self):
+        """starts a new round's failure accounting"""
+        self.failed_tasks = []
+        self.retried_count = 0
+        self.failed_worker_count = 0
+
+    def failure_report(self):
+        """
+        Summarizes the failures of the most recent round.
+
+        Returns:
+            dict: "failed_tasks" (list of dicts with the "path_ids", "attempts" and
+                last "error" of each task that failed on every attempt; their paths
+                were not searched), "retried_count" (resubmissions made) and
+                "failed_worker_count" (queue workers lost).
+        """
+        return {
+            "failed_tasks": list(self.failed_tasks),
+            "retried_count": self.retried_count,
+            "failed_worker_count": self.failed_worker_count,
+        }
+
+    def _retry_failed_task(self, task, attempt, tried_node_ids, error):
+        """
+        Resubmits a failed task to a node it has not been tried on, or records it as
+        failed once its retries are used up.
+
+        Args:
+            task (Task): the task that failed.
+            attempt (int): the number of times the task has been submitted.
+            tried_node_ids (set): ids of the nodes the task was directed to so far.
+            error (Exception): the error the task failed with, one of the backend's
+                task_errors.
+
+        Returns:
+            Optional[Tuple[object, Optional[str]]]: the retry's future and the
+                node it was directed to, or None when the task is given up on.
+        """
+        path_ids = [path_record["path_id"] for path_record in task.path_records]
+        error_lines = str(error).strip().splitlines()
+        error_summary = (
+            f"{type(error).__name__}: {error_lines[-1] if error_lines else ''}"
+        )
+        if attempt > self.max_retries:
+            logging.error(
+                f"giving up on a batch of {len(path_ids)} paths after {attempt}"
+                f" attempts: {error_summary}"
+            )
+            self.failed_tasks.append(
+                {"path_ids": path_ids, "attempts": attempt, "error": error_summary}
+            )
+            return None
+
+        failed_ip = getattr(error, "ip", None)
+        candidate_node_ids = [
+            node["NodeID"]
+            for node in self._alive_worker_nodes()
+            if node["NodeID"] not in tried_node_ids
+            if node["NodeManagerAddress"] != failed_ip
+        ]
+        node_id = random.choice(candidate_node_ids) if candidate_node_ids else None
+        logging.debug(
+            f"retrying a batch of {len(path_ids)} paths on {node_id or 'any node'}"
+            f" (attempt {attempt + 1}): {error_summary}"
+        )
+        self.retried_count += 1
+        try:
+            return self._submit(task, node_id), node_id
+        except self.backend.submit_errors as submit_error:
+            logging.error(
+                f"giving up on a batch of {len(path_ids)} paths, its retry could not"
+                f" be submitted: {type(submit_error).__name__}: {submit_error}"
+            )
+            self.failed_tasks.append(
+                {"path_ids": path_ids, "attempts": attempt, "error": error_summary}
+            )
+            return None
+
+    @staticmethod
+    def _estimate_result_bytes(searchResult):
+        """
+        Approximates the size of a search result, dominated by its context text.
+
+        Args:
+            searchResult (dict): a task's search result.
+
+        Returns:
+            int: the approximate size in bytes.
+        """
+        record_overhead = 64
+        context_bytes = sum(
+            len(word_index["context_sentence"]) + len(word_index["context_paragraph"])
+            for word_index in searchResult["word_indices"]
+        )
+        record_count = len(searchResult["word_indices"]) + len(
+            searchResult["search_histories"]
+        )
+        text_filter_bytes = sum(
+            len(text_filter)
+            for text_filter in searchResult.get("text_filters", {}).values()
+        )
+        return context_bytes + record_overhead * record_count + text_filter_bytes
+
+    def stream_tasks(self, tasks: Iterable[Task]) -> Iterator[dict]:
+        """
+        Submits tasks to the backend and yields each search result as its task completes.
+
+        Unlike submit_and_process_tasks, results are not aggregated; only the result
+        being yielded is held by the submitter, so the caller can store it before
+        the next one is fetched. Tasks are pulled from the iterable lazily, keeping
+        within max_in_flight and max_in_flight_bytes when those are set. A task is
+        directed to the node caching its texts only while that node is alive and
+        has fewer tasks directed to it in flight than CPUs; otherwise it runs
+        wherever the backend places it. Progress is available on submitted_count
+        and completed_count.
+
+        Args:
+            tasks (Iterable[Task]): Task objects to be processed.
+
+        Yields:
+            dict: a single task's search result with keys "word_indices",
+                "search_histories" and "unreachable_path_ids".
+        """
+        self.backend.start()
+        tasks = iter(tasks)
+        self._pending = []
+        self.submitted_count = 0
+        self.completed_count = 0
+        self._reset_failures()
+        result_bytes_total = 0
+        # task, attempt count and targeted node ids keyed by future
+        attempts = {}
+        # the node each future was directed to and the count in flight per node
+        directed_node_ids = {}
+        directed_counts = {}
+        node_slots = self._alive_worker_slots()
+        bootstrap_count = max(1, sum(node_slots.values()))
+
+        def preferred_node_id(task):
+            """the task's node unless it is gone or its slots are all taken"""
+            node_id = task.node_id
+            if node_id is None:
+                return None
+            if directed_counts.get(node_id, 0) >= node_slots.get(node_id, 0):
+                logging.debug(f"{node_id} is busy or gone, submitting elsewhere")
+                return None
+            return node_id
+
+        def track(future, node_id):
+            self._pending.append(future)
+            if node_id is not None:
+                directed_node_ids[future] = node_id
+                directed_counts[node_id] = directed_counts.get(node_id, 0) + 1
+
+        def untrack(future):
+            node_id = directed_node_ids.pop(future, None)
+            if node_id is not None:
+                directed_counts[node_id] -= 1
+
+        def has_capacity():
+            in_flight = len(self._pending)
+            if self.max_in_flight is not None and in_flight >= self.max_in_flight:
+                return False
+            if self.max_in_flight_bytes is None or in_flight == 0:
+                return True
+            if self.completed_count == 0:
+                # no result size is known yet, one task per slot until there is
+                return in_flight < bootstrap_count
+            average_result_bytes = result_bytes_total / self.completed_count
+            return (in_flight + 1) * average_result_bytes <= self.max_in_flight_bytes
+
+        def submit_while_capacity():
+            while has_capacity():
+                task = next(tasks, None)
+                if task is None:
+                    return
+                self._dispatch(task)
+                # a node caching the task's texts is preferred when known and free
+                node_id = preferred_node_id(task)
+                future = self._submit(task, node_id)
+                attempts[future] = (task, 1, {node_id} - {None})
+                track(future, node_id)
+                self.submitted_count += 1
+
+        submit_while_capacity()
+        logging.debug(f"Number of futures: {len(self._pending)}")
+
+        while self._pending:
+            ready, self._pending = self.backend.wait_one(self._pending)
+            task, attempt, tried_node_ids = attempts.pop(ready)
+            untrack(ready)
+            try:
+                searchResult = self.backend.result(ready)
+            except self.backend.task_errors as e:
+                retry = self._retry_failed_task(task, attempt, tried_node_ids, e)
+                if retry is not None:
+                    future, node_id = retry
+                    attempts[future] = (task, attempt + 1, tried_node_ids | {node_id})
+                    track(future, node_id)
+                else:
+                    submit_while_capacity()
+                continue
+            self.completed_count += 1
+            result_bytes_total += self._estimate_result_bytes(searchResult)
+            searchResult["batch_id"] = task.batch_id
+            submit_while_capacity()
+            yield searchResult
+
+    def _alive_worker_nodes(self):
+        """
+        Lists the alive nodes of the backend that can run tasks.
+
+        Returns:
+            List[dict]: node descriptions in the shape of ray.nodes().
+        """
+        return self.backend.worker_nodes()
+
+    def alive_node_ids(self):
+        """
+        Starts the backend if need be and lists the ids of its alive worker nodes.
+
+        Returns:
+            Set[str]: the node ids.
+        """
+        self.backend.start()
+        return {node["NodeID"] for node in self._alive_worker_nodes()}
+
+    def _alive_worker_slots(self):
+        """
+        Lists the CPU slots of the alive nodes in the cluster.
+
+        Returns:
+            Dict[str, int]: the number of CPUs keyed by node id.
+        """
+        return {
+            node["NodeID"]: int(node["Resources"]["CPU"])
+            for node in self._alive_worker_nodes()
+        }
+
+    def stream_adaptive_tasks(
+        self, task_generator: AdaptiveTaskGenerator
+    ) -> Iterator[dict]:
+        """
+        Keeps every CPU slot of the backend busy with batches sized for its node and
+        yields each search result as its task completes.
+
+        Each slot starts with a probe batch. When a task finishes, its timing is
+        reported to the generator and the freed slot is given the next batch,
+        sized from the node's observed throughput. Nodes that join the cluster
+        mid run are given probe batches as they appear.
+
+        Args:
+            task_generator (AdaptiveTaskGenerator): a started generator to draw tasks from.
+
+        Yields:
+            dict: a single task's search result.
+        """
+        self.backend.start()
+        self._pending = {}
+        self.submitted_count = 0
+        self.completed_count = 0
+        self._reset_failures()
+        busy_slots = {}
+
+        def fill_idle_slots():
+            # without any known slots, let Ray place the task
+            worker_slots = self._alive_worker_slots() or {None: 1}
+            task_generator.update_node_slots(worker_slots)
+            for node_id, slot_count in worker_slots.items():
+                while busy_slots.get(node_id, 0) < slot_count:
+                    task = task_generator.next_task(node_id)
+                    if task is None:
+                        return
+                    self._dispatch(task)
+                    future = self._submit(task, node_id)
+                    self._pending[future] = (node_id, task, 1, {node_id})
+                    busy_slots[node_id] = busy_slots.get(node_id, 0) + 1
+                    self.submitted_count += 1
+
+        fill_idle_slots()
+        while self._pending:
+            ready, _ = self.backend.wait_one(list(self._pending))
+            node_id, task, attempt, tried_node_ids = self._pending.pop(ready)
+            busy_slots[node_id] -= 1
+            try:
+                searchResult = self.backend.result(ready)
+            except self.backend.task_errors as e:
+                retry = self._retry_failed_task(task, attempt, tried_node_ids, e)
+                if retry is not None:
+                    future, retry_node_id = retry
+                    self._pending[future] = (
+                        retry_node_id,
+                        task,
+                        attempt + 1,
+                        tried_node_ids | {retry_node_id},
+                    )
+                    busy_slots[retry_node_id] = busy_slots.get(retry_node_id, 0) + 1
+                elif task_generator.has_remaining():
+                    fill_idle_slots()
+                continue
+            self.completed_count += 1
+            task_generator.observe(
+                searchResult["node_id"],
+                len(task.path_records),
+                searchResult["elapsed_seconds"],
+            )
+            searchResult["batch_id"] = task.batch_id
+            if task_generator.has_remaining():
+                fill_idle_slots()
+            yield searchResult
+
+    def stream_queued_tasks(
+        self, tasks: Iterable[Task], poll_interval=0.5
+    ) -> Iterator[dict]:
+        """
+        Places the tasks' paths on a PathQueue that workers pull chunks from and yields
+        each chunk's search result as it is reported.
+
+        Each task becomes one chunk of the queue, so tasks should be small and must
+        all search the same words. One queue worker is started per CPU slot in the
+        cluster. A worker that fails has its leased chunks requeued and is
+        replaced while chunks remain, at most once per slot. Chunks still queued
+        once every worker is gone are recorded in failed_tasks. The queue is a Ray
+        actor, so this mode requires the Ray backend.
+
+        Args:
+            tasks (Iterable[Task]): the tasks to queue, typically generated with the
+                chunk size as batch size.
+            poll_interval (float): seconds between checks for reported results.
+
+        Yields:
+            dict: a single chunk's search result.
+
+        Raises:
+            ValueError: when the backend is not a RayBackend.
+        """
+        if not isinstance(self.backend, RayBackend):
+            raise ValueError(
+                f"the work queue requires the ray backend, not {self.backend.name}"
+            )
+        import ray
+        from ray.util.scheduling_strategies import NodeAffinitySchedulingStrategy
+
+        from app.work_queue import PathQueue
+        from app.worker.execute_remote_word_search import (
+            execute_remote_queued_word_search,
+        )
+
+        self.backend.start()
+        tasks = list(tasks)
+        self.submitted_count = len(tasks)
+        self.completed_count = 0
+        self._reset_failures()
+        if not tasks:
+            return
+        for task in tasks:
+            self._dispatch(task)
+        word_records, path_prefix = tasks[0].word_records, tasks[0].path_prefix
+        self._path_queue = PathQueue.options(
+            scheduling_strategy=NodeAffinitySchedulingStrategy(
+                ray.get_runtime_context().get_node_id(), soft=True
+            )
+        ).remote([self._compact_paths(task.path_records) for task in tasks])
+
+        slot_count = sum(self._alive_worker_slots().values()) or 1
+        worker_count = min(slot_count, len(tasks))
+        replaced_slots = set()
+        workers = {}
+        error_summary = None
+
+        def start_worker(slot):
+            worker_id = next(worker_ids)
+            future = execute_remote_queued_word_search.remote(
+                self._path_queue,
+                worker_id,
+                self._search_spec_ref(word_records, path_prefix),
+                self.enable_console_logging,
+            )
+            workers[future] = worker_id, slot
+
+        worker_ids = itertools.count()
+        for slot in range(worker_count):
+            start_worker(slot)
+        self._pending = list(workers)
+
+        while self._pending:
+            ready, self._pending = ray.wait(
+                self._pending, num_returns=len(self._pending), timeout=poll_interval
+            )
+            for future in ready:
+                worker_id, slot = workers.pop(future)
+                try:
+                    ray.get(future)
+                except ray.exceptions.RayError as e:
+                    logging.debug(f"queue worker {worker_id} failed: {e}")
+                    error_lines = str(e).strip().splitlines()
+                    error_summary = (
+                        f"{type(e).__name__}: {error_lines[-1] if error_lines else ''}"
+                    )
+                    self.failed_worker_count += 1
+                    ray.get(self._path_queue.requeue.remote(worker_id))
+                    if slot not in replaced_slots and ray.get(
+                        self._path_queue.remaining_count.remote()
+                    ):
+                        replaced_slots.add(slot)
+                        self.retried_count += 1
+                        start_worker(slot)
+                        self._pending = list(workers)
+
+            for searchResult in ray.get(self._path_queue.drain_results.remote()):
+                self.completed_count += 1
+                searchResult["batch_id"] = tasks[searchResult.pop("chunk_id")].batch_id
+                yield searchResult
+                if self._path_queue is None:
+                    return
+
+        # every worker failed and none could be replaced; the chunks they left
+        # are reported rather than silently dropped from the round
+        for chunk_id, attempts in ray.get(self._path_queue.drain_chunks.remote()):
+            path_ids = [
+                path_record["path_id"] for path_record in tasks[chunk_id].path_records
+            ]
+            self.failed_tasks.append(
+                {"path_ids": path_ids, "attempts": attempts, "error": error_summary}
+            )
+        if self.failed_tasks:
+            logging.error(
+                f"no queue worker left to search {len(self.failed_tasks)} chunks"
+            )
+        self._path_queue = None
+
+    def cancel_pending(self):
+        """
+        Cancels the tasks that stream_tasks has not yet yielded a result for.
+
+        Results of cancelled tasks are never returned, so their paths remain
+        unsearched in the model and are picked up by later runs.
+
+        Returns:
+            int: the number of tasks cancelled.
+        """
+        cancelled = len(self._pending)
+        if self._path_queue is not None:
+            import ray
+
+            cancelled = self.submitted_count - self.completed_count
+            ray.get(self._path_queue.close.remote())
+            self._path_queue = None
+        for future in self._pending:
+            self.backend.cancel(future)
+        self._pending = []
+        logging.debug(f"cancelled {cancelled} outstanding tasks")
+        return cancelled
@@ -0,0 +1,103 @@
+# util/browse.py
+# page through the indexed occurrences of words, optionally filtered
+
+import argparse
+import sqlite3
+
+from app.model import WordIndexerModel
+from constants import TEXT_DETAILS_DB_FILE, WORDS_DB_FILE
+
+
+def parse_key(key):
+    """the (word_id, word_indices_id) page key of --after, e.g. 12:3456"""
+    word_id, word_indices_id = key.split(":")
+    return int(word_id), int(word_indices_id)
+
+
+def main(args, parser):
+    model = WordIndexerModel(str(args.words_db), str(args.text_details_db))
+    words = args.words or None
+    if words and args.form_group:
+        words = model.fetch_form_group_words(words)
+    meta_filters = {
+        name: getattr(args, name)
+        for name in WordIndexerModel.BROWSE_META_FILTERS
+        if getattr(args, name) is not None
+    }
+    try:
+        rows, next_key = model.browse_word_indices(
+            words,
+            after=args.after,
+            limit=args.limit,
+            match=args.match,
+            near=args.near,
+            near_distance=args.distance,
+            meta_filters=meta_filters,
+            include_paragraph=args.paragraph,
+        )
+    except sqlite3.OperationalError as e:
+        # e.g. a malformed --match query
+        parser.error(str(e))
+    finally:
+        model.close()
+
+    for row in rows:
+        title = f" {row['title']}" if row["title"] else ""
+        print(f"[{row['word']}] #{row['text_number']}{title}")
+        context = (
+            row["context_paragraph"] if args.paragraph else row["context_sentence"]
+        )
+        print("    " + " ".join(context.split()))
+    if next_key is not None:
+        print(f"\nnext page: --after {next_key[0]}:{next_key[1]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Browse the indexed occurrences of words, a page at a time."
+    )
+    parser.add_argument("words", nargs="*", help="the words to browse, all if none")
+    parser.add_argument(
+        "--form-group",
+        action="store_true",
+        help="include every form of the words, e.g. sobriquets for sobriquet",
+    )
+    parser.add_argument(
+        "--after",
+        type=parse_key,
+        help="the key printed after the previous page, e.g. 12:3456",
+    )
+    parser.add_argument("--limit", type=int, default=20, help="rows per page")
+    parser.add_argument(
+        "--match",
+        help='an FTS5 query the sentence must match, e.g. "king OR queen"',
+    )
+    parser.add_argument(
+        "--near", help="a term the sentence must contain close to the word"
+    )
+    parser.add_argument(
+        "--distance",
+        type=int,
+        default=10,
+        help="the most tokens between the word and --near",
+    )
+    meta_filter_help = {
+        "exact": "is this",
+        "substring": "contains this, ignoring case",
+        "item": "lists this, alone or among others",
+    }
+    for name, (column, match) in WordIndexerModel.BROWSE_META_FILTERS.items():
+        parser.add_argument(
+            f"--{name}", help=f"only texts whose {column} {meta_filter_help[match]}"
+        )
+    parser.add_argument(
+        "--paragraph",
+        action="store_true",
+        help="print the paragraph around each occurrence instead of the sentence",
+    )
+    parser.add_argument("--words-db", default=WORDS_DB_FILE)
+    parser.add_argument("--text-details-db", default=TEXT_DETAILS_DB_FILE)
+    args = parser.parse_args()
+    if args.limit < 1:
+        parser.error("--limit must be at least 1")
+    main(args, parser)
@@ -0,0 +1,42 @@
+# util/load_catalog.py
+# load a local copy of the Project Gutenberg catalog csv into the text details database
+
+import argparse
+import time
+
+from app.model.catalog import load_catalog
+from app.model.contextdbconnection import create_text_details_db_connection
+from constants import TEXT_DETAILS_DB_FILE
+
+
+def main(args):
+    connection = create_text_details_db_connection(args.text_details_db)
+    start = time.perf_counter()
+    try:
+        loaded_count = load_catalog(connection, args.csv_path)
+    except ValueError as e:
+        print(e)
+        return
+    finally:
+        connection.close()
+    print(
+        f"loaded {loaded_count} texts into {args.text_details_db}"
+        f" in {time.perf_counter() - start:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load the Gutenberg catalog into the Meta table, replacing it."
+    )
+    parser.add_argument(
+        "csv_path",
+        help="the catalog, e.g. a download of"
+        " https://www.gutenberg.org/cache/epub/feeds/pg_catalog.csv",
+    )
+    parser.add_argument(
+        "--text-details-db",
+        default=str(TEXT_DETAILS_DB_FILE),
+        help="the text details database (default: %(default)s)",
+    )
+    main(parser.parse_args())
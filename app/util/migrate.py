@@ -0,0 +1,42 @@
+# util/migrate.py
+# migrate a words database to the latest schema in place, or time a dry run
+
+import argparse
+import sqlite3
+import time
+
+from app.model.migrations import LATEST_VERSION, current_version, migrate
+from app.model.wordsdbconnection import register_words_db_functions
+
+
+def main(args):
+    connection = sqlite3.connect(args.db_path, isolation_level="IMMEDIATE")
+    register_words_db_functions(connection)
+    version = current_version(connection)
+    print(f"{args.db_path} is at schema version {version}, latest is {LATEST_VERSION}")
+    status = "would apply" if args.dry_run else "applied"
+    for migration, elapsed in migrate(connection, dry_run=args.dry_run):
+        print(f"{elapsed:8.3f}s  {status} {migration.version}: {migration.description}")
+    if args.vacuum and not args.dry_run:
+        # migrations rewriting tables leave their old pages free until a vacuum
+        start = time.perf_counter()
+        connection.isolation_level = None
+        connection.execute("VACUUM")
+        print(f"{time.perf_counter() - start:8.3f}s  vacuumed {args.db_path}")
+    connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate a words database in place.")
+    parser.add_argument("db_path", help="the words database, e.g. data/words.db")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="time the pending migrations and roll them back, leaving the database as is",
+    )
+    parser.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="compact the database file after migrating, e.g. before copying it",
+    )
+    main(parser.parse_args())
@@ -0,0 +1,48 @@
+# util/ray_session.py
+# lazy, configurable connection to the ray cluster
+
+import json
+import logging
+import os
+
+DEFAULT_RUNTIME_ENV = {"pip": ["nltk==3.8.1", "requests"]}
+
+_ray_init_options = {
+    "address": os.environ.get("RAYWORD_RAY_ADDRESS"),
+    "namespace": os.environ.get("RAYWORD_RAY_NAMESPACE"),
+    "runtime_env": (
+        json.loads(os.environ["RAYWORD_RAY_RUNTIME_ENV"])
+        if "RAYWORD_RAY_RUNTIME_ENV" in os.environ
+        else DEFAULT_RUNTIME_ENV
+    ),
+}
+
+
+def configure_ray(address=None, namespace=None, runtime_env=None):
+    """set how ray is to be initialized, taking effect on the first submission
+
+    Options left as None keep their current setting, which defaults to the
+    RAYWORD_RAY_ADDRESS, RAYWORD_RAY_NAMESPACE and RAYWORD_RAY_RUNTIME_ENV (json)
+    environment variables, or ray's own defaults and DEFAULT_RUNTIME_ENV.
+
+    Args:
+        address (str, optional): address of the cluster to connect to, e.g. "auto"
+        namespace (str, optional): ray namespace for the job
+        runtime_env (dict, optional): ray runtime environment for the workers
+    """
+    for option, value in (
+        ("address", address),
+        ("namespace", namespace),
+        ("runtime_env", runtime_env),
+    ):
+        if value is not None:
+            _ray_init_options[option] = value
+
+
+def ensure_ray_initialized():
+    """connect to ray with the configured options unless already connected"""
+    import ray
+
+    if not ray.is_initialized():
+        logging.debug(f"initializing ray with {_ray_init_options}")
+        ray.init(**_ray_init_options)
@@ -3,6 +3,7 @@
 
 from urllib.parse import urlparse, urlunparse
 import os
+from pathlib import PurePosixPath
 
 
 def ResourceFactory(root_path=None):
@@ -51,6 +52,23 @@ def parse_resources_file(file_object):
     return [Resource(line.strip()) for line in file_object]
 
 
+def parse_target_paths(lines):
+    """
+    Derives the path and text number of each url in the lines of a targets file.
+
+    Equivalent to taking get_path() and the name of its parent directory from the
+    Resource objects of parse_resources_file, without creating one per line.
+
+    :param lines: An iterable of url lines; blank lines are skipped.
+    :return: A generator of (path, text_number) tuples.
+    """
+    for line in lines:
+        url = line.strip()
+        if url:
+            path = urlparse(url).path
+            yield path, PurePosixPath(path).parent.name
+
+
 if __name__ == "__main__":
     import sys
     from pathlib import Path
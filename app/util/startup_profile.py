@@ -0,0 +1,94 @@
+# util/startup_profile.py
+# measure what importing rayword's modules costs at startup
+
+import re
+import subprocess
+import sys
+
+# modules rayword.py imports at startup or on its first run
+DEFAULT_MODULES = [
+    "app.model",
+    "app.controller",
+    "app.task_submitter",
+    "ray",
+    "nltk",
+    "word_forms.word_forms",
+]
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_import(module, top=10):
+    """import a module in a fresh interpreter under -X importtime
+
+    Args:
+        module (str): dotted name of the module to import
+        top (int): number of the most expensive nested imports to report
+
+    Returns:
+        tuple: total cumulative microseconds (or None if the import failed
+            or was not timed) and
+            a list of (cumulative microseconds, module) of the costliest imports
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        return None, []
+
+    # children are reported before their parent and indented deeper, so the
+    # module's own subtree is the run of deeper lines just above its line
+    timings = []
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            cumulative, depth, name = (
+                int(match.group(2)),
+                len(match.group(3)),
+                match.group(4),
+            )
+            timings.append((cumulative, depth, name))
+
+    # a module the interpreter loads before running the command has no line
+    module_index = max(
+        (index for index, (_, _, name) in enumerate(timings) if name == module),
+        default=None,
+    )
+    if module_index is None:
+        return None, []
+    total, module_depth, _ = timings[module_index]
+    subtree = []
+    for cumulative, depth, name in reversed(timings[:module_index]):
+        if depth <= module_depth:
+            break
+        subtree.append((cumulative, name))
+    return total, sorted(subtree, reverse=True)[:top]
+
+
+def main(modules, top=10):
+    for module in modules:
+        total, costliest = profile_import(module, top)
+        if total is None:
+            print(f"{module}: not importable or loaded at interpreter startup")
+            continue
+        print(f"{module}: {total / 1e6:.3f}s")
+        for cumulative, name in costliest:
+            print(f"    {cumulative / 1e6:8.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Profile the import time of rayword's startup modules."
+    )
+    parser.add_argument(
+        "modules", nargs="*", default=DEFAULT_MODULES, help="modules to profile"
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="number of costliest imports to list"
+    )
+    args = parser.parse_args()
+    main(args.modules, args.top)
@@ -0,0 +1,121 @@
+# app/work_queue.py
+from collections import deque
+import logging
+
+import ray
+
+
+@ray.remote(num_cpus=0)
+class PathQueue:
+    """
+    A coordinator actor that hands out small chunks of path records to workers on demand.
+
+    Workers lease a chunk, search it and report the search result back, then lease
+    the next chunk until the queue is empty. Because paths are only assigned when
+    a worker asks for them, slow workers simply lease fewer chunks. Chunks leased
+    by a worker that fails can be put back at the front of the queue.
+
+    Attributes:
+        chunks (deque): (chunk_id, path_ids, paths, path_word_ids) not yet leased.
+        leases (dict): (worker_id, path_ids, paths, path_word_ids) keyed by the leased
+            chunk_id.
+        lease_counts (dict): the number of times each chunk_id was leased.
+        results (list): search results reported and not yet drained by the head.
+    """
+
+    def __init__(self, chunks):
+        """
+        Args:
+            chunks (list of tuple): (path_ids, paths, path_word_ids) of each chunk,
+                where paths and path_word_ids, if not None, are parallel to path_ids;
+                a chunk's id is its position in the list.
+        """
+        self.chunks = deque((chunk_id, *chunk) for chunk_id, chunk in enumerate(chunks))
+        self.leases = {}
+        self.lease_counts = {}
+        self.results = []
+
+    def lease(self, worker_id):
+        """
+        Assigns the next chunk to a worker.
+
+        Args:
+            worker_id (int): the id of the worker asking for work.
+
+        Returns:
+            tuple: (chunk_id, path_ids, paths, path_word_ids) or None once the queue
+                is empty.
+        """
+        if not self.chunks:
+            return None
+        chunk_id, *chunk = self.chunks.popleft()
+        self.leases[chunk_id] = (worker_id, *chunk)
+        self.lease_counts[chunk_id] = self.lease_counts.get(chunk_id, 0) + 1
+        return (chunk_id, *chunk)
+
+    def complete(self, chunk_id, searchResult):
+        """
+        Accepts the search result of a leased chunk.
+
+        Args:
+            chunk_id (int): the id of the chunk that was searched.
+            searchResult (dict): the search result of the chunk, which is tagged with
+                the chunk_id before being held for the head.
+        """
+        if self.leases.pop(chunk_id, None) is not None:
+            searchResult["chunk_id"] = chunk_id
+            self.results.append(searchResult)
+
+    def drain_results(self):
+        """
+        Hands over the search results reported since the last drain.
+
+        Returns:
+            list of dict: the search results.
+        """
+        results, self.results = self.results, []
+        return results
+
+    def requeue(self, worker_id):
+        """
+        Puts the chunks leased by a failed worker back at the front of the queue.
+
+        Args:
+            worker_id (int): the id of the worker that failed.
+
+        Returns:
+            int: the number of chunks requeued.
+        """
+        chunk_ids = [
+            chunk_id
+            for chunk_id, (lease_worker_id, *_) in self.leases.items()
+            if lease_worker_id == worker_id
+        ]
+        for chunk_id in chunk_ids:
+            _, *chunk = self.leases.pop(chunk_id)
+            self.chunks.appendleft((chunk_id, *chunk))
+        logging.debug(f"requeued {len(chunk_ids)} chunks of worker {worker_id}")
+        return len(chunk_ids)
+
+    def drain_chunks(self):
+        """
+        Takes every chunk not yet leased off the queue, for when no worker is left
+        to search them.
+
+        Returns:
+            list of tuple: (chunk_id, lease count) of each chunk taken.
+        """
+        chunks = [
+            (chunk_id, self.lease_counts.get(chunk_id, 0))
+            for chunk_id, *_ in self.chunks
+        ]
+        self.chunks.clear()
+        return chunks
+
+    def close(self):
+        """Drops every chunk not yet leased so that workers stop after their current one."""
+        self.chunks.clear()
+
+    def remaining_count(self):
+        """the number of chunks not yet leased"""
+        return len(self.chunks)
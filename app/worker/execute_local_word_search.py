@@ -0,0 +1,29 @@
+# app/worker/execute_local_word_search.py
+# runs a word search in a process of the local backend's pool
+
+from .search_paths import configure_logging, search_paths
+
+# the node id of every local search; the local backend presents the machine as one node
+LOCAL_NODE_ID = "local"
+
+
+def execute_local_word_search(
+    search_spec, path_ids, paths, path_word_ids=None, enable_logging=False
+):
+    """
+    Executes a search for words in the given paths in a local worker process.
+
+    The local counterpart of execute_remote_word_search, submitted to a process pool.
+
+    Args:
+        search_spec (dict): the run's task invariant inputs (see search_paths).
+        path_ids (list of int): the path_ids of the paths to search.
+        paths (list of str): the paths relative to the path prefix, parallel to path_ids.
+        path_word_ids (list of list of int, optional): the word_ids to search each
+            path for, parallel to path_ids; None searches every path for every word.
+
+    Returns:
+        dict: the search result, with LOCAL_NODE_ID as its node.
+    """
+    configure_logging(enable_logging)
+    return search_paths(search_spec, path_ids, paths, LOCAL_NODE_ID, path_word_ids)
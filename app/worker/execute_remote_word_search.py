@@ -1,31 +1,100 @@
 import ray
-import logging
+
+from .search_paths import (
+    configure_logging,
+    create_prefetcher,
+    prepare_search,
+    run_search,
+    search_paths,
+)
+
+
+def _search_paths(search_spec, path_ids, paths, path_word_ids):
+    """search_paths tagged with the id of the ray node running it"""
+    return search_paths(
+        search_spec,
+        path_ids,
+        paths,
+        ray.get_runtime_context().get_node_id(),
+        path_word_ids,
+    )
 
 
 @ray.remote
 def execute_remote_word_search(
-    words_table, paths_table, path_prefix=None, enable_logging=False
+    search_spec, path_ids, paths, path_word_ids=None, enable_logging=False
 ):
     """
     Executes a search for words in the given paths, run as a Ray remote function.
 
     Args:
-        words_table (list): List of dictionaries representing word records.
-        paths_table (list): List of dictionaries representing path records.
-        path_prefix (str, optional): Optional prefix for paths.
+        search_spec (dict): the run's task invariant inputs (see search_paths),
+            normally passed as an object store reference shared by every task.
+        path_ids (list of int): the path_ids of the paths to search.
+        paths (list of str): the paths relative to the path prefix, parallel to path_ids.
+        path_word_ids (list of list of int, optional): the word_ids to search each
+            path for, parallel to path_ids; None searches every path for every word.
 
     Returns:
         Tuple[List[dict], Dict]: Tuple containing the search results and history information.
+
+    Notes:
+        the result also carries the id of the node that ran the search and the
+        seconds spent on it, which adaptive batch sizing uses to estimate throughput
     """
     # logging.getLogger().setLevel(logging.WARNING)
-    from .wordsearch import WordSearcher
+    configure_logging(enable_logging)
+    return _search_paths(search_spec, path_ids, paths, path_word_ids)
+    # return perform_word_search(words_table, paths_table, path_prefix)
 
-    if enable_logging:
-        logging.basicConfig(
-            level=logging.DEBUG,
-            format="%(filename)s:%(lineno)d - %(levelname)s - %(message)s",
+
+@ray.remote
+def execute_remote_queued_word_search(
+    path_queue, worker_id, search_spec, enable_logging=False
+):
+    """
+    Leases chunks of paths from a PathQueue and searches them until the queue is empty.
+
+    Each chunk's search result is reported back to the queue as soon as it is done.
+    When the search spec enables prefetching, the next chunk is leased before the
+    current one is searched, so that its texts are fetched into the node's cache
+    while the current chunk is searched.
+
+    Args:
+        path_queue (ray.actor.ActorHandle): the PathQueue to lease chunks from.
+        worker_id (int): the id the queue tracks this worker's leases by.
+        search_spec (dict): the run's task invariant inputs (see search_paths).
+
+    Returns:
+        int: the number of chunks searched.
+    """
+    configure_logging(enable_logging)
+    node_id = ray.get_runtime_context().get_node_id()
+    prefetcher = create_prefetcher(search_spec)
+
+    def lease_next_chunk():
+        lease = ray.get(path_queue.lease.remote(worker_id))
+        if lease is None:
+            return None, None
+        chunk_id, path_ids, paths, path_word_ids = lease
+        return chunk_id, prepare_search(
+            search_spec, path_ids, paths, prefetcher, path_word_ids
         )
 
-    word_searcher = WordSearcher(words_table, paths_table, path_prefix)
-    return word_searcher.perform_search()
-    # return perform_word_search(words_table, paths_table, path_prefix)
+    chunks_searched = 0
+    try:
+        chunk_id, word_searcher = lease_next_chunk()
+        while word_searcher is not None:
+            if prefetcher is not None:
+                # lease the next chunk now so that its texts are fetched during this search
+                next_chunk = lease_next_chunk()
+            searchResult = run_search(word_searcher, node_id)
+            ray.get(path_queue.complete.remote(chunk_id, searchResult))
+            chunks_searched += 1
+            if prefetcher is None:
+                next_chunk = lease_next_chunk()
+            chunk_id, word_searcher = next_chunk
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+    return chunks_searched
@@ -0,0 +1,124 @@
+# app/worker/search_paths.py
+# runs a word search over a batch of paths, shared by every execution backend
+
+import logging
+import time
+
+
+def configure_logging(enable_logging):
+    if enable_logging:
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(filename)s:%(lineno)d - %(levelname)s - %(message)s",
+        )
+
+
+def create_prefetcher(search_spec):
+    """
+    Starts a Prefetcher into the node's text cache when the search spec asks for one.
+
+    Args:
+        search_spec (dict): the run's task invariant inputs (see search_paths).
+
+    Returns:
+        Prefetcher: the prefetcher, or None when "prefetch_bytes" is absent or 0.
+    """
+    prefetch_bytes = search_spec.get("prefetch_bytes")
+    if not prefetch_bytes:
+        return None
+    from .util.text_cache import Prefetcher, TextCache
+
+    return Prefetcher(TextCache(), prefetch_bytes)
+
+
+def prepare_search(search_spec, path_ids, paths, prefetcher=None, path_word_ids=None):
+    """
+    Creates the WordSearcher of a batch of paths, queueing its texts for prefetching.
+
+    Args:
+        search_spec (dict): the run's task invariant inputs (see search_paths).
+        path_ids (list of int): the path_ids of the paths to search.
+        paths (list of str): the paths relative to the path prefix, parallel to path_ids.
+        prefetcher (Prefetcher, optional): fetches the texts ahead of the search.
+        path_word_ids (list of list of int, optional): the word_ids to search each
+            path for, parallel to path_ids; None searches every path for every word.
+
+    Returns:
+        WordSearcher: the searcher, to be run with run_search.
+    """
+    from .wordsearch import WordSearcher
+
+    paths_table = [
+        {"path_id": path_id, "path": path} for path_id, path in zip(path_ids, paths)
+    ]
+    word_searcher = WordSearcher(
+        search_spec["words_table"],
+        paths_table,
+        search_spec["path_prefix"],
+        prefetcher=prefetcher,
+        build_text_filters=search_spec.get("build_text_filters", False),
+        word_ids_by_path_id=(
+            dict(zip(path_ids, path_word_ids)) if path_word_ids is not None else None
+        ),
+    )
+    if prefetcher is not None:
+        prefetcher.prefetch(word_searcher.urls())
+    return word_searcher
+
+
+def run_search(word_searcher, node_id=None):
+    """
+    Runs a prepared search, tagging the result with the node and time taken.
+
+    Args:
+        word_searcher (WordSearcher): the searcher returned by prepare_search.
+        node_id (str, optional): the id of the node running the search.
+
+    Returns:
+        dict: the search result of WordSearcher.perform_search with "node_id",
+            "elapsed_seconds" and "cached_path_ids", the path_ids of the batch whose
+            texts are in the node's text cache, added.
+    """
+    start_time = time.monotonic()
+    searchResult = word_searcher.perform_search()
+    searchResult["cached_path_ids"] = []
+    if word_searcher.prefetcher is not None:
+        # texts skipped after a timeout no longer count against the prefetch bound
+        word_searcher.prefetcher.release(word_searcher.urls())
+        searchResult["cached_path_ids"] = word_searcher.cached_path_ids(
+            word_searcher.prefetcher.cache
+        )
+    searchResult["node_id"] = node_id
+    searchResult["elapsed_seconds"] = time.monotonic() - start_time
+    return searchResult
+
+
+def search_paths(search_spec, path_ids, paths, node_id=None, path_word_ids=None):
+    """
+    Searches the paths for the words, tagging the result with the node and time taken.
+
+    Args:
+        search_spec (dict): the run's task invariant inputs, "words_table" (list of
+            word record dictionaries), "path_prefix" (str or None) and optionally
+            "prefetch_bytes" (int), the bound on text fetched ahead of the search,
+            and "build_text_filters" (bool), whether to return the BloomFilter of
+            each text searched.
+        path_ids (list of int): the path_ids of the paths to search.
+        paths (list of str): the paths relative to the path prefix, parallel to path_ids.
+        node_id (str, optional): the id of the node running the search.
+        path_word_ids (list of list of int, optional): the word_ids to search each
+            path for, parallel to path_ids; None searches every path for every word.
+
+    Returns:
+        dict: the search result of WordSearcher.perform_search with "node_id" and
+            "elapsed_seconds" added.
+    """
+    prefetcher = create_prefetcher(search_spec)
+    try:
+        return run_search(
+            prepare_search(search_spec, path_ids, paths, prefetcher, path_word_ids),
+            node_id,
+        )
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
@@ -0,0 +1,156 @@
+# app/worker/util/bloom.py
+# Bloom filters of the words of a text, built by the workers and kept by the head.
+
+from functools import lru_cache
+import hashlib
+import math
+import re
+
+# the fraction of words absent from a text its filter still admits, which costs
+# about 8 bits per distinct indexed word of the text
+DEFAULT_FALSE_POSITIVE_RATE = 0.02
+
+# the words of a text as the worker's case insensitive \b...\b pattern sees them
+_TOKEN = re.compile(r"\w+")
+
+# the tokens a filter holds: words of two letters or more, not numbers
+_INDEXED_TOKEN = re.compile(r"[^\W\d_]{2,}")
+
+# words in nearly every English text, which a filter could never rule out
+STOP_WORDS = frozenset(
+    """a about after all also an and any are as at be been but by can could did do
+    for from had has have he her him his how i if in into is it its may me more my
+    no not now of on one only or other our out said she so some such than that the
+    their them then there these they this to up upon us was we were what when which
+    who will with would you your""".split()
+)
+
+
+def is_indexed_token(token):
+    """whether a lower cased token is held by filters, others may be in any text"""
+    return _INDEXED_TOKEN.fullmatch(token) is not None and token not in STOP_WORDS
+
+
+def text_tokens(text):
+    """the distinct lower cased words of a text that its filter holds"""
+    return {token for token in _TOKEN.findall(text.lower()) if is_indexed_token(token)}
+
+
+def _hash_pair(word):
+    """the start and step of the word's positions, the same in a filter of any size"""
+    digest = hashlib.blake2b(word.encode("utf-8"), digest_size=16).digest()
+    return (
+        int.from_bytes(digest[:8], "little"),
+        int.from_bytes(digest[8:], "little") | 1,
+    )
+
+
+# the searched words are looked up in the filter of every text in turn
+_searched_hash_pair = lru_cache(maxsize=4096)(_hash_pair)
+
+
+class BloomFilter:
+    """
+    A set of words answering membership with no false negatives and a bounded
+    rate of false positives.
+
+    A filter of a text holds only its indexed tokens (is_indexed_token), so that
+    numbers and stop words, which searches never rule out, take none of its bits.
+
+    Positions are derived from one blake2b digest per word by double hashing.
+    Stored, a filter is its hash count in a byte followed by its bits.
+
+    Attributes:
+        hash_count (int): the number of bits set per word.
+        bits (bytearray): the filter, its length in bits the bit count.
+    """
+
+    __slots__ = ("hash_count", "bits")
+
+    def __init__(self, bit_count, hash_count, bits=None):
+        """
+        Args:
+            bit_count (int): the size of the filter, rounded up to whole bytes.
+            hash_count (int): the number of bits set per word.
+            bits (bytes, optional): the bits of a stored filter.
+        """
+        self.hash_count = hash_count
+        self.bits = bytearray((bit_count + 7) // 8) if bits is None else bytearray(bits)
+
+    @classmethod
+    def for_capacity(cls, item_count, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+        """an empty filter sized for item_count words at false_positive_rate"""
+        item_count = max(item_count, 1)
+        bit_count = max(
+            8, math.ceil(-item_count * math.log(false_positive_rate) / math.log(2) ** 2)
+        )
+        hash_count = max(1, round(bit_count / item_count * math.log(2)))
+        return cls(bit_count, hash_count)
+
+    @classmethod
+    def from_words(cls, words, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+        """a filter of the words, sized for them"""
+        words = set(words)
+        bloom_filter = cls.for_capacity(len(words), false_positive_rate)
+        for word in words:
+            bloom_filter.add(word)
+        return bloom_filter
+
+    @classmethod
+    def from_text(cls, text, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+        """a filter of the words of a text, see text_tokens"""
+        return cls.from_words(text_tokens(text), false_positive_rate)
+
+    @classmethod
+    def from_bytes(cls, blob):
+        """
+        Decodes a stored filter.
+
+        Raises:
+            ValueError: for an empty blob.
+        """
+        if not blob:
+            raise ValueError("empty bloom filter")
+        return cls(8 * (len(blob) - 1), blob[0], blob[1:])
+
+    def to_bytes(self):
+        """the filter as stored"""
+        return bytes([self.hash_count]) + bytes(self.bits)
+
+    @property
+    def bit_count(self):
+        return 8 * len(self.bits)
+
+    def _positions(self, hash_pair):
+        first, step = hash_pair
+        bit_count = self.bit_count
+        return [(first + i * step) % bit_count for i in range(self.hash_count)]
+
+    def add(self, word):
+        for position in self._positions(_hash_pair(word)):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, word):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(_searched_hash_pair(word))
+        )
+
+    def might_contain_word(self, word):
+        """
+        Whether the text of the filter may contain the word as the workers match it.
+
+        A word spanning several tokens, e.g. "o'clock", may only be in the text
+        when each of them is. Tokens filters do not hold may be in any text.
+
+        Args:
+            word (str): a searched word.
+
+        Returns:
+            bool: False only when the text certainly does not contain the word.
+        """
+        return all(
+            token in self
+            for token in _TOKEN.findall(word.lower())
+            if is_indexed_token(token)
+        )
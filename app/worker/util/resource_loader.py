@@ -199,9 +199,12 @@ def process_zip_file(temp_zip_path):
     return None, True
 
 
-def load_resource(url, max_retries=3):
+def load_resource(url, max_retries=3, cache=None):
     """
     Load a ZIP file from a URL and decompress its contents.
+
+    When a TextCache is given, the archive is read from it, downloaded into it first
+    if not yet cached, instead of being downloaded to a temporary file.
     """
     temp_zip_path = None
     try:
@@ -220,6 +223,15 @@ def load_resource(url, max_retries=3):
                 return None, False
             return process_zip_file(str(local_file_path))
 
+        if cache is not None:
+            cached_zip_path, _ = cache.fetch(url, max_retries)
+            if cached_zip_path is None:
+                return None, True
+            text, failed = process_zip_file(str(cached_zip_path))
+            if text is None:
+                cache.discard(url)
+            return text, failed
+
         temp_dir = Path(tempfile.gettempdir())
         unique_id = uuid.uuid4()
         temp_zip_path = temp_dir / f"temp_{unique_id}{original_extension}"
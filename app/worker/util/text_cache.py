@@ -0,0 +1,208 @@
+# ./worker/util/text_cache.py
+"""
+A node local cache of downloaded text archives and a background prefetcher filling it.
+
+Workers on the same node share the cache directory, so a text fetched by one task
+is read from disk by the next. The Prefetcher downloads the texts a worker is
+about to search into the cache while it is still searching earlier ones, keeping
+the bytes fetched ahead of the search bounded.
+"""
+
+from collections import deque
+import hashlib
+import logging
+import os
+from pathlib import Path
+import tempfile
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(tempfile.gettempdir()) / "rayword-text-cache"
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_PREFETCH_BYTES = 64 * 1024 * 1024
+
+
+class TextCache:
+    """
+    A directory of downloaded archives keyed by url, evicting the least recently used
+    beyond a size limit.
+
+    Attributes:
+        directory (Path): where the archives are kept.
+        max_bytes (int): the size the directory is trimmed to after each download.
+    """
+
+    # serializes fetches of the same url by threads of this process; urls share a
+    # fixed number of locks so that the locks do not grow with the urls fetched
+    _url_locks = tuple(threading.Lock() for _ in range(64))
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.directory = Path(
+            directory or os.environ.get("RAYWORD_TEXT_CACHE_DIR", DEFAULT_CACHE_DIR)
+        )
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def cached_path(self, url):
+        """
+        Names the cache file of a url, keeping its suffix, from which
+        process_zip_file guesses the text's encoding.
+        """
+        suffix = ""
+        for original_extension in ("-0.zip", "-8.zip", ".zip"):
+            if url.endswith(original_extension):
+                suffix = original_extension
+                break
+        digest = hashlib.sha1(url.encode()).hexdigest()
+        return self.directory / f"{digest}{suffix}"
+
+    def _url_lock(self, url):
+        digest = hashlib.sha1(url.encode()).digest()
+        return self._url_locks[int.from_bytes(digest[:4], "big") % len(self._url_locks)]
+
+    def fetch(self, url, max_retries=3):
+        """
+        Returns the cached archive of a url, downloading it first when not cached.
+
+        Args:
+            url (str): the url of the archive.
+            max_retries (int): download attempts before giving up.
+
+        Returns:
+            tuple: the Path of the cached archive or None when it could not be
+                downloaded, and whether the download timed out.
+        """
+        from .resource_loader import URLContentFetcher
+
+        cached_path = self.cached_path(url)
+        with self._url_lock(url):
+            if cached_path.exists():
+                cached_path.touch()
+                return cached_path, False
+
+            # downloaded under a unique name so that other processes never see a
+            # partial archive
+            partial_path = cached_path.with_name(
+                f"{cached_path.name}.{uuid.uuid4()}.part"
+            )
+            try:
+                fetcher = URLContentFetcher(url, str(partial_path), max_retries)
+                if fetcher() or not partial_path.exists():
+                    logger.debug(f"URL fetching failed for {url}")
+                    return None, fetcher.timeout_error
+                os.replace(partial_path, cached_path)
+            finally:
+                if partial_path.exists():
+                    partial_path.unlink()
+        self.evict()
+        return cached_path, False
+
+    def discard(self, url):
+        """removes the cached archive of a url, e.g. when it turned out to be corrupt"""
+        self.cached_path(url).unlink(missing_ok=True)
+
+    def evict(self):
+        """removes the least recently used archives until the cache fits in max_bytes"""
+        entries = []
+        for path in self.directory.iterdir():
+            if path.name.endswith(".part"):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_bytes -= size
+
+
+class Prefetcher:
+    """
+    Downloads urls into a TextCache on a background thread ahead of their search.
+
+    Urls are fetched in the order they are queued. Fetching pauses while the archives
+    fetched ahead but not yet released by the searcher add up to max_bytes, so a
+    worker never holds more than about max_bytes of text it has yet to search.
+
+    Attributes:
+        cache (TextCache): the cache downloads go to, and which the searcher reads.
+        max_bytes (int): the bound on bytes fetched ahead of the search.
+    """
+
+    def __init__(self, cache, max_bytes=DEFAULT_PREFETCH_BYTES):
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self._queued = deque()
+        # bytes of each fetched archive not yet released
+        self._fetched = {}
+        self._fetching = None
+        self._released_while_fetching = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def prefetch(self, urls):
+        """queues urls to fetch after those already queued; local files are skipped"""
+        with self._condition:
+            self._queued.extend(
+                url
+                for url in urls
+                if not url.startswith("file://")
+                if url not in self._fetched
+                if url != self._fetching
+                if url not in self._queued
+            )
+            self._condition.notify()
+
+    def release(self, urls):
+        """
+        Tells the prefetcher that urls have been searched, making room for more.
+
+        Urls still queued are dropped, the searcher having fetched them itself.
+        """
+        with self._condition:
+            for url in urls:
+                self._fetched.pop(url, None)
+                if url == self._fetching:
+                    self._released_while_fetching = True
+                try:
+                    self._queued.remove(url)
+                except ValueError:
+                    pass
+            self._condition.notify()
+
+    def close(self):
+        """stops the prefetcher once the download in progress, if any, is done"""
+        with self._condition:
+            self._closed = True
+            self._queued.clear()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and (
+                    not self._queued or sum(self._fetched.values()) >= self.max_bytes
+                ):
+                    self._condition.wait()
+                if self._closed:
+                    return
+                url = self._fetching = self._queued.popleft()
+                self._released_while_fetching = False
+            try:
+                cached_path, _ = self.cache.fetch(url)
+                size = cached_path.stat().st_size if cached_path is not None else 0
+            except Exception as e:
+                logger.debug(f"prefetching {url} failed: {e}")
+                size = 0
+            with self._condition:
+                if size and not self._released_while_fetching:
+                    self._fetched[url] = size
+                self._fetching = None
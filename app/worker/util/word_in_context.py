@@ -3,6 +3,7 @@
 import re
 import os
 import nltk
+from functools import lru_cache
 from pathlib import Path
 
 from nltk.tokenize import sent_tokenize
@@ -12,10 +13,23 @@ nltk_data_path = worker_dir / "nltk_data"
 nltk.data.path.append(str(nltk_data_path))
 
 
+@lru_cache(maxsize=32)
+def compile_words_pattern(target_words):
+    """compile (once per process) the pattern matching any of the target words
+
+    Args:
+        target_words (tuple of str): the words to match
+
+    Returns:
+        re.Pattern: case insensitive pattern matching any word on word boundaries
+    """
+    escaped_words = [re.escape(word) for word in target_words]
+    return re.compile(rf"\b({'|'.join(escaped_words)})\b", re.IGNORECASE)
+
+
 def find_all_words_details(text, target_words):
     # Precompile the regex pattern outside the loop
-    escaped_words = [re.escape(word) for word in target_words]
-    pattern = re.compile(rf"\b({'|'.join(escaped_words)})\b", re.IGNORECASE)
+    pattern = compile_words_pattern(tuple(target_words))
 
     word_details = []
 
@@ -5,6 +5,7 @@ import logging
 from dataclasses import dataclass, asdict, field
 
 from .model import WorkerIndexerModel
+from .util.bloom import BloomFilter
 from .util.resource_loader import load_resource
 from .util.word_in_context import find_all_words_details
 
@@ -60,7 +61,15 @@ class WordSearcher:
     This class processes word and path records, performs searches, and compiles the results.
     """
 
-    def __init__(self, words_table, paths_table, path_prefix=None):
+    def __init__(
+        self,
+        words_table,
+        paths_table,
+        path_prefix=None,
+        prefetcher=None,
+        build_text_filters=False,
+        word_ids_by_path_id=None,
+    ):
         """
         Initializes the WordSearcher with word and path records.
 
@@ -68,11 +77,31 @@ class WordSearcher:
             words_table (list): A list of word records to be searched.
             paths_table (list): A list of path records to be searched.
             path_prefix (str, optional): An optional prefix to be prepended to each path.
+            prefetcher (Prefetcher, optional): when given, texts are read through its
+                cache and released to it as they are searched.
+            build_text_filters (bool): also build the BloomFilter of the words of
+                each text read, returned as "text_filters".
+            word_ids_by_path_id (dict, optional): the word_ids to search each path
+                for, keyed by path_id; a path missing from it, or every path when
+                None, is searched for every word.
         """
+        self.prefetcher = prefetcher
+        self.build_text_filters = build_text_filters
+        self.text_filters = {}
         self.words_table = words_table
         self.paths_table = paths_table
         self.path_prefix = path_prefix
         self.workerModel = WorkerIndexerModel(words_table, paths_table, path_prefix)
+        self.words_list = [word_dict["word"] for word_dict in self.words_table]
+        self.word_ids_by_path_id = word_ids_by_path_id or {}
+        self._words_by_id = {
+            word_dict["word_id"]: word_dict["word"] for word_dict in self.words_table
+        }
+
+    def path_word_ids(self, path_id):
+        """the word_ids the path is searched for"""
+        word_ids = self.word_ids_by_path_id.get(path_id)
+        return list(self._words_by_id) if word_ids is None else word_ids
 
     def perform_search(self):
         """
@@ -84,15 +113,11 @@ class WordSearcher:
         paths_searched, bad_path_ids = self.search_words_in_paths()
 
         # update search histories
-        searchHistories = []
-        for word_id in [
-            wordRecord[0]
-            for wordRecord in self.workerModel.select_records(
-                "Words", ["word_id"], use_row_factory=False
-            )
-        ]:
-            for path_id in paths_searched:
-                searchHistories.append(SearchHistory(word_id=word_id, path_id=path_id))
+        searchHistories = [
+            SearchHistory(word_id=word_id, path_id=path_id)
+            for path_id in paths_searched
+            for word_id in self.path_word_ids(path_id)
+        ]
 
         logging.debug(
             f"searched {len(paths_searched)} paths of which {len(bad_path_ids)} {'was' if len(bad_path_ids) == 1 else 'were'} unreachable"
@@ -121,10 +146,18 @@ class WordSearcher:
         for path, path_id in self.workerModel.select_path_records(
             fields=["path", "path_id"]
         ):
-            text, connection_timed_out = load_resource(path)
+            if self.prefetcher is None:
+                text, connection_timed_out = load_resource(path)
+            else:
+                text, connection_timed_out = load_resource(
+                    path, cache=self.prefetcher.cache
+                )
+                self.prefetcher.release([path])
             if text:
                 paths_searched.append(path_id)
                 self.process_text_for_word_details(text, path_id)
+                if self.build_text_filters:
+                    self.text_filters[path_id] = BloomFilter.from_text(text).to_bytes()
             elif not connection_timed_out:
                 bad_path_ids.add(path_id)
 
@@ -133,6 +166,22 @@ class WordSearcher:
 
         return paths_searched, bad_path_ids
 
+    def cached_path_ids(self, cache):
+        """the path_ids of the paths whose texts are held by the TextCache"""
+        return [
+            path_id
+            for path, path_id in self.workerModel.select_path_records(
+                fields=["path", "path_id"]
+            )
+            if cache.cached_path(path).exists()
+        ]
+
+    def urls(self):
+        """the urls of the paths, in the order search_words_in_paths searches them"""
+        return [
+            path for (path,) in self.workerModel.select_path_records(fields=["path"])
+        ]
+
     def process_text_for_word_details(self, text, path_id):
         """
         Processes text to extract details of words and updates the model.
@@ -141,7 +190,12 @@ class WordSearcher:
             text (str): The text to be processed.
             path_id (int): The ID of the path from which the text is extracted.
         """
-        words_list = [word_dict["word"] for word_dict in self.words_table]
+        words_list = [
+            self._words_by_id[word_id] for word_id in self.path_word_ids(path_id)
+        ]
+        if not words_list:
+            # a pass only building text filters, an empty pattern would match anywhere
+            return
         word_details = find_all_words_details(text, words_list)
 
         searchResults = []
@@ -190,4 +244,5 @@ class WordSearcher:
             # ],
             # "successfully_searched_path_ids": paths_searched,
             "unreachable_path_ids": bad_path_ids,
+            "text_filters": self.text_filters,
         }
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# benchmarks/browse_word_indices.py
+"""
+Times browsing pages of word indices on a synthetic words database.
+
+Builds a database of --indices word indices of one word, each with its own
+sentence drawn from a small vocabulary and indexed in ContextsFts, then times
+the first and a deep page of the keyset paged browse against OFFSET paging, and
+the first and a deep page of sentences with "king" near the word against a LIKE
+scan.
+
+usage: python benchmarks/browse_word_indices.py [--indices 500000] [--limit 50]
+    [--repeat 5]
+"""
+
+import argparse
+from pathlib import Path
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.model import WordIndexerModel  # noqa: E402
+from benchmarks.util import time_call  # noqa: E402
+
+VOCABULARY = "the a and to had name people castle lived went ever where happily".split()
+
+OFFSET_QUERY = """
+SELECT * FROM WordIndices WHERE word_id = 1
+ORDER BY word_indices_id LIMIT ? OFFSET ?
+"""
+
+LIKE_QUERY = """
+SELECT * FROM WordIndices WHERE word_id = 1 AND context_sentence LIKE '%king%'
+ORDER BY word_indices_id LIMIT ? OFFSET ?
+"""
+
+
+def sentence():
+    words = random.sample(VOCABULARY, 8)
+    words[3] = "sobriquet"
+    if random.random() < 0.01:
+        words[random.choice((2, 4))] = "king"
+    return " ".join(words).capitalize() + "."
+
+
+def populate(model, index_count):
+    model.update_or_insert_paths([("/1/1.zip", 1)])
+    model.update_or_insert_word_groups(["sobriquet"])
+    batch_size = 10_000
+    for start in range(0, index_count, batch_size):
+        word_indices = []
+        for word_index in range(start, min(start + batch_size, index_count)):
+            text = sentence()
+            word_indices.append(
+                {
+                    "word_id": 1,
+                    "path_id": 1,
+                    "word_index": word_index,
+                    "sentence_index_start": word_index,
+                    "sentence_index_end": word_index + len(text),
+                    "paragraph_index_start": word_index,
+                    "paragraph_index_end": word_index + len(text),
+                    "context_sentence": text,
+                    "context_paragraph": text,
+                }
+            )
+        model.insert_search_results(word_indices)
+    model.words_db_connection.execute("ANALYZE")
+
+
+def main(args):
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        model = WordIndexerModel(
+            Path(directory) / "words.db", Path(directory) / "text_details.db"
+        )
+        populate(model, args.indices)
+        connection = model.words_db_connection
+        deep_offset = args.indices - 2 * args.limit
+        deep_key = (1, deep_offset)  # ids run from 1, so the key skips deep_offset rows
+        # the LIKE matches the deep key skips, for OFFSET paging to reach the same page
+        deep_like_offset = connection.execute(
+            """SELECT COUNT(*) FROM WordIndices
+            WHERE word_id = 1 AND context_sentence LIKE '%king%'
+            AND word_indices_id <= ?""",
+            (deep_offset,),
+        ).fetchone()[0]
+        print(f"{args.indices} word indices, pages of {args.limit}")
+        print(f"{'page':<24}{'OFFSET / LIKE':>16}{'keyset / FTS5':>16}")
+        for label, legacy_query, legacy_offset, browse_arguments in (
+            ("first", OFFSET_QUERY, 0, {}),
+            ("deep", OFFSET_QUERY, deep_offset, {"after": deep_key}),
+            ("king near the word", LIKE_QUERY, 0, {"near": "king", "near_distance": 2}),
+            (
+                "king near the word, deep",
+                LIKE_QUERY,
+                deep_like_offset,
+                {"near": "king", "near_distance": 2, "after": deep_key},
+            ),
+        ):
+            legacy = time_call(
+                lambda: connection.execute(
+                    legacy_query, (args.limit, legacy_offset)
+                ).fetchall(),
+                args.repeat,
+            )
+            browsed = time_call(
+                lambda: model.browse_word_indices(
+                    ["sobriquet"], limit=args.limit, **browse_arguments
+                ),
+                args.repeat,
+            )
+            print(f"{label:<24}{legacy:>13.1f} ms{browsed:>13.1f} ms")
+        model.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--indices", type=int, default=500_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
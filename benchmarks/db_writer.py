@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# benchmarks/db_writer.py
+"""
+Compares storing streamed results in turn against handing them to a DBWriter thread.
+
+Streams --results synthetic search results of --indices word indices each,
+waiting --collect-ms before each as the controller waits on the cluster, and
+stores them either on the collecting thread, one transaction each, or from a
+DBWriter thread that coalesces those queued. Reports the wall time of each,
+which for the writer includes its final flush.
+
+usage: python benchmarks/db_writer.py [--results 200] [--indices 500]
+    [--collect-ms 5]
+"""
+
+import argparse
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.model import WordIndexerModel  # noqa: E402
+from app.model.dbwriter import DBWriter  # noqa: E402
+from benchmarks.util import search_result  # noqa: E402
+
+
+def stream(args, use_writer):
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        model = WordIndexerModel(
+            Path(directory) / "words.db", Path(directory) / "text_details.db"
+        )
+        model.update_or_insert_paths(
+            [
+                (f"/{path_id}/{path_id}.zip", path_id)
+                for path_id in range(1, args.results + 1)
+            ]
+        )
+        model.update_or_insert_word_groups(["word"])
+        results = [
+            search_result(path_id, 1, args.indices, distinct_contexts=True)
+            for path_id in range(1, args.results + 1)
+        ]
+
+        writer = DBWriter(model) if use_writer else None
+        start = time.perf_counter()
+        for result in results:
+            time.sleep(args.collect_ms / 1000)
+            if writer is not None:
+                writer.submit("store_search_result", result)
+            else:
+                model.store_search_result(result)
+        if writer is not None:
+            writer.close()
+        elapsed = time.perf_counter() - start
+        stored = model.get_max_word_indices_id()
+        model.close()
+    transactions = writer.transaction_count if writer is not None else args.results
+    return elapsed, stored, transactions
+
+
+def main(args):
+    collecting = args.results * args.collect_ms / 1000
+    print(f"{args.results} results, {collecting:.2f}s of it spent collecting")
+    for label, use_writer in (("stored in turn", False), ("DBWriter thread", True)):
+        elapsed, stored, transactions = stream(args, use_writer)
+        print(
+            f"{label:<18}{elapsed:8.2f}s  {stored} rows in {transactions} transactions"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--results", type=int, default=200)
+    parser.add_argument("--indices", type=int, default=500)
+    parser.add_argument("--collect-ms", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# benchmarks/ingest_word_indices.py
+"""
+Measures ingest throughput into WordIndices with and without the connection profile.
+
+Stores --rounds rounds of --batches synthetic search results of --indices word
+indices each, as the controller does, while a reader thread queries the database
+on its own connection. The baseline uses sqlite's default pragmas and commits
+after every insert, as the model used to; the profiled run uses the model's
+connection profile and a transaction per round.
+
+usage: python benchmarks/ingest_word_indices.py [--rounds 20] [--batches 20]
+    [--indices 200]
+"""
+
+import argparse
+from pathlib import Path
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.model import WordIndexerModel  # noqa: E402
+from app.model.contexts import register_context_functions  # noqa: E402
+from benchmarks.util import search_result  # noqa: E402
+
+# sqlite's own defaults, which words.db was opened with before the profile
+DEFAULT_PRAGMAS = {
+    "journal_mode": "DELETE",
+    "synchronous": "FULL",
+    "cache_size": -2000,
+    "mmap_size": 0,
+    "temp_store": "DEFAULT",
+}
+
+
+def read_continuously(db_path, stop, counts):
+    """counts the reads that succeed and those that find the database locked"""
+    connection = sqlite3.connect(db_path, timeout=0.05)
+    register_context_functions(connection)
+    while not stop.is_set():
+        try:
+            connection.execute(
+                "SELECT COUNT(*) FROM WordIndices WHERE word_id = ?", (1,)
+            ).fetchone()
+            counts["reads"] += 1
+        except sqlite3.OperationalError:
+            counts["locked"] += 1
+    connection.close()
+
+
+def ingest(args, profiled):
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = Path(directory) / "words.db"
+        model = WordIndexerModel(db_path, Path(directory) / "text_details.db")
+        connection = model.words_db_connection
+        if not profiled:
+            for pragma, value in DEFAULT_PRAGMAS.items():
+                connection.execute(f"PRAGMA {pragma} = {value}")
+        paths_per_round = args.batches
+        model.update_or_insert_paths(
+            [
+                (f"/{path_id}/{path_id}.zip", path_id)
+                for path_id in range(1, args.rounds * paths_per_round + 1)
+            ]
+        )
+        model.update_or_insert_word_groups(["word"])
+
+        rounds = [
+            [
+                search_result(
+                    round_number * paths_per_round + batch + 1, 1, args.indices
+                )
+                for batch in range(args.batches)
+            ]
+            for round_number in range(args.rounds)
+        ]
+
+        stop, counts = threading.Event(), {"reads": 0, "locked": 0}
+        reader = threading.Thread(
+            target=read_continuously, args=(db_path, stop, counts)
+        )
+        reader.start()
+        row_count = 0
+        start = time.perf_counter()
+        for results in rounds:
+            if profiled:
+                with model.transaction():
+                    for result in results:
+                        model.insert_search_histories(result["search_histories"])
+                        row_count += model.insert_search_results(result["word_indices"])
+            else:
+                for result in results:
+                    model.insert_search_histories(result["search_histories"])
+                    row_count += model.insert_search_results(result["word_indices"])
+        elapsed = time.perf_counter() - start
+        stop.set()
+        reader.join()
+        model.close()
+    return row_count, elapsed, counts
+
+
+def main(args):
+    for label, profiled in (
+        ("default pragmas, commit per insert", False),
+        ("connection profile, round per transaction", True),
+    ):
+        row_count, elapsed, counts = ingest(args, profiled)
+        print(
+            f"{label:<44}{row_count / elapsed:10.0f} rows/sec"
+            f"   concurrent reads: {counts['reads']} ok, {counts['locked']} locked"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--indices", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
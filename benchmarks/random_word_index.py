@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# benchmarks/random_word_index.py
+"""
+Times picking a random occurrence of a word on a synthetic words database.
+
+Builds a database of --indices word indices spread over --words words, the first
+word taking a --common fraction of them and the last a --rare fraction, then
+times the model's sampler against the former ORDER BY RANDOM() query for the
+common word, the rare word and the occurrences above the midpoint id.
+
+usage: python benchmarks/random_word_index.py [--indices 1000000] [--words 20]
+    [--common 0.5] [--rare 0.001] [--repeat 5]
+"""
+
+import argparse
+from pathlib import Path
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.model import WordIndexerModel  # noqa: E402
+from app.model.migrations import rank_word_indices  # noqa: E402
+from benchmarks.util import time_call  # noqa: E402
+
+# the query the model ran before sampling, over the table WordIndices used to be
+LEGACY_QUERY = """
+SELECT e.*
+FROM WordIndexEntries e
+JOIN Words w ON e.word_id = w.word_id
+WHERE e.word_indices_id > ?
+AND w.word IN ({placeholders})
+ORDER BY RANDOM()
+LIMIT 1
+"""
+
+
+def populate(model, index_count, word_count, common_fraction, rare_fraction):
+    connection = model.words_db_connection
+    connection.execute("INSERT INTO Paths (path, text_number) VALUES ('/1/1.zip', 1)")
+    connection.execute("INSERT INTO FormGroups DEFAULT VALUES")
+    connection.executemany(
+        "INSERT INTO Words (word, form_group_id) VALUES (?, 1)",
+        ((f"word{number}",) for number in range(word_count)),
+    )
+    connection.execute(
+        "INSERT INTO Contexts (digest, content) VALUES (x'00', 'a sentence.')"
+    )
+
+    def word_id():
+        draw = random.random()
+        if draw < common_fraction:
+            return 1
+        if draw < common_fraction + rare_fraction:
+            return word_count
+        return random.randint(2, word_count - 1)
+
+    connection.executemany(
+        """INSERT INTO WordIndexEntries (word_id, word_index, path_id,
+            sentence_context_id, paragraph_context_id) VALUES (?, ?, 1, 1, 1)""",
+        ((word_id(), word_index) for word_index in range(index_count)),
+    )
+    rank_word_indices(connection)
+    connection.commit()
+    connection.execute("ANALYZE")
+
+
+def main(args):
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        model = WordIndexerModel(
+            Path(directory) / "words.db", Path(directory) / "text_details.db"
+        )
+        populate(model, args.indices, args.words, args.common, args.rare)
+        connection = model.words_db_connection
+        midpoint = args.indices // 2
+        print(f"{args.indices} word indices over {args.words} words")
+        print(f"{'case':<28}{'ORDER BY RANDOM()':>20}{'sampled':>12}")
+        for label, last_processed_id, words in (
+            ("common word", 0, ["word0"]),
+            ("rare word", 0, [f"word{args.words - 1}"]),
+            ("common word above midpoint", midpoint, ["word0"]),
+            ("all words", 0, [f"word{number}" for number in range(args.words)]),
+        ):
+            query = LEGACY_QUERY.format(placeholders=",".join("?" * len(words)))
+            legacy = time_call(
+                lambda: connection.execute(
+                    query, (last_processed_id, *words)
+                ).fetchone(),
+                args.repeat,
+            )
+            sampled = time_call(
+                lambda: model.get_random_word_index_above_id(last_processed_id, words),
+                args.repeat,
+            )
+            print(f"{label:<28}{legacy:>17.1f} ms{sampled:>9.1f} ms")
+        model.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--indices", type=int, default=1_000_000)
+    parser.add_argument("--words", type=int, default=20)
+    parser.add_argument("--common", type=float, default=0.5)
+    parser.add_argument("--rare", type=float, default=0.001)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
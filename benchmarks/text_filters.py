@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# benchmarks/text_filters.py
+"""
+Measures how many texts per-text Bloom filters keep from being dispatched.
+
+Builds --texts synthetic texts of --tokens words each, drawn from a Zipf
+distributed vocabulary of --vocabulary words whose most frequent are the stop
+words, with a number every 50 words, filters each and stores the filters in a
+words database. Reports the filters' size and build time, then for
+a rare, an uncommon and a common word the texts that contain it, the texts the
+selection of unsearched paths still dispatches and the time it takes.
+
+usage: python benchmarks/text_filters.py [--texts 2000] [--tokens 20000]
+    [--vocabulary 50000]
+"""
+
+import argparse
+import bisect
+import itertools
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.model import WordIndexerModel  # noqa: E402
+from app.worker.util.bloom import STOP_WORDS, BloomFilter, text_tokens  # noqa: E402
+
+STOP_WORD_LIST = sorted(STOP_WORDS)
+
+
+def vocabulary_sampler(vocabulary_size):
+    """draws word ranks with probability proportional to 1 / rank"""
+    cumulative = list(
+        itertools.accumulate(1 / rank for rank in range(1, vocabulary_size + 1))
+    )
+    total = cumulative[-1]
+
+    def sample(count):
+        return [
+            bisect.bisect_left(cumulative, random.random() * total)
+            for _ in range(count)
+        ]
+
+    return sample
+
+
+def vocabulary_word(rank):
+    """the word of a rank, a stop word for the most frequent ranks"""
+    if rank < len(STOP_WORD_LIST):
+        return STOP_WORD_LIST[rank]
+    letters = ""
+    while True:
+        rank, letter = divmod(rank, 26)
+        letters += chr(ord("a") + letter)
+        if rank == 0:
+            return "w" + letters
+
+
+def synthetic_text(ranks):
+    """the words of the ranks with the number of every 50th word after it"""
+    return " ".join(
+        f"{vocabulary_word(rank)} {index}" if index % 50 == 0 else vocabulary_word(rank)
+        for index, rank in enumerate(ranks)
+    )
+
+
+def main(args):
+    random.seed(args.seed)
+    sample = vocabulary_sampler(args.vocabulary)
+    with tempfile.TemporaryDirectory() as directory:
+        model = WordIndexerModel(
+            Path(directory) / "words.db", Path(directory) / "text_details.db"
+        )
+        model.update_or_insert_paths(
+            [
+                (f"/{path_id}/{path_id}.zip", path_id)
+                for path_id in range(1, args.texts + 1)
+            ]
+        )
+
+        words = tuple(
+            vocabulary_word(rank)
+            for rank in (args.vocabulary - 1, args.vocabulary // 20, 200)
+        )
+        containing = dict.fromkeys(words, 0)
+        text_filters, distinct, indexed, build_seconds = {}, 0, 0, 0.0
+        for path_id in range(1, args.texts + 1):
+            text = synthetic_text(sample(args.tokens))
+            start = time.perf_counter()
+            text_filters[path_id] = BloomFilter.from_text(text).to_bytes()
+            build_seconds += time.perf_counter() - start
+            tokens = set(text.split())
+            distinct += len(tokens)
+            indexed += len(text_tokens(text))
+            for word in words:
+                containing[word] += word in tokens
+        model.store_text_filters(text_filters)
+        filter_bytes = sum(len(text_filter) for text_filter in text_filters.values())
+        print(
+            f"{args.texts} texts, {distinct / args.texts:.0f} distinct words each"
+            f" of which {indexed / args.texts:.0f} indexed:"
+            f" filters {filter_bytes / args.texts / 1024:.1f} KiB each,"
+            f" {filter_bytes / 1024 / 1024:.1f} MiB in all,"
+            f" built in {build_seconds / args.texts * 1000:.1f} ms each"
+        )
+
+        model.fetch_reachable_bitmap()  # cached from here on, as between rounds
+        print(f"{'word':<12}{'containing':>12}{'dispatched':>12}{'selected in':>14}")
+        for word in words:
+            model.update_or_insert_word_groups([word])
+            start = time.perf_counter()
+            selected = model.get_unsearched_paths_for_word_group(word)
+            elapsed = (time.perf_counter() - start) * 1000
+            dispatched = sum(len(path_records) for path_records in selected.values())
+            print(
+                f"{word:<12}{containing[word]:>12}{dispatched:>12}{elapsed:>11.1f} ms"
+            )
+        model.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--tokens", type=int, default=20_000)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
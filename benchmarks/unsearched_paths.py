@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# benchmarks/unsearched_paths.py
+"""
+Times the selection of unsearched paths on a synthetic words database.
+
+Builds a database of --paths paths and a form group of --words words, each word
+already searched on a random --searched fraction of the paths, then times the
+model's selection of the group's unsearched paths from SearchBitmaps against the
+former per word NOT IN ... ORDER BY RANDOM() queries and the former single
+anti-join, both over a SearchHistory table of one row per word and path, and
+shows the query plan of each.
+
+usage: python benchmarks/unsearched_paths.py [--paths 50000] [--words 20]
+    [--searched 0.8] [--path-limit 150] [--repeat 5]
+"""
+
+import argparse
+from pathlib import Path
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.model import WordIndexerModel  # noqa: E402
+from benchmarks.util import time_call  # noqa: E402
+
+# the SearchHistory table of one row per word and path before SearchBitmaps
+LEGACY_TABLE = """
+CREATE TABLE LegacySearchHistory (
+    search_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    word_id INTEGER,
+    path_id INTEGER,
+    UNIQUE (word_id, path_id)
+)
+"""
+
+LEGACY_QUERY = """
+SELECT path_id
+FROM Paths
+WHERE path_id NOT IN (
+    SELECT path_id
+    FROM LegacySearchHistory
+    WHERE word_id = ?
+)
+AND is_unreachable = 0
+ORDER BY RANDOM() LIMIT ?
+"""
+
+# the single anti-join of the group's words before SearchBitmaps, from one path on
+ANTI_JOIN_QUERY = """
+WITH GroupWords AS (SELECT w1.word_id FROM Words w1
+    JOIN Words w2 ON w1.form_group_id = w2.form_group_id WHERE w2.word = ?)
+SELECT Paths.*, group_concat(GroupWords.word_id)
+FROM Paths INDEXED BY idx_paths_reachable CROSS JOIN GroupWords
+WHERE Paths.is_unreachable = 0 AND Paths.path_id >= ?
+AND NOT EXISTS (SELECT 1 FROM LegacySearchHistory
+    WHERE LegacySearchHistory.word_id = GroupWords.word_id
+    AND LegacySearchHistory.path_id = Paths.path_id)
+GROUP BY Paths.path_id ORDER BY Paths.path_id LIMIT ?
+"""
+
+
+def populate(model, path_count, word_count, searched_fraction, unreachable_fraction):
+    connection = model.words_db_connection
+    connection.executemany(
+        "INSERT INTO Paths (path, text_number, is_unreachable) VALUES (?, ?, ?)",
+        (
+            (
+                f"/{text_number}/{text_number}.zip",
+                text_number,
+                int(random.random() < unreachable_fraction),
+            )
+            for text_number in range(1, path_count + 1)
+        ),
+    )
+    connection.execute("INSERT INTO FormGroups DEFAULT VALUES")
+    connection.executemany(
+        "INSERT INTO Words (word, form_group_id) VALUES (?, 1)",
+        ((f"word{number}",) for number in range(word_count)),
+    )
+    connection.execute(LEGACY_TABLE)
+    for word_id in range(1, word_count + 1):
+        search_histories = [
+            {"word_id": word_id, "path_id": path_id}
+            for path_id in range(1, path_count + 1)
+            if random.random() < searched_fraction
+        ]
+        connection.executemany(
+            "INSERT INTO LegacySearchHistory (word_id, path_id)"
+            " VALUES (:word_id, :path_id)",
+            search_histories,
+        )
+        model.insert_search_histories(search_histories)
+    connection.commit()
+    connection.execute("ANALYZE")
+
+
+def random_path_id(connection):
+    """a random path_id between the lowest and highest, where the anti-join starts"""
+    min_path_id, max_path_id = connection.execute(
+        "SELECT MIN(path_id), MAX(path_id) FROM Paths"
+    ).fetchone()
+    return random.randint(min_path_id, max_path_id)
+
+
+def print_plan(connection, query, parameters):
+    for row in connection.execute(f"EXPLAIN QUERY PLAN {query}", parameters):
+        print(f"    {row[-1]}")
+
+
+def main(args):
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        model = WordIndexerModel(
+            Path(directory) / "words.db",
+            Path(directory) / "text_details.db",
+            path_limit=args.path_limit,
+        )
+        start = time.perf_counter()
+        populate(model, args.paths, args.words, args.searched, args.unreachable)
+        connection = model.words_db_connection
+        history_count = connection.execute(
+            "SELECT COUNT(*) FROM LegacySearchHistory"
+        ).fetchone()[0]
+        print(
+            f"{args.paths} paths, {args.words} words, {history_count} search histories"
+            f" built in {time.perf_counter() - start:.1f}s"
+        )
+        for label, query in (
+            (
+                "SearchHistory table",
+                "SELECT SUM(pgsize) FROM dbstat WHERE name IN"
+                " ('LegacySearchHistory', 'sqlite_autoindex_LegacySearchHistory_1')",
+            ),
+            (
+                "SearchBitmaps table",
+                "SELECT SUM(pgsize) FROM dbstat WHERE name = 'SearchBitmaps'",
+            ),
+        ):
+            try:
+                size = connection.execute(query).fetchone()[0]
+                print(f"{label:<44}{size / 1024:9.0f} KiB")
+            except sqlite3.OperationalError:
+                # sqlite built without the dbstat table
+                break
+        word_ids = [row[0] for row in connection.execute("SELECT word_id FROM Words")]
+
+        def legacy_selection():
+            # one query per word, grouped by identical path lists, then refetched
+            words_by_path_ids = {}
+            for word_id in word_ids:
+                path_ids = tuple(
+                    row[0]
+                    for row in connection.execute(
+                        LEGACY_QUERY, (word_id, args.path_limit)
+                    )
+                )
+                words_by_path_ids.setdefault(path_ids, []).append(word_id)
+            for path_ids in words_by_path_ids:
+                model.fetch_selected_path_records(list(path_ids))
+
+        legacy_ms = time_call(
+            lambda: connection.execute(LEGACY_QUERY, (1, args.path_limit)).fetchall(),
+            args.repeat,
+        )
+        legacy_group_ms = time_call(legacy_selection, args.repeat)
+        anti_join_ms = time_call(
+            lambda: connection.execute(
+                ANTI_JOIN_QUERY,
+                ("word0", random_path_id(connection), args.path_limit),
+            ).fetchall(),
+            args.repeat,
+        )
+        group_ms = time_call(
+            lambda: model.get_unsearched_paths_for_word_group("word0"), args.repeat
+        )
+        for label, milliseconds in (
+            ("NOT IN + ORDER BY RANDOM(), one word", legacy_ms),
+            (f"per word queries, group of {args.words} words", legacy_group_ms),
+            (f"single anti-join, group of {args.words} words", anti_join_ms),
+            (f"bitmaps, group of {args.words} words", group_ms),
+        ):
+            print(f"{label:<44}{milliseconds:9.2f} ms")
+
+        word_groups = model.get_unsearched_paths_for_word_group("word0")
+        path_records = [
+            path_record
+            for path_records in word_groups.values()
+            for path_record in path_records
+        ]
+        missing_word_sets = {tuple(record["word_ids"]) for record in path_records}
+        print(
+            f"{len(path_records)} paths in one round, missing"
+            f" {len(missing_word_sets)} distinct sets of words"
+        )
+
+        print("legacy plan:")
+        print_plan(connection, LEGACY_QUERY, (1, args.path_limit))
+        print("anti-join plan:")
+        print_plan(
+            connection,
+            ANTI_JOIN_QUERY,
+            ("word0", random_path_id(connection), args.path_limit),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--paths", type=int, default=50000)
+    parser.add_argument("--words", type=int, default=20)
+    parser.add_argument(
+        "--searched",
+        type=float,
+        default=0.8,
+        help="fraction of the paths each word has been searched on",
+    )
+    parser.add_argument("--unreachable", type=float, default=0.01)
+    parser.add_argument("--path-limit", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,50 @@
+# benchmarks/util.py
+"""
+Helpers shared by the benchmark scripts.
+"""
+
+import random
+import time
+
+SENTENCE = (
+    "It was the best of times, it was the worst of times, it was the age of wisdom."
+)
+
+
+def time_call(function, repeat):
+    """the best of repeat runs of function in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def search_result(path_id, word_id, index_count, distinct_contexts=False):
+    """
+    a search result of index_count random occurrences of word_id in path_id
+
+    Every occurrence shares the same sentence and paragraph unless
+    distinct_contexts, which prefixes each with its word index.
+    """
+    prefix = "{} " if distinct_contexts else ""
+    return {
+        "search_histories": [{"word_id": word_id, "path_id": path_id}],
+        "word_indices": [
+            {
+                "word_id": word_id,
+                "path_id": path_id,
+                "word_index": word_index,
+                "sentence_index_start": word_index,
+                "sentence_index_end": word_index + len(SENTENCE),
+                "paragraph_index_start": word_index,
+                "paragraph_index_end": word_index + 4 * len(SENTENCE),
+                "context_sentence": prefix.format(word_index) + SENTENCE,
+                "context_paragraph": prefix.format(word_index) + SENTENCE * 4,
+            }
+            for word_index in random.sample(range(10_000_000), index_count)
+        ],
+        "unreachable_path_ids": [],
+    }
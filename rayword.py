@@ -2,6 +2,7 @@
 # rayword.py
 # setup and run
 
+import json
 import logging
 from pathlib import Path
 import os
@@ -11,7 +12,8 @@ import subprocess
 from app.controller import Controller
 from app.model import WordIndexerModel
 from constants import TARGETS_FILE
-from app.util.resource import parse_resources_file
+from app.util.ray_session import configure_ray
+from app.backends import create_backend
 
 
 def get_max_workers_from_config(yaml_config_path):
@@ -26,14 +28,21 @@ def get_max_workers_from_config(yaml_config_path):
     return None
 
 
-def find_word_forms(word):
+# the similarity threshold word_forms applies by default
+DEFAULT_SIMILARITY_THRESHOLD = 0.4
+
+
+def find_word_forms(word, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD):
     """leverage nltk (if available) to find all the forms of the word being searched
 
     Args:
         word: the word searched for
+        similarity_threshold (float): how similar to the word a related lemma must
+            be to count as one of its forms
 
     Returns:
-        list (str): the word searched for and other forms (if any) found
+        list (str): the word searched for and other forms (if any) found, None when
+            nltk or word_forms is not installed
     """
     try:
         import nltk
@@ -42,15 +51,46 @@ def find_word_forms(word):
         nltk.data.path.append(str(nltk_data_dir))
         from word_forms.word_forms import get_word_forms
     except (NameError, ModuleNotFoundError):
-        return [word]
+        return None
     else:
-        word_forms_data = get_word_forms(word)
+        word_forms_data = get_word_forms(
+            word, similarity_threshold=similarity_threshold
+        )
         combined_set = set()
         for forms in word_forms_data.values():
             combined_set.update(forms)
         return list(combined_set)
 
 
+def resolve_word_forms(model, word, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD):
+    """find the forms of the word, loading nltk and wordnet only for a new word
+
+    The forms computed for a word are kept in the model's WordFormCache, and a
+    word whose form group is already in the model is not looked up at all.
+
+    Args:
+        model (WordIndexerModel): the model holding the cache and the form groups
+        word: the word searched for
+        similarity_threshold (float): passed on to find_word_forms
+
+    Returns:
+        list (str): the forms of the word, the word alone when they cannot be found
+    """
+    word_forms = model.fetch_cached_word_forms(word, similarity_threshold)
+    if word_forms is not None:
+        logging.debug(f"read the forms of {word} from the word form cache")
+        return word_forms
+    word_forms = model.fetch_form_group_words([word])
+    if word_forms:
+        logging.debug(f"{word} has a form group already, not looking up its forms")
+        return word_forms
+    word_forms = find_word_forms(word, similarity_threshold)
+    if word_forms is None:
+        return [word]
+    model.cache_word_forms(word, similarity_threshold, word_forms)
+    return word_forms
+
+
 def main(args):
     # formatter = logging.Formatter(">>>%(filename)s:%(lineno)d - %(message)s")
     # Create a logger
@@ -86,27 +126,43 @@ def main(args):
     console_handler.setFormatter(console_formatter)
     logger.addHandler(console_handler)
 
+    if args.backend == "local":
+        max_workers = args.local_workers
+    else:
+        max_workers = get_max_workers_from_config("golem-cluster.yaml")
+    # instantiate model
+    dispatch_filters = {
+        name: value
+        for name, value in (
+            ("language", args.language),
+            ("type", args.type),
+            ("subject", args.subject),
+        )
+        if value is not None
+    }
+    managerModel = WordIndexerModel(
+        path_limit=max_workers * args.batch_size,
+        compress_contexts=args.compress_contexts,
+        dispatch_filters=dispatch_filters,
+    )
+
     primary_word = args.word
     words = [primary_word]
-    word_forms = find_word_forms(primary_word)
+    word_forms = resolve_word_forms(
+        managerModel, primary_word, args.similarity_threshold
+    )
     if len(word_forms) == 0:
+        managerModel.close()
         raise Exception(
             "Uh oh, it seems the word you are searching for is not a known English word! Aborting!"
         )
 
-    max_workers = get_max_workers_from_config("golem-cluster.yaml")
-    # instantiate model
-    managerModel = WordIndexerModel(path_limit=max_workers * args.batch_size)
-
-    # update model with any new urls
-    resources = None
-    with open(TARGETS_FILE) as f:
-        resources = parse_resources_file(f)
-    paths_and_text_numbers = [
-        (resource.get_path(), Path(resource.get_path()).parent.name)
-        for resource in resources
-    ]
-    managerModel.update_or_insert_paths(paths_and_text_numbers)
+    # update model with any new urls, skipped while the targets file is unchanged
+    added_path_count = managerModel.ingest_targets_file(TARGETS_FILE)
+    if added_path_count is None:
+        logging.debug(f"{TARGETS_FILE} unchanged, skipped ingesting it")
+    else:
+        logging.debug(f"added {added_path_count} paths from {TARGETS_FILE}")
 
     # update model with an new words
     print(f"updating model with {word_forms}")
@@ -115,9 +171,45 @@ def main(args):
     # check model for highest indexed WordIndices
     last_word_index_row_id = managerModel.get_max_word_indices_id()
 
+    # ray is initialized with these on the first submission
+    configure_ray(
+        address=args.ray_address,
+        namespace=args.ray_namespace,
+        runtime_env=json.loads(args.runtime_env) if args.runtime_env else None,
+    )
+
     ############################ START CONTROLLER ###############################
-    controller = Controller(managerModel, args.batch_size)
-    controller(primary_word, enable_console_logging=args.enable_console_logging)
+    backend = create_backend(args.backend, args.local_workers)
+    controller = Controller(
+        managerModel,
+        args.batch_size,
+        stream_results=args.stream_results,
+        stop_after=args.stop_after,
+        adaptive_batching=args.adaptive_batching,
+        probe_size=args.probe_size,
+        work_queue=args.work_queue,
+        chunk_size=args.chunk_size,
+        max_in_flight=args.max_in_flight,
+        max_in_flight_bytes=(
+            args.max_in_flight_mb * 1024 * 1024
+            if args.max_in_flight_mb is not None
+            else None
+        ),
+        max_retries=args.max_retries,
+        resume=args.resume,
+        backend=backend,
+        prefetch_bytes=(
+            args.prefetch_mb * 1024 * 1024 if args.prefetch_mb is not None else None
+        ),
+        db_writer=not args.sync_writes,
+    )
+    try:
+        if args.build_text_filters:
+            controller.build_text_filters()
+        controller(primary_word, enable_console_logging=args.enable_console_logging)
+    finally:
+        # local searches still queued, e.g. after --stop-after, are cancelled
+        backend.shutdown()
     #############################################################################
 
     count_inserted = managerModel.update_insertion_history()
@@ -131,7 +223,12 @@ def main(args):
             last_word_index_row_id, primary_word
         )
         if random_index is None:
-            random_index = managerModel.get_random_word_index_above_id(words)
+            random_index = managerModel.get_random_word_index_above_id(0, words)
+        if random_index is None:
+            # e.g. no text matching the dispatch filters contains the word
+            print("No instances of the word(s) have been found")
+            managerModel.close()
+            return
 
         random_context_sentence = random_index["context_sentence"]
         print()
@@ -162,6 +259,8 @@ def main(args):
             env=env,
         )
 
+    managerModel.close()
+
 
 if __name__ == "__main__":
     import argparse
@@ -179,7 +278,158 @@ if __name__ == "__main__":
         default=150,
         help="Maximum number of paths a worker will be assigned at most",
     )
+    parser.add_argument(
+        "--stream-results",
+        action="store_true",
+        help="store each batch's results as soon as it completes",
+    )
+    parser.add_argument(
+        "--stop-after",
+        type=int,
+        default=None,
+        metavar="N",
+        help="cancel outstanding batches once N instances of the word are found"
+        " (implies --stream-results)",
+    )
+    parser.add_argument(
+        "--adaptive-batching",
+        action="store_true",
+        help="size batches from each node's measured throughput, --batch-size"
+        " becoming the upper bound (implies --stream-results)",
+    )
+    parser.add_argument(
+        "--probe-size",
+        type=int,
+        default=5,
+        help="number of paths in each node's first batch with --adaptive-batching",
+    )
+    parser.add_argument(
+        "--work-queue",
+        action="store_true",
+        help="have workers pull small chunks of paths from a queue on the head"
+        " instead of fixed batches (implies --stream-results)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=5,
+        help="number of paths a worker pulls at a time with --work-queue",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=None,
+        help="submit at most this many batches at a time (implies --stream-results)",
+    )
+    parser.add_argument(
+        "--max-in-flight-mb",
+        type=int,
+        default=None,
+        help="hold back batches while the results of those in flight would exceed"
+        " this many megabytes (implies --stream-results)",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=2,
+        help="number of times a failed batch is resubmitted before it is left unsearched",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="first finish the unfinished batches of an interrupted run for the word"
+        " (implies --stream-results)",
+    )
+    parser.add_argument(
+        "--ray-address",
+        default=None,
+        help="address of the ray cluster to connect to (default: $RAYWORD_RAY_ADDRESS"
+        " or ray's own discovery)",
+    )
+    parser.add_argument(
+        "--ray-namespace",
+        default=None,
+        help="ray namespace to run in (default: $RAYWORD_RAY_NAMESPACE)",
+    )
+    parser.add_argument(
+        "--runtime-env",
+        default=None,
+        metavar="JSON",
+        help="ray runtime environment for the workers as json"
+        " (default: $RAYWORD_RAY_RUNTIME_ENV or the nltk and requests pip packages)",
+    )
+
+    parser.add_argument(
+        "--backend",
+        choices=["ray", "local"],
+        default="ray",
+        help="run searches on the ray cluster or in a pool of processes on this"
+        " machine, which needs no cluster",
+    )
+    parser.add_argument(
+        "--local-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of worker processes with --backend local (default: cpu count)",
+    )
+    parser.add_argument(
+        "--prefetch-mb",
+        type=int,
+        default=None,
+        help="megabytes of text each worker may download ahead of its search into"
+        " the node's cache, 0 to disable (default: 64)",
+    )
+    parser.add_argument(
+        "--sync-writes",
+        action="store_true",
+        help="store results on the controller between collecting them instead of"
+        " from a writer thread",
+    )
+    parser.add_argument(
+        "--compress-contexts",
+        action="store_true",
+        help="zlib compress the sentence and paragraph contexts stored, which"
+        " the WordIndices view then only has as zlib bytes",
+    )
+
+    parser.add_argument(
+        "--build-text-filters",
+        action="store_true",
+        help="first load every text not yet filtered to store a Bloom filter of its"
+        " words, so that searches skip the texts that cannot contain the word;"
+        " searches never build filters otherwise",
+    )
+
+    parser.add_argument(
+        "--language",
+        default=None,
+        help="only search texts in this language of the Gutenberg catalog, e.g. en,"
+        " alone or among others (load it with python -m app.util.load_catalog)",
+    )
+    parser.add_argument(
+        "--type",
+        default=None,
+        help="only search texts of this catalog type, e.g. Text",
+    )
+    parser.add_argument(
+        "--subject",
+        default=None,
+        help="only search texts with a catalog subject containing this, e.g. fiction",
+    )
+
+    parser.add_argument(
+        "--similarity-threshold",
+        type=float,
+        default=DEFAULT_SIMILARITY_THRESHOLD,
+        help="how similar to the word a related lemma must be to count as one of"
+        " its forms; the forms are cached per word and threshold",
+    )
 
     args = parser.parse_args()
+    for option in ("max_in_flight", "max_in_flight_mb", "chunk_size"):
+        if getattr(args, option) is not None and getattr(args, option) < 1:
+            parser.error(f"--{option.replace('_', '-')} must be at least 1")
+    if args.backend == "local" and args.work_queue:
+        parser.error("--work-queue requires --backend ray")
 
     main(args)
@@ -0,0 +1,5 @@
+# tests/conftest.py
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
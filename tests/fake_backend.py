@@ -0,0 +1,77 @@
+# tests/fake_backend.py
+"""
+An execution backend that runs nothing, for testing the TaskSubmitter.
+
+Futures complete in submission order, each with an empty search result of its
+paths, and every submission is recorded with the node it was directed to.
+"""
+
+
+class FakeFuture:
+    def __init__(self, path_ids, path_word_ids, node_id):
+        self.path_ids = path_ids
+        self.path_word_ids = path_word_ids
+        self.node_id = node_id
+
+
+class FakeBackend:
+    name = "fake"
+    task_errors = (RuntimeError,)
+    submit_errors = ()
+
+    def __init__(self, nodes):
+        """
+        Args:
+            nodes (dict): the CPU count of each node keyed by node id.
+        """
+        self.nodes = nodes
+        self.submitted = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.submitted_counts_at_wait = []
+
+    def start(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def put(self, value):
+        return value
+
+    def submit(
+        self, search_spec, path_ids, paths, path_word_ids, enable_logging, node_id=None
+    ):
+        future = FakeFuture(path_ids, path_word_ids, node_id)
+        self.submitted.append(future)
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return future
+
+    def wait_one(self, futures):
+        self.submitted_counts_at_wait.append(len(self.submitted))
+        self.in_flight -= 1
+        return futures[0], list(futures[1:])
+
+    def result(self, future):
+        return {
+            "word_indices": [],
+            "search_histories": [],
+            "unreachable_path_ids": [],
+            # results of about a kilobyte a path
+            "text_filters": {path_id: b"\0" * 1024 for path_id in future.path_ids},
+        }
+
+    def cancel(self, future):
+        pass
+
+    def worker_nodes(self):
+        return [
+            {
+                "NodeID": node_id,
+                "NodeManagerAddress": node_id,
+                "Alive": True,
+                "Resources": {"CPU": cpu_count},
+            }
+            for node_id, cpu_count in self.nodes.items()
+        ]
@@ -0,0 +1,21 @@
+# tests/test_bloom.py
+from app.worker.util.bloom import BloomFilter, text_tokens
+
+TEXT = "It was the 12th of May, 1859, at nine o'clock, when the sobriquet stuck."
+
+
+def test_filters_hold_only_indexed_words():
+    assert text_tokens(TEXT) == {"nine", "clock", "sobriquet", "stuck"}
+
+
+def test_words_of_the_text_are_never_ruled_out():
+    text_filter = BloomFilter.from_bytes(BloomFilter.from_text(TEXT).to_bytes())
+
+    for word in ("sobriquet", "Nine", "o'clock", "the", "12th", "1859"):
+        assert text_filter.might_contain_word(word)
+
+
+def test_absent_words_are_ruled_out():
+    text_filter = BloomFilter.from_text(TEXT)
+
+    assert not text_filter.might_contain_word("xylophone")
@@ -0,0 +1,16 @@
+# tests/test_browse.py
+import pytest
+
+from app.model import WordIndexerModel
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_pages_below_one_row_are_rejected(tmp_path, limit):
+    model = WordIndexerModel(
+        str(tmp_path / "words.db"), str(tmp_path / "text_details.db")
+    )
+    try:
+        with pytest.raises(ValueError):
+            model.browse_word_indices(["clock"], limit=limit)
+    finally:
+        model.close()
@@ -0,0 +1,33 @@
+# tests/test_catalog.py
+import csv
+
+from app.model import WordIndexerModel
+from app.model.catalog import CATALOG_COLUMNS, load_catalog
+
+# text number and Language of each catalog entry
+LANGUAGES = {1: "en", 2: "fr", 3: "en; fr", 4: "de; fr; la"}
+
+
+def test_texts_in_several_languages_match_each_language(tmp_path):
+    csv_path = tmp_path / "pg_catalog.csv"
+    with open(csv_path, "w", newline="", encoding="utf-8") as catalog_file:
+        writer = csv.DictWriter(catalog_file, fieldnames=list(CATALOG_COLUMNS))
+        writer.writeheader()
+        for text_number, language in LANGUAGES.items():
+            writer.writerow({"Text#": text_number, "Language": language})
+    model = WordIndexerModel(
+        str(tmp_path / "words.db"),
+        str(tmp_path / "text_details.db"),
+        dispatch_filters={"language": "fr"},
+    )
+    try:
+        load_catalog(model.text_details_db_connection, csv_path)
+        model.words_db_connection.executemany(
+            "INSERT INTO Paths (path_id, path, text_number) VALUES (?, ?, ?)",
+            [(n, f"/{n}/{n}.zip", n) for n in LANGUAGES],
+        )
+        model.words_db_connection.commit()
+
+        assert set(model.fetch_dispatchable_bitmap()) == {2, 3, 4}
+    finally:
+        model.close()
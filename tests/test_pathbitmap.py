@@ -0,0 +1,21 @@
+# tests/test_pathbitmap.py
+import random
+
+from app.model.pathbitmap import PathBitmap
+
+
+def test_random_order_yields_every_member_once():
+    rng = random.Random(0)
+    # dense members drawn by bit position, then a sparse tail listed once misses run
+    path_ids = set(range(1, 5000)) - {3, 70, 4000} | {100000, 250000}
+    bitmap = PathBitmap.from_path_ids(path_ids)
+
+    drawn = list(bitmap.iter_random(rng))
+
+    assert len(drawn) == len(path_ids)
+    assert set(drawn) == path_ids
+
+
+def test_random_order_of_an_empty_bitmap():
+    assert list(PathBitmap().iter_random()) == []
+    assert 7 not in PathBitmap()
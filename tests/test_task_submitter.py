@@ -0,0 +1,91 @@
+# tests/test_task_submitter.py
+from app.task_generator import Task
+from app.task_submitter import TaskSubmitter
+
+from fake_backend import FakeBackend
+
+
+def make_tasks(task_count, paths_per_task=1, node_id=None):
+    return [
+        Task(
+            [{"word_id": 1, "word": "word"}],
+            [
+                {"path_id": path_id, "path": f"/{path_id}/{path_id}.zip"}
+                for path_id in range(
+                    number * paths_per_task + 1, (number + 1) * paths_per_task + 1
+                )
+            ],
+            [],
+            node_id=node_id,
+        )
+        for number in range(task_count)
+    ]
+
+
+def test_tasks_go_elsewhere_once_their_node_is_busy():
+    backend = FakeBackend({"a": 2, "b": 2})
+    submitter = TaskSubmitter(False, backend=backend)
+
+    results = list(submitter.stream_tasks(make_tasks(6, node_id="a")))
+
+    assert len(results) == 6
+    assert [future.node_id for future in backend.submitted] == [
+        "a",
+        "a",
+        None,
+        None,
+        None,
+        None,
+    ]
+
+
+def test_tasks_return_to_their_node_once_it_frees_up():
+    backend = FakeBackend({"a": 2, "b": 2})
+    submitter = TaskSubmitter(False, max_in_flight=3, backend=backend)
+
+    list(submitter.stream_tasks(make_tasks(4, node_id="a")))
+
+    # the first completion frees a slot of node a for the fourth task
+    assert [future.node_id for future in backend.submitted] == ["a", "a", None, "a"]
+
+
+def test_tasks_of_a_node_that_is_gone_go_elsewhere():
+    backend = FakeBackend({"b": 2})
+    submitter = TaskSubmitter(False, backend=backend)
+
+    list(submitter.stream_tasks(make_tasks(2, node_id="a")))
+
+    assert [future.node_id for future in backend.submitted] == [None, None]
+
+
+def test_byte_cap_alone_bounds_the_tasks_in_flight():
+    backend = FakeBackend({"a": 2, "b": 2})
+    # results of about 10 KiB a task
+    submitter = TaskSubmitter(False, max_in_flight_bytes=1024 * 1024, backend=backend)
+
+    results = list(submitter.stream_tasks(make_tasks(300, paths_per_task=10)))
+
+    assert len(results) == 300
+    assert backend.peak_in_flight <= 1024 * 1024 // (10 * 1024)
+
+
+def test_byte_cap_submits_one_task_per_slot_before_any_completes():
+    backend = FakeBackend({"a": 2, "b": 2})
+    submitter = TaskSubmitter(False, max_in_flight_bytes=1024 * 1024, backend=backend)
+
+    list(submitter.stream_tasks(make_tasks(300, paths_per_task=10)))
+
+    # the four slots were filled before the first result sized the window
+    assert backend.submitted_counts_at_wait[0] == 4
+
+
+def test_word_ids_of_each_path_reach_the_backend():
+    backend = FakeBackend({"a": 2})
+    submitter = TaskSubmitter(False, backend=backend)
+    tasks = make_tasks(1, paths_per_task=2)
+    tasks[0].path_records[0]["word_ids"] = [1]
+    tasks[0].path_records[1]["word_ids"] = [2]
+
+    list(submitter.stream_tasks(tasks + make_tasks(1)))
+
+    assert [future.path_word_ids for future in backend.submitted] == [[[1], [2]], None]
@@ -0,0 +1,54 @@
+# tests/test_wordsearch.py
+import pytest
+
+from app.worker import wordsearch
+from app.worker.wordsearch import WordSearcher
+
+TEXTS = {
+    "/1/1.zip": "The cat sat by the dog.",
+    "/2/2.zip": "The cat chased the dog.",
+}
+
+WORDS_TABLE = [
+    {"word_id": 1, "word": "cat", "form_group_id": 1},
+    {"word_id": 2, "word": "dog", "form_group_id": 1},
+]
+
+
+@pytest.fixture(autouse=True)
+def load_texts(monkeypatch):
+    def load_resource(path, cache=None):
+        return TEXTS[path.removeprefix("http://aleph.gutenberg.org")], False
+
+    monkeypatch.setattr(wordsearch, "load_resource", load_resource)
+
+
+def paths_table():
+    return [{"path_id": 1, "path": "/1/1.zip"}, {"path_id": 2, "path": "/2/2.zip"}]
+
+
+def found_pairs(searchResult, key):
+    return sorted(
+        (record["word_id"], record["path_id"]) for record in searchResult[key]
+    )
+
+
+def test_every_path_is_searched_for_every_word_by_default():
+    searchResult = WordSearcher(WORDS_TABLE, paths_table()).perform_search()
+
+    assert found_pairs(searchResult, "search_histories") == [
+        (1, 1),
+        (1, 2),
+        (2, 1),
+        (2, 2),
+    ]
+    assert found_pairs(searchResult, "word_indices") == [(1, 1), (1, 2), (2, 1), (2, 2)]
+
+
+def test_each_path_is_searched_only_for_its_word_ids():
+    searchResult = WordSearcher(
+        WORDS_TABLE, paths_table(), word_ids_by_path_id={1: [1], 2: [2]}
+    ).perform_search()
+
+    assert found_pairs(searchResult, "search_histories") == [(1, 1), (2, 2)]
+    assert found_pairs(searchResult, "word_indices") == [(1, 1), (2, 2)]